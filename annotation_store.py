@@ -0,0 +1,191 @@
+import numpy as np
+
+from spatial_index import PointIndex
+
+
+class Series:
+    """
+    Uma série de pontos anotados. As coordenadas ficam em um array float64
+    Nx2 com crescimento amortizado, junto com o id de cada ponto no índice
+    espacial e o traço a que ele pertence (cada `extend` é um traço: um
+    clique ou um traçado à mão livre). O `id` da série é estável e
+    independente da cor de exibição.
+    """
+
+    def __init__(self, series_id, color, label=None):
+        self.id = series_id
+        self.color = color
+        self.label = label if label is not None else color
+        self._points = np.empty((16, 2), dtype=np.float64)
+        self._ids = np.empty(16, dtype=np.int64)
+        self._strokes = np.empty(16, dtype=np.int64)
+        self._size = 0
+        self._next_stroke = 0
+
+    def __len__(self):
+        return self._size
+
+    def __repr__(self):
+        return f"Series(id={self.id}, label={self.label!r}, color={self.color!r}, pontos={self._size})"
+
+    @property
+    def points(self):
+        # Visão (sem cópia) dos pontos válidos
+        return self._points[:self._size]
+
+    @property
+    def x(self):
+        return self._points[:self._size, 0]
+
+    @property
+    def y(self):
+        return self._points[:self._size, 1]
+
+    @property
+    def point_ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def stroke_ids(self):
+        return self._strokes[:self._size]
+
+    def extend(self, points, point_ids):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        needed = self._size + len(points)
+        if needed > len(self._points):
+            capacity = max(needed, 2 * len(self._points))
+            grown_points = np.empty((capacity, 2), dtype=np.float64)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_strokes = np.empty(capacity, dtype=np.int64)
+            grown_points[:self._size] = self.points
+            grown_ids[:self._size] = self.point_ids
+            grown_strokes[:self._size] = self.stroke_ids
+            self._points, self._ids, self._strokes = grown_points, grown_ids, grown_strokes
+        self._points[self._size:needed] = points
+        self._ids[self._size:needed] = point_ids
+        self._strokes[self._size:needed] = self._next_stroke
+        self._next_stroke += 1
+        self._size = needed
+
+    def delete_ids(self, point_ids):
+        """
+        Remove os pontos com os ids informados, compactando os arrays. Um
+        traço com pontos apagados no meio vira dois traços.
+        """
+        keep = ~np.isin(self.point_ids, point_ids)
+        kept = int(keep.sum())
+        # Um traço novo começa onde o traço muda ou depois de um ponto apagado
+        starts = np.ones(len(keep), dtype=bool)
+        starts[1:] = (self.stroke_ids[1:] != self.stroke_ids[:-1]) | ~keep[:-1]
+        strokes = np.cumsum(starts)[keep] - 1
+        self._points[:kept] = self.points[keep]
+        self._ids[:kept] = self.point_ids[keep]
+        self._strokes[:kept] = strokes
+        self._next_stroke = int(strokes[-1]) + 1 if kept else 0
+        self._size = kept
+
+    def remap_ids(self, remap):
+        # Ids renumerados pela compactação do índice espacial
+        self._ids[:self._size] = remap[self.point_ids]
+
+
+class AnnotationStore:
+    """
+    Conjunto de séries anotadas com um índice espacial compartilhado, usado
+    pelas telas de anotação para desenhar, apagar e exportar pontos.
+    """
+
+    def __init__(self):
+        self._series = {}
+        self._next_id = 0
+        self.index = PointIndex(on_compact=self._remap_ids)
+
+    def __iter__(self):
+        return iter(self._series.values())
+
+    def __len__(self):
+        return len(self._series)
+
+    def __contains__(self, series_id):
+        return series_id in self._series
+
+    def __getitem__(self, series_id):
+        return self._series[series_id]
+
+    @property
+    def point_count(self):
+        return sum(len(series) for series in self)
+
+    def clear(self):
+        self._series = {}
+        self.index.clear()
+
+    def new_series(self, color, label=None):
+        series = Series(self._next_id, color, label)
+        self._series[series.id] = series
+        self._next_id += 1
+        return series
+
+    def remove_series(self, series_ids):
+        """
+        Remove as séries informadas e os seus pontos do índice.
+        """
+        for series_id in series_ids:
+            series = self._series.pop(series_id, None)
+            if series is not None and len(series):
+                self.index.remove(series.point_ids)
+
+    def _remap_ids(self, remap):
+        for series in self:
+            series.remap_ids(remap)
+
+    def series_for_color(self, color):
+        """
+        Série manual da cor informada (criada na primeira anotação com a cor).
+        """
+        for series in self:
+            if series.label == color:
+                return series
+        return self.new_series(color)
+
+    def add_points(self, series, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        series.extend(points, self.index.add(points, series.id))
+        return series
+
+    def erase_ids(self, point_ids):
+        """
+        Apaga os pontos informados e retorna os ids das séries afetadas.
+        """
+        point_ids = self.index.alive_ids(point_ids)
+        if len(point_ids) == 0:
+            return set()
+        affected = self.index.keys_of(point_ids)
+        for series_id in affected:
+            self._series[series_id].delete_ids(point_ids)
+        # Por último: a remoção pode compactar o índice e renumerar os ids das séries
+        self.index.remove(point_ids)
+        return affected
+
+    def erase_nearest(self, x, y, max_distance=np.inf):
+        point_id = self.index.nearest(x, y, max_distance)
+        if point_id is None:
+            return None, set()
+        point = self.index.point(point_id)
+        return point, self.erase_ids([point_id])
+
+    def columns(self):
+        """
+        Todas as séries concatenadas em colunas: (ids das séries, rótulos,
+        cores, pontos Nx2), sem iterar ponto a ponto.
+        """
+        series_list = [series for series in self if len(series)]
+        if not series_list:
+            empty = np.empty(0, dtype=object)
+            return np.empty(0, dtype=np.int64), empty, empty, np.empty((0, 2))
+        lengths = [len(series) for series in series_list]
+        ids = np.repeat([series.id for series in series_list], lengths)
+        labels = np.repeat(np.array([series.label for series in series_list], dtype=object), lengths)
+        colors = np.repeat(np.array([series.color for series in series_list], dtype=object), lengths)
+        points = np.concatenate([series.points for series in series_list])
+        return ids, labels, colors, points
@@ -0,0 +1,292 @@
+import math
+import time
+
+import numpy as np
+
+# Intervalo mínimo entre redesenhos do traço (~ taxa de atualização da tela)
+REFRESH_INTERVAL = 1 / 60
+# Lado máximo do nível mais grosso da pirâmide de exibição
+PYRAMID_MIN_SIDE = 512
+
+
+class TraceStroke:
+    """
+    Traço livre em andamento: um único Line2D atualizado com set_data e
+    redesenhado com blitting sobre o fundo em cache, no máximo uma vez por
+    REFRESH_INTERVAL. O custo de cada movimento do mouse não depende do
+    tamanho da imagem nem do número de anotações já feitas.
+    """
+
+    def __init__(self, ax, color, refresh_interval=REFRESH_INTERVAL):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.refresh_interval = refresh_interval
+        self.x = []
+        self.y = []
+        self.line, = ax.plot([], [], "-", color=color, animated=True)
+        self._last_draw = 0.0
+        # O fundo é copiado do canvas atual e atualizado a cada redesenho completo
+        # (zoom, pan, redimensionamento)
+        self.background = self.canvas.copy_from_bbox(ax.bbox)
+        self._cid_draw = self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def points(self):
+        return list(zip(self.x, self.y))
+
+    def add(self, x, y):
+        self.x.append(x)
+        self.y.append(y)
+        now = time.perf_counter()
+        if now - self._last_draw >= self.refresh_interval:
+            self._last_draw = now
+            self.blit()
+
+    def blit(self):
+        self.line.set_data(self.x, self.y)
+        self.canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+    def finish(self):
+        """
+        Encerra o traço e retorna os pontos. O Line2D temporário é removido:
+        os pontos passam a ser desenhados pela série em que forem guardados
+        (ver SeriesArtists).
+        """
+        self.canvas.mpl_disconnect(self._cid_draw)
+        self.line.remove()
+        return self.points()
+
+    def cancel(self):
+        self.canvas.mpl_disconnect(self._cid_draw)
+        self.line.remove()
+        self.canvas.draw_idle()
+
+
+def _stroke_data(series):
+    # Coordenadas com um NaN entre traços (o Line2D não liga traços diferentes)
+    # e os índices dos pontos isolados, que recebem o marcador
+    strokes = series.stroke_ids
+    breaks = np.flatnonzero(strokes[1:] != strokes[:-1]) + 1
+    x = np.insert(series.x, breaks, np.nan)
+    y = np.insert(series.y, breaks, np.nan)
+    starts = np.concatenate([[0], breaks, [len(strokes)]])
+    single = np.flatnonzero(np.diff(starts) == 1)
+    # Cada NaN inserido antes de um traço desloca o índice dele em uma posição
+    return x, y, (starts[single] + single).tolist()
+
+
+class SeriesArtists:
+    """
+    Um Line2D por série de um AnnotationStore, mantido entre redesenhos. As
+    mudanças atualizam (set_data), criam ou removem apenas as linhas das
+    séries informadas, sem limpar o eixo nem recriar a imagem de fundo.
+
+    As linhas são animadas: `blit()` restaura o fundo em cache (imagem, eixos
+    e títulos, copiado a cada redesenho completo) e desenha só as linhas,
+    então apagar ou resetar custa proporcionalmente ao número de anotações,
+    não ao tamanho da imagem. Cada traço da série (um clique ou um traçado,
+    ver annotation_store.Series) é desenhado separado dos outros, e os pontos
+    isolados ganham um marcador para continuarem visíveis.
+    """
+
+    def __init__(self, ax, store, linewidth=1, markersize=4):
+        self.ax = ax
+        self.canvas = ax.figure.canvas
+        self.store = store
+        self.linewidth = linewidth
+        self.markersize = markersize
+        self.lines = {}
+        self.background = None
+        self._cid_draw = self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.ax.bbox)
+        self._draw_lines()
+
+    def _draw_lines(self):
+        for line in self.lines.values():
+            self.ax.draw_artist(line)
+
+    def update(self, series_ids=None):
+        """
+        Sincroniza as linhas das séries informadas (todas, se None) com o store.
+        """
+        if series_ids is None:
+            series_ids = set(self.lines) | {series.id for series in self.store}
+        for series_id in series_ids:
+            series = self.store[series_id] if series_id in self.store else None
+            line = self.lines.get(series_id)
+            if series is None or len(series) == 0:
+                if line is not None:
+                    line.remove()
+                    del self.lines[series_id]
+            else:
+                x, y, isolated = _stroke_data(series)
+                if line is None:
+                    line, = self.ax.plot(x, y, "-", color=series.color, linewidth=self.linewidth, marker="o",
+                                         markersize=self.markersize, animated=True)
+                    self.lines[series_id] = line
+                else:
+                    line.set_data(x, y)
+                line.set_markevery(isolated)
+
+    def clear(self):
+        for line in self.lines.values():
+            line.remove()
+        self.lines = {}
+
+    def blit(self):
+        """
+        Redesenha as linhas sobre o fundo em cache. Antes do primeiro
+        redesenho completo, agenda um (que copia o fundo).
+        """
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_lines()
+        self.canvas.blit(self.ax.bbox)
+
+
+def _reduce_area(image):
+    import cv2
+
+    height, width = image.shape[:2]
+    return cv2.resize(image, (max(1, width // 2), max(1, height // 2)), interpolation=cv2.INTER_AREA)
+
+
+def _reduce_max(image):
+    # Máximo de cada bloco 2x2: traços finos claros (curvas na imagem sem
+    # grade) continuam visíveis nos níveis reduzidos
+    height, width = image.shape[:2]
+    image = image[:height - height % 2, :width - width % 2]
+    return np.maximum(np.maximum(image[0::2, 0::2], image[0::2, 1::2]),
+                      np.maximum(image[1::2, 0::2], image[1::2, 1::2]))
+
+
+class DisplayPyramid:
+    """
+    Imagem de fundo exibida a partir de uma pirâmide de resoluções. Os níveis
+    (metade da resolução a cada nível, até PYRAMID_MIN_SIDE) são gerados uma
+    vez; a cada mudança dos limites do eixo ou do tamanho do canvas, o
+    AxesImage passa a exibir o nível com resolução suficiente para a área
+    visível, recortado a essa área (com uma margem, para que um pan pequeno
+    não gere um novo recorte). O extent de cada recorte é calculado a partir
+    do extent da imagem inteira, então as anotações continuam exatas nas
+    coordenadas da resolução original.
+
+    `reduce="max"` preserva traços finos claros em imagens binárias (a imagem
+    sem grade); o padrão ("area") faz a média de cada bloco. Supõe
+    `origin="upper"`, como nas telas de anotação.
+    """
+
+    def __init__(self, ax, image, extent=None, reduce="area", margin=0.5, **imshow_kwargs):
+        self.ax = ax
+        self.reduce = reduce
+        self.margin = margin
+        self.levels = []
+        self.level = None
+        self.window = None
+        self._updating = False
+        height, width = image.shape[:2]
+        if extent is None:
+            # Mesmo extent padrão do imshow para a imagem inteira (origin="upper")
+            extent = [-0.5, width - 0.5, height - 0.5, -0.5]
+        self.extent = [float(value) for value in extent]
+        self.image = ax.imshow(image, extent=extent, **imshow_kwargs)
+        self.set_image(image, reduce)
+        self._cids = [ax.callbacks.connect("xlim_changed", self._on_view_changed),
+                      ax.callbacks.connect("ylim_changed", self._on_view_changed)]
+        self._cid_resize = ax.figure.canvas.mpl_connect("resize_event", self._on_view_changed)
+
+    def set_image(self, image, reduce=None, cmap=None):
+        """
+        Troca a imagem exibida (mesmo extent), gerando a pirâmide dela.
+        """
+        self.reduce = reduce or self.reduce
+        reduce_level = _reduce_max if self.reduce == "max" else _reduce_area
+        self.levels = [image]
+        while max(self.levels[-1].shape[:2]) > PYRAMID_MIN_SIDE:
+            self.levels.append(reduce_level(self.levels[-1]))
+        if cmap is not None:
+            self.image.set_cmap(cmap)
+        self.level = None
+        self.window = None
+        self.update()
+
+    def _visible_fraction(self):
+        # Área visível como fração da imagem: (coluna 0, coluna 1, linha 0, linha 1) em [0, 1]
+        x0, x1, y0, y1 = self.extent
+        view_x0, view_x1 = sorted(self.ax.get_xlim())
+        view_y0, view_y1 = sorted(self.ax.get_ylim())
+        columns = sorted(((view_x0 - x0) / (x1 - x0), (view_x1 - x0) / (x1 - x0)))
+        rows = sorted(((view_y0 - y1) / (y0 - y1), (view_y1 - y1) / (y0 - y1)))
+        return (max(0.0, columns[0]), min(1.0, columns[1]), max(0.0, rows[0]), min(1.0, rows[1]))
+
+    def level_for_view(self):
+        """
+        Nível mais grosso cuja resolução na área visível ainda é maior ou igual
+        à do canvas.
+        """
+        bbox = self.ax.bbox
+        if bbox.width <= 0 or bbox.height <= 0:
+            return 0
+        height, width = self.levels[0].shape[:2]
+        x0, x1, y0, y1 = self.extent
+        view_x0, view_x1 = self.ax.get_xlim()
+        view_y0, view_y1 = self.ax.get_ylim()
+        # Pixels da imagem original por pixel da tela, em cada direção
+        density_x = abs(view_x1 - view_x0) / abs(x1 - x0) * width / bbox.width
+        density_y = abs(view_y1 - view_y0) / abs(y1 - y0) * height / bbox.height
+        density = min(density_x, density_y)
+        if density < 2:
+            return 0
+        return min(int(math.log2(density)), len(self.levels) - 1)
+
+    def update(self):
+        level = self.level_for_view()
+        c0, c1, r0, r1 = self._visible_fraction()
+        if c0 >= c1 or r0 >= r1:
+            return  # Área visível fora da imagem
+        if level == self.level and self.window is not None:
+            w0, w1, h0, h1 = self.window
+            covers = w0 <= c0 and c1 <= w1 and h0 <= r0 and r1 <= h1
+            # Depois de um zoom, um recorte bem maior que a área visível é refeito
+            limit = 2 * (1 + 2 * self.margin)
+            if covers and w1 - w0 <= limit * (c1 - c0) and h1 - h0 <= limit * (r1 - r0):
+                return  # O recorte atual ainda cobre a área visível
+
+        # Recorte do nível com uma margem em volta da área visível
+        data = self.levels[level]
+        height, width = data.shape[:2]
+        pad_c, pad_r = (c1 - c0) * self.margin, (r1 - r0) * self.margin
+        col0 = max(0, int(math.floor((c0 - pad_c) * width)))
+        col1 = min(width, int(math.ceil((c1 + pad_c) * width)))
+        row0 = max(0, int(math.floor((r0 - pad_r) * height)))
+        row1 = min(height, int(math.ceil((r1 + pad_r) * height)))
+        self.level = level
+        self.window = (col0 / width, col1 / width, row0 / height, row1 / height)
+
+        x0, x1, y0, y1 = self.extent
+        w0, w1, h0, h1 = self.window
+        extent = [x0 + w0 * (x1 - x0), x0 + w1 * (x1 - x0), y1 + h1 * (y0 - y1), y1 + h0 * (y0 - y1)]
+        self._updating = True
+        try:
+            # O set_extent pode reajustar os limites do eixo: mantém a vista atual
+            xlim, ylim = self.ax.get_xlim(), self.ax.get_ylim()
+            self.image.set_data(data[row0:row1, col0:col1])
+            self.image.set_extent(extent)
+            self.ax.set_xlim(xlim, emit=False)
+            self.ax.set_ylim(ylim, emit=False)
+        finally:
+            self._updating = False
+
+    def _on_view_changed(self, *args):
+        # Chamado antes do redesenho (zoom, pan, redimensionamento), que já usa o novo nível
+        if not self._updating:
+            self.update()
@@ -1,6 +1,7 @@
 import customtkinter as ctk
-from nyquist import NyquistAnnotationApp
-from bode import BodeAnnotationApp
+
+# As telas de Nyquist e Bode (e suas dependências) são importadas apenas
+# depois da escolha do tipo de gráfico
 
 
 class NyquistBodeAnnotationApp:
@@ -54,8 +55,12 @@ class NyquistBodeAnnotationApp:
 
         # Direciona para o tipo de gráfico e modo apropriados
         if graph_type == "nyquist":
+            from nyquist import NyquistAnnotationApp
+
             NyquistAnnotationApp(mode_type)  # Passa o modo selecionado ("manual" ou "automatic")
         elif graph_type == "bode":
+            from bode import BodeAnnotationApp
+
             BodeAnnotationApp(mode_type)  # Passa o modo selecionado ("manual" ou "automatic")
 
     def on_closing(self):
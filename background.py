@@ -0,0 +1,129 @@
+"""
+Execução do pipeline em segundo plano para as telas do Tk.
+
+A tarefa roda em uma thread de trabalho e envia o progresso de cada etapa
+por uma fila thread-safe; a thread do Tk consulta a fila com `after()` e é a
+única que toca nos widgets. O cancelamento é cooperativo: a função de
+progresso levanta `Cancelled` na próxima etapa depois de `cancel()`.
+"""
+import queue
+import threading
+
+# Intervalo (ms) entre as consultas à fila feitas pela thread do Tk
+POLL_INTERVAL_MS = 50
+
+
+class Cancelled(Exception):
+    pass
+
+
+class BackgroundTask:
+    """
+    Executa `target(progress, *args, **kwargs)` em uma thread de trabalho.
+
+    `progress(stage, fraction)` deve ser chamado pelo alvo entre as etapas:
+    envia o progresso para a fila e levanta `Cancelled` se a tarefa tiver
+    sido cancelada. Se o alvo capturar a exceção (como o `process_graph`, que
+    devolve `(None, None)` em caso de erro), a tarefa ainda é tratada como
+    cancelada.
+    """
+
+    def __init__(self, target, *args, **kwargs):
+        self.target = target
+        self.args = args
+        self.kwargs = kwargs
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def progress(self, stage, fraction):
+        if self.cancel_event.is_set():
+            raise Cancelled("Processamento cancelado pelo usuário.")
+        self.messages.put(("progress", (stage, fraction)))
+
+    def _run(self):
+        try:
+            result = self.target(self.progress, *self.args, **self.kwargs)
+        except Cancelled:
+            self.messages.put(("cancelled", None))
+        except Exception as e:
+            self.messages.put(("cancelled", None) if self.cancelled else ("error", e))
+        else:
+            self.messages.put(("cancelled", None) if self.cancelled else ("done", result))
+
+    def poll(self, widget, on_done, on_progress=None, on_error=None, on_cancelled=None,
+             interval=POLL_INTERVAL_MS):
+        """
+        Consulta a fila a cada `interval` ms pelo `after()` de `widget` e chama
+        os callbacks na thread do Tk, até a tarefa terminar.
+        """
+        def check():
+            try:
+                while True:
+                    kind, payload = self.messages.get_nowait()
+                    if kind == "progress":
+                        if on_progress is not None:
+                            on_progress(*payload)
+                        continue
+                    if kind == "done":
+                        on_done(payload)
+                    elif kind == "error" and on_error is not None:
+                        on_error(payload)
+                    elif kind == "cancelled" and on_cancelled is not None:
+                        on_cancelled()
+                    return
+            except queue.Empty:
+                pass
+            widget.after(interval, check)
+
+        widget.after(interval, check)
+
+
+class ProgressWindow:
+    """
+    Janela de progresso com a etapa atual, uma barra e o botão Cancelar.
+    """
+
+    def __init__(self, master, task, title="Processando..."):
+        import customtkinter as ctk
+
+        self.task = task
+        self.window = ctk.CTkToplevel(master)
+        self.window.title(title)
+        self.window.geometry("360x150")
+        self.window.resizable(False, False)
+        self.window.transient(master)
+
+        self.label = ctk.CTkLabel(self.window, text="Iniciando...", font=("Manrope", 14))
+        self.label.pack(pady=(15, 5))
+        self.bar = ctk.CTkProgressBar(self.window, width=300)
+        self.bar.set(0)
+        self.bar.pack(pady=5)
+        self.cancel_button = ctk.CTkButton(self.window, text="Cancelar", font=("Manrope", 14), command=self.cancel)
+        self.cancel_button.pack(pady=10)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+
+    def update(self, stage, fraction):
+        self.label.configure(text=f"Etapa: {stage}")
+        self.bar.set(fraction)
+
+    def cancel(self):
+        self.task.cancel()
+        self.label.configure(text="Cancelando...")
+        self.cancel_button.configure(state="disabled")
+
+    def close(self):
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
@@ -0,0 +1,514 @@
+import argparse
+import glob
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+import image_processing
+from cache import DEFAULT_MAX_BYTES, StageCache
+from export import EXPORT_FORMATS, Calibration, CurveWriter, curve_columns, export_format, missing_dependency
+from instrumentation import Instrumentation, JsonLinesSink
+from job_queue import DEFAULT_MAX_ATTEMPTS, PENDING, ErrorSink, JobQueue, format_summary
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+# Sufixos dos nomes das imagens de um par de Bode (ver pair_bode_images)
+BODE_SUFFIXES = {"magnitude": ("_magnitude", "_mag"), "phase": ("_phase", "_fase")}
+
+# Um cache por processo de trabalho, criado na primeira imagem processada
+_worker_cache = None
+# Fila onde cada processo de trabalho avisa o início de cada item (ver _run_pool)
+_started = None
+
+
+def collect_images(source):
+    """
+    Lista as imagens de um diretório ou de um padrão glob, em ordem estável.
+    """
+    if os.path.isdir(source):
+        paths = [os.path.join(source, name) for name in os.listdir(source)]
+    else:
+        paths = glob.glob(source, recursive=True)
+    return sorted(p for p in paths if p.lower().endswith(IMAGE_EXTENSIONS) and os.path.isfile(p))
+
+
+def opencv_threads_per_worker(workers):
+    # Divide os núcleos entre os processos para não sobrecarregar a CPU
+    return max(1, (os.cpu_count() or 1) // max(1, workers))
+
+
+def _init_worker(cv_threads, started=None):
+    global _started
+    import cv2
+    cv2.setNumThreads(cv_threads)
+    _started = started
+
+
+def _tracked(function, item, *args, **kwargs):
+    if _started is not None:
+        _started.put(item)
+    return function(item, *args, **kwargs)
+
+
+def output_path_for(image_path, output_dir, output_format="csv", input_root=None):
+    """
+    Arquivo de curvas de uma imagem. Com `input_root`, os subdiretórios da
+    imagem abaixo dele são reproduzidos em `output_dir` (ex.: um glob
+    recursivo com `a/x.png` e `b/x.png`).
+    """
+    name = os.path.relpath(image_path, input_root) if input_root else os.path.basename(image_path)
+    extension = next(ext for ext, fmt in EXPORT_FORMATS.items() if fmt == output_format)
+    return os.path.join(output_dir, f"{os.path.splitext(name)[0]}{extension}")
+
+
+def output_paths(image_paths, output_dir, output_format="csv"):
+    """
+    Diretório de entrada comum às imagens e o arquivo de saída de cada uma.
+    Levanta ValueError se duas imagens gravariam no mesmo arquivo (ex.:
+    `x.png` e `x.jpg` no mesmo diretório).
+    """
+    input_root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in image_paths])
+    paths = {}
+    for path in image_paths:
+        output_path = output_path_for(os.path.abspath(path), output_dir, output_format, input_root)
+        if output_path in paths:
+            raise ValueError(f"{paths[output_path]} e {path} gravariam o mesmo arquivo {output_path}")
+        paths[output_path] = path
+    return input_root, {path: output_path for output_path, path in paths.items()}
+
+
+def calibration_for(shape, calibration=None):
+    """
+    Calibração pixel -> dados de uma imagem a partir dos argumentos de
+    `Calibration.from_image` (limites e escalas), ou None para exportar em pixels.
+    """
+    if not calibration:
+        return None
+    return Calibration.from_image(shape, **calibration)
+
+
+def _get_cache(cache_dir, cache_max_bytes):
+    global _worker_cache
+    if not cache_dir:
+        return None
+    if _worker_cache is None or _worker_cache.directory != cache_dir:
+        _worker_cache = StageCache(cache_dir, cache_max_bytes)
+    return _worker_cache
+
+
+def pair_bode_images(image_paths):
+    """
+    Agrupa as imagens de Bode em pares (magnitude, fase) pelo nome:
+    `<nome>_magnitude.png` / `<nome>_mag.png` com `<nome>_phase.png` / `<nome>_fase.png`.
+    Retorna (lista de pares, imagens sem par).
+    """
+    groups = {}
+    unmatched = []
+    for path in image_paths:
+        stem = os.path.splitext(path)[0]
+        for kind, suffixes in BODE_SUFFIXES.items():
+            suffix = next((s for s in suffixes if stem.lower().endswith(s)), None)
+            if suffix is not None:
+                groups.setdefault(stem[:-len(suffix)], {})[kind] = path
+                break
+        else:
+            unmatched.append(path)
+
+    pairs = []
+    for name in sorted(groups):
+        group = groups[name]
+        if "magnitude" in group and "phase" in group:
+            pairs.append((group["magnitude"], group["phase"]))
+        else:
+            unmatched.extend(group.values())
+    return pairs, sorted(unmatched)
+
+
+def _instrumentation_for(metrics_path, trace_memory, sinks=()):
+    sinks = list(sinks) + ([JsonLinesSink(metrics_path)] if metrics_path else [])
+    return Instrumentation(sinks, trace_memory) if sinks else None
+
+
+def _store_curves(image_path, image, curves, output_dir, output_format, calibration, colors=None, input_root=None):
+    # Com `output_dir`, grava um arquivo por imagem e retorna o caminho; sem ele,
+    # retorna as colunas calibradas para o processo principal gravar no arquivo combinado
+    if curves is None:
+        return None
+    columns = curve_columns(curves, calibration_for(image.shape, calibration), colors)
+    if output_dir is None:
+        return columns
+
+    output_path = output_path_for(os.path.abspath(image_path), output_dir, output_format, input_root)
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with CurveWriter(output_path, output_format) as writer:
+        writer.write(columns)
+    return output_path
+
+
+def process_one(image_path, output_dir, graph_type, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                memory_budget=None, output_format="csv", calibration=None, metrics_path=None, trace_memory=False,
+                segmentation=None, crop=False, colors=False, sinks=(), input_root=None):
+    """
+    Extrai as curvas de uma imagem. Retorna uma lista com
+    (imagem, arquivo de saída ou colunas do arquivo combinado ou None, segundos).
+    Com `colors`, as séries são separadas pela cor e a saída ganha a coluna
+    Color (ver image_processing.process_graph_by_color). `sinks` recebe os
+    registros de instrumentação além do arquivo de métricas. `input_root` é
+    repassado ao output_path_for.
+    """
+    start = time.perf_counter()
+    instrumentation = _instrumentation_for(metrics_path, trace_memory, sinks)
+    curve_colors = None
+    if colors:
+        image, series = image_processing.process_graph_by_color(image_path, graph_type,
+                                                                instrumentation=instrumentation,
+                                                                segmentation=segmentation, crop=crop)
+        curves = None
+        if series is not None:
+            curves = [curve for _, series_curves in series for curve in series_curves]
+            curve_colors = [color for color, series_curves in series for _ in series_curves]
+    else:
+        cache = _get_cache(cache_dir, cache_max_bytes)
+        image, curves = image_processing.process_graph(image_path, graph_type, cache=cache,
+                                                       memory_budget=memory_budget, instrumentation=instrumentation,
+                                                       segmentation=segmentation, crop=crop)
+    result = _store_curves(image_path, image, curves, output_dir, output_format, calibration, curve_colors,
+                           input_root)
+    return [(image_path, result, time.perf_counter() - start)]
+
+
+def process_pair(pair, output_dir, graph_type="bode", cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES,
+                 memory_budget=None, output_format="csv", calibration=None, metrics_path=None, trace_memory=False,
+                 segmentation=None, crop=False, input_root=None):
+    """
+    Extrai as curvas de um par (magnitude, fase) de Bode, processando as duas
+    imagens ao mesmo tempo. Retorna uma lista como a de `process_one`, com
+    uma entrada por imagem.
+    """
+    start = time.perf_counter()
+    cache = _get_cache(cache_dir, cache_max_bytes)
+    outputs = image_processing.process_bode_pair(*pair, cache=cache, memory_budget=memory_budget,
+                                                 instrumentation=_instrumentation_for(metrics_path, trace_memory),
+                                                 segmentation=segmentation, crop=crop)
+    elapsed = time.perf_counter() - start
+    return [(image_path, _store_curves(image_path, image, curves, output_dir, output_format, calibration,
+                                       input_root=input_root), elapsed)
+            for image_path, (image, curves) in zip(pair, outputs)]
+
+
+def process_queued(queue_path, params, max_attempts, output_dir, graph_type, *options, colors=False,
+                   input_root=None, job_ids=None):
+    """
+    Processa trabalhos da fila até não restar nenhum pendente com estes
+    parâmetros (um laço por processo de trabalho); com `job_ids`, só estes
+    trabalhos. O resultado, o tempo e o erro (a primeira etapa que falhou) de
+    cada imagem ficam registrados na fila. Retorna uma lista como a de
+    `process_one`, só com as imagens concluídas ou que esgotaram as tentativas.
+    """
+    errors = ErrorSink()
+    results = []
+    with JobQueue(queue_path, max_attempts) as jobs:
+        while True:
+            job = jobs.claim(params, job_ids=job_ids)
+            if job is None:
+                return results
+            errors.reset()
+            try:
+                image_path, result, elapsed = process_one(job.image, output_dir, graph_type, *options,
+                                                          colors=colors, sinks=[errors],
+                                                          input_root=input_root)[0]
+            except Exception as e:
+                image_path, result, elapsed = job.image, None, None
+                errors.error = errors.error or f"{type(e).__name__}: {e}"
+            if result is None:
+                print(f"Falha ao processar {image_path} (tentativa {job.attempts}): {errors.error}")
+                status = jobs.fail(job, errors.error or "Falha ao processar a imagem", elapsed)
+                if status == PENDING:
+                    continue
+                recorded = status is not None
+            else:
+                recorded = jobs.complete(job, result, elapsed)
+            if not recorded:
+                # Devolvido à fila durante o processamento (ver JobQueue.requeue_stale)
+                print(f"{image_path}: trabalho retomado por outro processo; resultado descartado.")
+                continue
+            results.append((image_path, result, elapsed))
+
+
+def _run_queue(queue_path, max_attempts, params, image_paths, output_dir, graph_type, workers, cv_threads, options,
+               colors, input_root):
+    images = [os.path.abspath(path) for path in image_paths]
+
+    def run(pool_workers, job_ids=None):
+        # Retorna False se um processo de trabalho morreu (BrokenProcessPool)
+        try:
+            with ProcessPoolExecutor(max_workers=pool_workers, initializer=_init_worker,
+                                     initargs=(cv_threads,)) as executor:
+                futures = [executor.submit(process_queued, queue_path, params, max_attempts, output_dir,
+                                           graph_type, *options, colors=colors, input_root=input_root,
+                                           job_ids=job_ids)
+                           for _ in range(pool_workers)]
+                for future in as_completed(futures):
+                    future.result()
+            return True
+        except BrokenProcessPool:
+            return False
+
+    with JobQueue(queue_path, max_attempts) as jobs:
+        # Trabalhos interrompidos em uma execução anterior: repetidos um a um, como depois de uma queda
+        suspects = jobs.release_interrupted()
+        recovered = len(suspects) + jobs.requeue_stale() + jobs.retry_failed(params)
+        added = jobs.add(images, params)
+        print(f"Fila {queue_path}: {added} trabalhos novos, {jobs.pending(params)} pendentes"
+              + (f", {recovered} retomados (interrompidos ou com novas tentativas)" if recovered else ""))
+        while jobs.pending(params):
+            if suspects:
+                # Um processo e um trabalho por vez: se ele morrer, a culpa é do trabalho em andamento
+                if run(1, suspects):
+                    suspects = []
+                else:
+                    print(f"Um processo de trabalho foi interrompido; "
+                          f"{jobs.requeue_stale()} trabalho voltou para a fila (contando uma tentativa).")
+                continue
+            if run(workers):
+                break
+            # Ex.: falta de memória em uma imagem. O pool encerra todos os
+            # processos, então os trabalhos em andamento voltam à fila sem
+            # contar a tentativa e são repetidos um a um para achar o culpado
+            suspects = jobs.release_interrupted()
+            print(f"Um processo de trabalho foi interrompido; {len(suspects)} trabalhos em andamento "
+                  f"serão repetidos um a um.")
+        print(format_summary(jobs.summary()))
+        return jobs.results(images, params)
+
+
+def run_batch(image_paths, output_dir, graph_type="nyquist", workers=None, cache_dir=None,
+              cache_max_bytes=DEFAULT_MAX_BYTES, memory_budget=None, output_format="csv",
+              calibration=None, combined_path=None, metrics_path=None, trace_memory=False, pairs=False,
+              segmentation=None, crop=False, colors=False, queue_path=None, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Processa as imagens em paralelo e grava um arquivo de curvas por imagem
+    (CSV, Parquet, npz ou HDF5). Com `combined_path`, as curvas de todas as
+    imagens são gravadas em um único arquivo, bloco a bloco, à medida que
+    ficam prontas. Com `metrics_path`, as medições de cada etapa são
+    acrescentadas a um arquivo JSON-lines. Com `pairs` (Bode), as imagens de
+    magnitude e fase de cada par são processadas juntas (ver pair_bode_images).
+    `segmentation` escolhe o método de segmentação das curvas
+    (image_processing.SEGMENTATION_METHODS). Com `crop`, as etapas de imagem
+    processam só a área do gráfico (ver plot_area.py). Com `colors`, as séries de cada
+    imagem são separadas pela cor (sem cache nem processamento em blocos).
+    Os arquivos por imagem reproduzem os subdiretórios abaixo do diretório
+    comum às imagens; levanta ValueError se duas imagens gravariam no mesmo
+    arquivo (ver output_paths). Com `queue_path`, o estado de cada imagem fica em uma fila SQLite (ver
+    job_queue.py): uma nova execução pula as imagens já concluídas e as
+    falhas são repetidas até `max_attempts` vezes.
+    Retorna a lista de (imagem, arquivo de saída ou None, segundos).
+    """
+    workers = workers or os.cpu_count() or 1
+    cv_threads = opencv_threads_per_worker(workers)
+    writer = None
+    input_root = None
+    if combined_path:
+        os.makedirs(os.path.dirname(os.path.abspath(combined_path)), exist_ok=True)
+        writer = CurveWriter(combined_path)
+        output_dir = None
+    else:
+        input_root, _ = output_paths(image_paths, output_dir, output_format)
+        os.makedirs(output_dir, exist_ok=True)
+
+    print(f"Processando {len(image_paths)} imagens com {workers} processos "
+          f"({cv_threads} threads OpenCV por processo)...")
+    start = time.perf_counter()
+    options = (cache_dir, cache_max_bytes, memory_budget, output_format, calibration, metrics_path, trace_memory,
+               segmentation, crop)
+    try:
+        if queue_path:
+            # Parâmetros que mudam o resultado: outra combinação gera outros trabalhos
+            params = {"graph_type": graph_type, "output_dir": os.path.abspath(output_dir), "format": output_format,
+                      "calibration": calibration, "segmentation": segmentation, "crop": crop, "colors": colors}
+            results = _run_queue(queue_path, max_attempts, params, image_paths, output_dir, graph_type, workers,
+                                 cv_threads, options, colors, input_root)
+        else:
+            results = _run_pool(image_paths, output_dir, graph_type, workers, cv_threads, options, pairs, colors,
+                                writer, combined_path, input_root)
+    finally:
+        # Fecha o arquivo combinado mesmo se o lote for interrompido (o Parquet só é válido com o rodapé)
+        if writer is not None:
+            writer.close()
+    total = time.perf_counter() - start
+
+    succeeded = sum(1 for _, output_path, _ in results if output_path is not None)
+    if queue_path:
+        # Os resultados incluem imagens concluídas em execuções anteriores (a vazão está no resumo da fila)
+        print(f"Concluído: {succeeded}/{len(results)} imagens")
+        return results
+    throughput = len(results) / total if total > 0 else 0.0
+    print(f"Concluído: {succeeded}/{len(results)} imagens em {total:.2f} s ({throughput:.2f} imagens/s)")
+    return results
+
+
+def _run_pool(image_paths, output_dir, graph_type, workers, cv_threads, options, pairs, colors, writer,
+              combined_path, input_root):
+    results = []
+    if pairs:
+        items, unmatched = pair_bode_images(image_paths)
+        for path in unmatched:
+            print(f"Imagem sem par de magnitude/fase: {path}")
+            results.append((path, None, 0.0))
+        function, args = process_pair, (output_dir, graph_type, *options)
+    else:
+        items = list(image_paths)
+        function, args = process_one, (output_dir, graph_type, *options, colors)
+
+    def record(outputs):
+        for image_path, result, elapsed in outputs:
+            if result is None:
+                print(f"Falha ao processar {image_path}")
+            elif writer is not None:
+                # Acrescenta as colunas desta imagem ao arquivo combinado
+                writer.write({"Image": np.full(len(result["Curve"]), image_path), **result})
+                result = combined_path
+            results.append((image_path, result, elapsed))
+
+    def record_failure(item, error):
+        for image_path in (item if pairs else [item]):
+            print(f"Falha ao processar {image_path}: {error}")
+            results.append((image_path, None, 0.0))
+
+    while items:
+        interrupted, running = _run_pool_round(items, function, args, input_root, workers, cv_threads, record,
+                                               record_failure)
+        if not interrupted:
+            break
+        # Um processo de trabalho foi encerrado (ex.: falta de memória). Não se
+        # sabe qual item o derrubou: os que estavam em andamento são repetidos um
+        # a um, e os que ainda não tinham começado voltam ao pool completo
+        suspects = [item for item in interrupted if item in running]
+        print(f"Um processo de trabalho foi interrompido; {len(suspects)} itens em andamento serão repetidos "
+              f"isoladamente e {len(interrupted) - len(suspects)} voltam para o pool.")
+        for item in suspects:
+            if _run_pool_round([item], function, args, input_root, 1, cv_threads, record, record_failure)[0]:
+                record_failure(item, "Processo de trabalho interrompido")
+        items = [item for item in interrupted if item not in running]
+    return results
+
+
+def _run_pool_round(items, function, args, input_root, workers, cv_threads, record, record_failure):
+    """
+    Processa os itens em um pool novo. Retorna os itens perdidos porque um
+    processo de trabalho foi encerrado e o conjunto dos que já tinham começado.
+    """
+    started = multiprocessing.SimpleQueue()
+    interrupted = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(cv_threads, started)) as executor:
+        futures = {executor.submit(_tracked, function, item, *args, input_root=input_root): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                outputs = future.result()
+            except BrokenProcessPool:
+                interrupted.append(item)
+                continue
+            except Exception as e:
+                # Ex.: erro ao gravar o arquivo de saída: só esta imagem falha
+                record_failure(item, f"{type(e).__name__}: {e}")
+                continue
+            record(outputs)
+    running = set()
+    while not started.empty():
+        running.add(started.get())
+    return interrupted, running
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Extração automática de curvas em lote (sem interface gráfica).")
+    parser.add_argument("source", help="Diretório ou padrão glob com as imagens (ex.: 'figuras/**/*.png').")
+    parser.add_argument("-o", "--output-dir", default="curvas", help="Diretório de saída dos arquivos de curvas.")
+    parser.add_argument("-f", "--format", choices=sorted(set(EXPORT_FORMATS.values())), default="csv",
+                        help="Formato dos arquivos por imagem.")
+    parser.add_argument("--combined", default=None,
+                        help="Grava as curvas de todas as imagens em um único arquivo (formato pela extensão).")
+    parser.add_argument("--x-limits", type=float, nargs=2, default=None, metavar=("MIN", "MAX"),
+                        help="Valores do eixo x nas bordas esquerda e direita da imagem (padrão: pixels).")
+    parser.add_argument("--y-limits", type=float, nargs=2, default=None, metavar=("MIN", "MAX"),
+                        help="Valores do eixo y nas bordas inferior e superior da imagem (padrão: pixels).")
+    parser.add_argument("--x-scale", choices=["linear", "log"], default=None,
+                        help="Escala do eixo x (padrão: log para Bode, linear para Nyquist).")
+    parser.add_argument("--y-scale", choices=["linear", "log"], default="linear")
+    parser.add_argument("-t", "--graph-type", choices=["nyquist", "bode"], default="nyquist")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Número de processos (padrão: núcleos da CPU).")
+    parser.add_argument("--cache-dir", default=None, help="Diretório do cache de etapas (desativado se omitido).")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="Tamanho máximo do cache em MB.")
+    parser.add_argument("--memory-budget-mb", type=int, default=None,
+                        help="Processa cada imagem em blocos com este limite de memória temporária (MB).")
+    parser.add_argument("--metrics", default=None,
+                        help="Acrescenta as medições de cada etapa (tempo, memória, contagens, erros) a um arquivo JSON-lines.")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Mede o pico de memória de cada etapa com o tracemalloc (mais lento).")
+    parser.add_argument("--pairs", action="store_true",
+                        help="Bode: processa juntas as imagens <nome>_magnitude e <nome>_phase (ou _mag/_fase).")
+    parser.add_argument("--segmentation", choices=image_processing.SEGMENTATION_METHODS, default=None,
+                        help="Segmentação das curvas: contornos externos (padrão) ou linhas centrais pelo esqueleto.")
+    parser.add_argument("--crop", action="store_true",
+                        help="Recorta a área do gráfico (eixos) antes das etapas de imagem.")
+    parser.add_argument("--colors", action="store_true",
+                        help="Separa as séries pela cor (gráficos coloridos); a saída ganha a coluna Color.")
+    parser.add_argument("--queue", default=None,
+                        help="Fila SQLite com o estado de cada imagem: uma nova execução retoma de onde parou.")
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="Tentativas por imagem antes de marcá-la como falha (com --queue).")
+    args = parser.parse_args(argv)
+    if args.pairs and args.graph_type != "bode":
+        parser.error("--pairs só pode ser usado com --graph-type bode")
+    if args.pairs and args.colors:
+        parser.error("--colors não pode ser usado com --pairs")
+    if args.queue and (args.pairs or args.combined):
+        parser.error("--queue não pode ser usado com --pairs nem com --combined")
+    if args.combined:
+        try:
+            export_format(args.combined)
+        except ValueError:
+            parser.error(f"--combined: extensão não suportada (use {', '.join(EXPORT_FORMATS)})")
+    output_format = export_format(args.combined) if args.combined else args.format
+    missing = missing_dependency(output_format)
+    if missing:
+        parser.error(f"o formato {output_format} requer o pacote {missing} (pip install {missing})")
+
+    image_paths = collect_images(args.source)
+    if not image_paths:
+        print(f"Nenhuma imagem encontrada em {args.source}")
+        return 1
+
+    memory_budget = args.memory_budget_mb * 1024 * 1024 if args.memory_budget_mb else None
+    x_scale = args.x_scale or ("log" if args.graph_type == "bode" else "linear")
+    calibration = None
+    if args.x_limits or args.y_limits:
+        calibration = {"x_limits": args.x_limits, "y_limits": args.y_limits,
+                       "x_scale": x_scale, "y_scale": args.y_scale}
+        try:
+            calibration_for((1, 1), calibration)
+        except ValueError as e:
+            print(f"Calibração inválida: {e}")
+            return 1
+
+    if not args.combined:
+        try:
+            output_paths(image_paths, args.output_dir, args.format)
+        except ValueError as e:
+            print(f"Nomes de saída repetidos: {e}")
+            return 1
+
+    results = run_batch(image_paths, args.output_dir, args.graph_type, args.workers,
+                        args.cache_dir, args.cache_max_mb * 1024 * 1024, memory_budget,
+                        args.format, calibration, args.combined, args.metrics, args.trace_memory, args.pairs,
+                        args.segmentation, args.crop, args.colors, args.queue, args.max_attempts)
+    return 0 if all(output_path is not None for _, output_path, _ in results) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
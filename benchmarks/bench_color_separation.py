@@ -0,0 +1,80 @@
+"""
+Compara a extração em cinza (process_graph) com a separação por cor
+(process_graph_by_color) em gráficos de Nyquist sintéticos com três séries
+coloridas que se cruzam, em várias resoluções.
+
+Para cada série de referência, o erro é a mediana da distância dos pontos
+extraídos à curva, e a cobertura é a fração da curva com algum ponto
+extraído a até alguns pixels. Na separação por cor, cada série é comparada
+apenas com as curvas da série de cor correspondente.
+
+Uso: python benchmarks/bench_color_separation.py [--repeat 3]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import image_processing  # noqa: E402
+from synthetic import SERIES_COLORS, colored_nyquist_figure  # noqa: E402
+
+RESOLUTIONS = [(600, 800), (1200, 1600), (2400, 3200)]
+
+
+def timed(function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def series_error(curves, reference, tolerance):
+    if not curves:
+        return float("nan"), 0.0
+    extracted = np.concatenate(curves)
+    distances, _ = cKDTree(reference).query(extracted)
+    covered, _ = cKDTree(extracted).query(reference, distance_upper_bound=tolerance)
+    return float(np.median(distances)), float(np.isfinite(covered).mean())
+
+
+def nearest_color(color, colors):
+    # Série de referência com a cor mais próxima da cor estimada ("#rrggbb")
+    rgb = np.array([int(color[i:i + 2], 16) for i in (1, 3, 5)])
+    return int(np.argmin([np.abs(rgb - np.array(c[::-1])).sum() for c in colors]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{'resolução':>10} {'modo':>6} {'tempo (ms)':>11} {'curvas':>7}  erro mediano / cobertura por série")
+    for height, width in RESOLUTIONS:
+        image, truth = colored_nyquist_figure(height, width)
+        tolerance = 2.0 * max(2, width // 400)
+
+        elapsed, (_, curves) = timed(lambda: image_processing.process_graph(image, "nyquist"), args.repeat)
+        # Sem a cor, qualquer curva pode ser de qualquer série
+        scores = [series_error(curves or [], reference, tolerance) for reference in truth]
+        print(f"{width:>5}x{height:<4} {'cinza':>6} {elapsed * 1000:11.1f} {len(curves or []):7d}  "
+              + "  ".join(f"{e:.1f}/{c:.2f}" for e, c in scores))
+
+        elapsed, (_, series) = timed(lambda: image_processing.process_graph_by_color(image, "nyquist"), args.repeat)
+        by_reference = {}
+        for color, series_curves in series or []:
+            by_reference.setdefault(nearest_color(color, SERIES_COLORS), []).extend(series_curves)
+        scores = [series_error(by_reference.get(i, []), reference, tolerance) for i, reference in enumerate(truth)]
+        print(f"{width:>5}x{height:<4} {'cor':>6} {elapsed * 1000:11.1f} {len(series or []):7d}  "
+              + "  ".join(f"{e:.1f}/{c:.2f}" for e, c in scores))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Compara os métodos de remoção da grade (Hough, morfologia e projeção) em
+gráficos de Bode sintéticos com grade, em várias resoluções.
+
+Uso: python benchmarks/bench_grid_removal.py [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import image_processing  # noqa: E402
+
+RESOLUTIONS = [(600, 800), (1500, 2000), (3000, 4000)]
+METHODS = ["hough", "morphology", "projection"]
+
+
+def gridded_bode_figure(height, width, divisions=20):
+    image = np.full((height, width), 255, np.uint8)
+    for x in np.linspace(0, width - 1, divisions).astype(int):
+        cv2.line(image, (int(x), 0), (int(x), height - 1), 160, max(1, width // 800))
+    for y in np.linspace(0, height - 1, divisions).astype(int):
+        cv2.line(image, (0, int(y)), (width - 1, int(y)), 160, max(1, width // 800))
+
+    # Curva de magnitude de um filtro passa-baixas em escala log
+    frequency = np.logspace(0, 5, 2000)
+    magnitude = 20 * np.log10(1 / np.sqrt(1 + (frequency / 1e3) ** 2))
+    x = (np.log10(frequency) / 5 * (width - 1)).astype(np.int32)
+    y = ((magnitude - magnitude.max()) / (magnitude.min() - magnitude.max()) * 0.8 * height + 0.1 * height)
+    points = np.column_stack([x, y.astype(np.int32)])
+    cv2.polylines(image, [points], False, 0, max(2, width // 400))
+    return image
+
+
+def time_method(image, method, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = image_processing.remove_grid_lines(image, "bode", method=method)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{'resolução':>12} {'método':>12} {'tempo (ms)':>12} {'pixels removidos':>18}")
+    for height, width in RESOLUTIONS:
+        processed = image_processing.preprocess_image(gridded_bode_figure(height, width), "bode")
+        before = cv2.countNonZero(processed)
+        for method in METHODS:
+            elapsed, result = time_method(processed, method, args.repeat)
+            removed = before - cv2.countNonZero(result)
+            print(f"{width}x{height:<7} {method:>12} {elapsed * 1000:12.1f} {removed:18d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Mede o tempo de importação (partida a frio) dos pontos de entrada em
+processos novos e falha se algum passar do orçamento.
+
+Também verifica que o modo em lote (batch.py) não importa Tk nem matplotlib.
+
+Uso: python benchmarks/bench_import_time.py [--repeat 5] [--app-budget 0.5] [--batch-budget 1.0]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que não podem ser carregados pelo modo em lote
+HEADLESS_FORBIDDEN = ["tkinter", "customtkinter", "matplotlib"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": sorted(sys.modules)}}))
+"""
+
+
+def import_time(module, repeat):
+    """
+    Menor tempo de importação de `module` em `repeat` interpretadores novos,
+    e os módulos carregados na última execução.
+    """
+    best, modules = None, []
+    for _ in range(repeat):
+        process = subprocess.run([sys.executable, "-c", _PROBE.format(module=module)], cwd=ROOT,
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            raise ImportError(process.stderr.strip().splitlines()[-1])
+        result = json.loads(process.stdout.strip().splitlines()[-1])
+        best = result["seconds"] if best is None else min(best, result["seconds"])
+        modules = result["modules"]
+    return best, modules
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--app-budget", type=float, default=0.5, help="Orçamento (s) para importar app.py.")
+    parser.add_argument("--batch-budget", type=float, default=1.0, help="Orçamento (s) para importar batch.py.")
+    args = parser.parse_args(argv)
+
+    failures = []
+    for module, budget in (("app", args.app_budget), ("batch", args.batch_budget)):
+        try:
+            seconds, modules = import_time(module, args.repeat)
+        except ImportError as e:
+            print(f"{module:>8}: falha ao importar: {e}")
+            failures.append(f"{module} não importa")
+            continue
+        status = "ok" if seconds <= budget else "ACIMA DO ORÇAMENTO"
+        print(f"{module:>8}: {seconds * 1000:8.1f} ms (orçamento {budget * 1000:.0f} ms) {status}")
+        if seconds > budget:
+            failures.append(f"{module} levou {seconds:.3f} s")
+
+        if module == "batch":
+            loaded = [name for name in HEADLESS_FORBIDDEN if name in modules]
+            if loaded:
+                print(f"{module:>8}: importa módulos de interface gráfica: {', '.join(loaded)}")
+                failures.append(f"{module} importa {', '.join(loaded)}")
+
+    if failures:
+        print("Falhou: " + "; ".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,107 @@
+"""
+Compara o custo por imagem de iniciar o modo em lote a cada figura
+(`python batch.py` em um subprocesso: interpretador, imports e pool de
+processos) com o de um pedido ao serviço local (server.py) já aquecido, e
+mede a vazão do serviço com vários clientes simultâneos.
+
+Uso: python benchmarks/bench_server.py [--requests 40] [--clients 8] [--workers 2]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+
+import cv2
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server  # noqa: E402
+from synthetic import figure_suite  # noqa: E402
+
+
+def cold_runs(image_path, output_dir, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(ROOT, "batch.py"), os.path.dirname(image_path),
+                        "-o", output_dir, "-j", "1"], capture_output=True, check=True)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def post(url, body):
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, data=body)) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--cold", type=int, default=3, help="Execuções do batch.py em subprocesso.")
+    args = parser.parse_args(argv)
+
+    _, image, _ = figure_suite(600, 800)["nyquist_randles"]
+    body = cv2.imencode(".png", image)[1].tobytes()
+    with tempfile.TemporaryDirectory() as directory:
+        image_path = os.path.join(directory, "figuras", "nyquist.png")
+        os.makedirs(os.path.dirname(image_path))
+        cv2.imwrite(image_path, image)
+        cold = cold_runs(image_path, os.path.join(directory, "curvas"), args.cold)
+    print(f"batch.py por figura (partida a frio): mediana {statistics.median(cold) * 1000:.0f} ms")
+
+    start = time.perf_counter()
+    service = server.ExtractionService(args.workers, queue_size=args.requests)
+    service.start()
+    print(f"Início do serviço (processos aquecidos): {(time.perf_counter() - start) * 1000:.0f} ms")
+    http = server.create_server(service, port=0)
+    threading.Thread(target=http.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http.server_address[1]}/extract"
+    try:
+        latencies = []
+        for _ in range(10):
+            start = time.perf_counter()
+            post(url, body)
+            latencies.append(time.perf_counter() - start)
+        print(f"Pedido ao serviço (um cliente): mediana {statistics.median(latencies) * 1000:.0f} ms")
+
+        statuses = []
+        remaining = iter(range(args.requests))
+        lock = threading.Lock()
+
+        def client():
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                statuses.append(post(url, body))
+
+        start = time.perf_counter()
+        clients = [threading.Thread(target=client) for _ in range(args.clients)]
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f"{args.clients} clientes, {args.requests} pedidos: {args.requests / elapsed:.1f} figuras/s, "
+              f"{statuses.count(200)} respondidos com 200, {statuses.count(503)} com 503")
+    finally:
+        http.shutdown()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Benchmark do pipeline de extração em figuras sintéticas com verdade de
+referência (benchmarks/synthetic.py).
+
+Para cada figura e resolução, mede o tempo e o pico de memória de cada etapa
+(pré-processamento, símbolos, grade, segmentação e refinamento) e o erro das
+curvas extraídas em relação às curvas desenhadas. Os resultados são gravados
+em JSON, para comparar versões com um diff.
+
+Uso: python benchmarks/run_benchmarks.py [--output resultados.json] [--repeat 3] [--quick]
+
+O pico de memória vem do tracemalloc: inclui os arrays NumPy (também os
+devolvidos pelo OpenCV), mas não os buffers internos do OpenCV.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from scipy.spatial import cKDTree
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import image_processing  # noqa: E402
+from plot_area import uncrop  # noqa: E402
+from synthetic import figure_suite  # noqa: E402
+
+RESOLUTIONS = [(600, 800), (1200, 1600), (2400, 3200)]
+
+
+def pipeline_stages(graph_type, segmentation=None, crop=False):
+    stages = [
+        ("preprocess", lambda image: image_processing.preprocess_image(image, graph_type)),
+        ("symbols", lambda image: image_processing.remove_text_and_symbols(image, graph_type)),
+        ("grid", lambda image: image_processing.remove_grid_lines(image, graph_type)),
+        ("segment", lambda image: image_processing.segment_curves(image, method=segmentation)),
+        ("refine", image_processing.refine_curves),
+    ]
+    if not crop:
+        return stages
+
+    # Recorta a área do gráfico antes do pré-processamento e devolve a imagem
+    # sem grade ao tamanho original, como o process_graph
+    area = {}
+
+    def detect(image):
+        view, area["box"] = image_processing.crop_to_plot_area(image)
+        area["shape"] = image.shape
+        return view
+
+    def grid(image):
+        return uncrop(image_processing.remove_grid_lines(image, graph_type), area["box"], area["shape"])
+
+    return [("plot_area", detect)] + stages[:2] + [("grid", grid)] + stages[3:]
+
+
+def measure(function, argument, repeat):
+    """
+    Menor tempo de parede em `repeat` execuções e pico de memória de uma execução.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(argument)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    function(argument)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, min(timings), peak
+
+
+def curve_error(curves, truth, tolerance):
+    """
+    Erro das curvas extraídas em pixels: distância de cada ponto extraído à
+    curva de referência mais próxima (média, p95 e máximo) e cobertura, a
+    fração da referência com algum ponto extraído a até `tolerance` pixels.
+    """
+    reference = np.concatenate(truth)
+    if not curves:
+        return {"mean_px": None, "p95_px": None, "max_px": None, "coverage": 0.0}
+    extracted = np.concatenate(curves)
+    distances, _ = cKDTree(reference).query(extracted)
+    covered, _ = cKDTree(extracted).query(reference, distance_upper_bound=tolerance)
+    return {
+        "mean_px": float(distances.mean()),
+        "p95_px": float(np.percentile(distances, 95)),
+        "max_px": float(distances.max()),
+        "coverage": float(np.isfinite(covered).mean()),
+    }
+
+
+def run_figure(graph_type, image, truth, repeat, segmentation=None, crop=False):
+    stages = {}
+    data = image
+    for name, function in pipeline_stages(graph_type, segmentation, crop):
+        data, elapsed, peak = measure(function, data, repeat)
+        stages[name] = {"wall_s": elapsed, "peak_bytes": peak}
+        if data is None:
+            break
+
+    curves = data if data is not None else []
+    # O contorno externo de um traço de espessura w fica a ~w/2 do centro
+    tolerance = 2.0 * max(2, image.shape[1] // 400)
+    return {
+        "stages": stages,
+        "total_s": sum(stage["wall_s"] for stage in stages.values()),
+        "curves_found": len(curves),
+        "curves_expected": len(truth),
+        "error": curve_error(curves, truth, tolerance),
+    }
+
+
+def environment():
+    try:
+        revision = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        "revision": revision,
+        "python": platform.python_version(),
+        "opencv": cv2.__version__,
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", default="benchmark_results.json", help="Arquivo JSON de saída.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--quick", action="store_true", help="Apenas a menor resolução.")
+    parser.add_argument("--segmentation", choices=image_processing.SEGMENTATION_METHODS, default=None,
+                        help="Método de segmentação das curvas (padrão: contornos).")
+    parser.add_argument("--crop", action="store_true",
+                        help="Recorta a área do gráfico (eixos) antes das etapas de imagem.")
+    args = parser.parse_args(argv)
+
+    results = []
+    print(f"{'figura':>16} {'resolução':>10} {'tempo (ms)':>11} {'pico (MB)':>10} {'erro médio':>11} {'cobertura':>10}")
+    for height, width in RESOLUTIONS[:1] if args.quick else RESOLUTIONS:
+        for name, (graph_type, image, truth) in figure_suite(height, width).items():
+            result = run_figure(graph_type, image, truth, args.repeat, args.segmentation, args.crop)
+            result.update({"figure": name, "graph_type": graph_type, "width": width, "height": height,
+                           "segmentation": args.segmentation or image_processing.DEFAULT_SEGMENTATION_METHOD,
+                           "crop": args.crop})
+            results.append(result)
+
+            peak = max(stage["peak_bytes"] for stage in result["stages"].values()) / 2 ** 20
+            mean_error = result["error"]["mean_px"]
+            print(f"{name:>16} {width:>5}x{height:<4} {result['total_s'] * 1000:11.1f} {peak:10.1f} "
+                  f"{mean_error if mean_error is not None else float('nan'):11.2f} {result['error']['coverage']:10.2f}")
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"environment": environment(), "results": results}, file, indent=2)
+    print(f"Resultados salvos em {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Gerador de figuras sintéticas de Nyquist e Bode com curvas conhecidas.
+
+Cada figura é desenhada com OpenCV (grade, moldura, rótulos dos eixos,
+marcadores e legenda) a partir da impedância de circuitos de Randles, com ou
+sem cauda de Warburg. Junto com a imagem é devolvida a verdade de referência:
+as curvas em coordenadas de pixel, amostradas densamente.
+"""
+import cv2
+import numpy as np
+
+# Fração da imagem reservada para margens (rótulos e ticks)
+MARGIN = 0.12
+FREQUENCIES = np.logspace(-2, 6, 4000)
+
+# Circuitos usados nas figuras: resistência da solução, de transferência de
+# carga, capacitância da dupla camada e coeficiente de Warburg
+RANDLES = {"r_s": 20.0, "r_ct": 250.0, "c_dl": 2e-5, "sigma": 0.0}
+RANDLES_WARBURG = {"r_s": 20.0, "r_ct": 250.0, "c_dl": 2e-5, "sigma": 60.0}
+SECOND_SERIES = {"r_s": 35.0, "r_ct": 120.0, "c_dl": 5e-5, "sigma": 30.0}
+# Cores (BGR) das séries nas figuras coloridas: azul, laranja e verde do matplotlib
+SERIES_COLORS = ((180, 119, 31), (14, 127, 255), (44, 160, 44))
+
+
+def randles_impedance(frequency, r_s, r_ct, c_dl, sigma=0.0):
+    """
+    Impedância complexa de Rs + (Cdl || (Rct + Zw)), com Zw = sigma (1 - j) / sqrt(w).
+    """
+    omega = 2 * np.pi * np.asarray(frequency, dtype=np.float64)
+    warburg = sigma * (1 - 1j) / np.sqrt(omega)
+    return r_s + 1 / (1j * omega * c_dl + 1 / (r_ct + warburg))
+
+
+def _plot_box(height, width):
+    return (int(MARGIN * width), int(MARGIN * height), int((1 - MARGIN / 2) * width), int((1 - MARGIN) * height))
+
+
+def _line_width(width):
+    return max(2, width // 400)
+
+
+def _to_pixels(x, y, x_range, y_range, box):
+    x0, y0, x1, y1 = box
+    px = x0 + (x - x_range[0]) / (x_range[1] - x_range[0]) * (x1 - x0)
+    py = y1 - (y - y_range[0]) / (y_range[1] - y_range[0]) * (y1 - y0)
+    return np.column_stack([px, py])
+
+
+def _draw_axes(image, box, divisions, x_labels, y_labels, x_title, y_title, grid=True):
+    height, width = image.shape
+    x0, y0, x1, y1 = box
+    thin = max(1, width // 800)
+    font_scale = width / 1600
+    if grid:
+        for x in np.linspace(x0, x1, divisions + 1).astype(int):
+            cv2.line(image, (int(x), y0), (int(x), y1), 180, thin)
+        for y in np.linspace(y0, y1, divisions + 1).astype(int):
+            cv2.line(image, (x0, int(y)), (x1, int(y)), 180, thin)
+    cv2.rectangle(image, (x0, y0), (x1, y1), 0, thin + 1)
+
+    # Rótulos dos ticks e títulos dos eixos
+    for x, label in zip(np.linspace(x0, x1, len(x_labels)), x_labels):
+        cv2.putText(image, label, (int(x) - int(20 * font_scale), y1 + int(40 * font_scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, thin)
+    for y, label in zip(np.linspace(y1, y0, len(y_labels)), y_labels):
+        cv2.putText(image, label, (int(0.02 * width), int(y) + int(8 * font_scale)),
+                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, thin)
+    cv2.putText(image, x_title, ((x0 + x1) // 2, height - int(0.02 * height)),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, thin)
+    cv2.putText(image, y_title, (int(0.01 * width), y0 - int(0.03 * height)),
+                cv2.FONT_HERSHEY_SIMPLEX, font_scale, 0, thin)
+
+
+def _draw_series(image, points, markers=False, label=None, legend_row=0):
+    height, width = image.shape
+    thickness = _line_width(width)
+    cv2.polylines(image, [np.round(points).astype(np.int32)], False, 0, thickness, cv2.LINE_AA)
+    if markers:
+        # Marcadores vazados ao longo da curva, como pontos experimentais
+        radius = 3 * thickness
+        for x, y in points[::len(points) // 25]:
+            cv2.circle(image, (int(round(x)), int(round(y))), radius, 0, max(1, thickness // 2))
+    if label:
+        x0, y0, x1, _ = _plot_box(height, width)
+        origin = (x1 - int(0.2 * width), y0 + int((0.05 + 0.05 * legend_row) * height))
+        cv2.putText(image, label, origin, cv2.FONT_HERSHEY_SIMPLEX, width / 1600, 0, max(1, width // 800))
+
+
+def _labels(low, high, count=5, fmt="{:.0f}"):
+    return [fmt.format(value) for value in np.linspace(low, high, count)]
+
+
+def nyquist_figure(height, width, circuits=(RANDLES,), grid=True, markers=True, divisions=10):
+    """
+    Gráfico de Nyquist (Re Z por -Im Z) dos circuitos informados.
+    Retorna (imagem em cinza uint8, lista de curvas de referência em pixels).
+    """
+    image = np.full((height, width), 255, np.uint8)
+    box = _plot_box(height, width)
+    impedances = [randles_impedance(FREQUENCIES, **circuit) for circuit in circuits]
+    x_range = (0.0, 1.1 * max(z.real.max() for z in impedances))
+    y_range = (0.0, 1.1 * max((-z.imag).max() for z in impedances))
+    _draw_axes(image, box, divisions, _labels(*x_range), _labels(*y_range), "Z' (Ohm)", "-Z'' (Ohm)", grid)
+
+    truth = []
+    for row, z in enumerate(impedances):
+        points = _to_pixels(z.real, -z.imag, x_range, y_range, box)
+        _draw_series(image, points, markers and row > 0, label=f"serie {row + 1}", legend_row=row)
+        truth.append(points)
+    return image, truth
+
+
+def colored_nyquist_figure(height, width, circuits=(RANDLES, RANDLES_WARBURG, SECOND_SERIES),
+                           colors=SERIES_COLORS, grid=True, divisions=10):
+    """
+    Gráfico de Nyquist com uma cor por série (grade, eixos e rótulos em
+    cinza/preto), para a separação por cor. Retorna (imagem BGR uint8,
+    lista de curvas de referência em pixels, na ordem de `circuits`).
+    """
+    gray = np.full((height, width), 255, np.uint8)
+    box = _plot_box(height, width)
+    impedances = [randles_impedance(FREQUENCIES, **circuit) for circuit in circuits]
+    x_range = (0.0, 1.1 * max(z.real.max() for z in impedances))
+    y_range = (0.0, 1.1 * max((-z.imag).max() for z in impedances))
+    _draw_axes(gray, box, divisions, _labels(*x_range), _labels(*y_range), "Z' (Ohm)", "-Z'' (Ohm)", grid)
+
+    image = cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR)
+    thickness = _line_width(width)
+    truth = []
+    for z, color in zip(impedances, colors):
+        points = _to_pixels(z.real, -z.imag, x_range, y_range, box)
+        cv2.polylines(image, [np.round(points).astype(np.int32)], False, color, thickness, cv2.LINE_AA)
+        truth.append(points)
+    return image, truth
+
+
+def bode_figures(height, width, circuits=(RANDLES, SECOND_SERIES), grid=True, markers=True, divisions=10):
+    """
+    Gráficos de Bode (log |Z| e fase por log f) dos circuitos informados.
+    Retorna ((magnitude, curvas de referência), (fase, curvas de referência)).
+    """
+    log_frequency = np.log10(FREQUENCIES)
+    f_range = (log_frequency[0], log_frequency[-1])
+    f_labels = [f"1e{int(v)}" for v in np.linspace(*f_range, 5)]
+    impedances = [randles_impedance(FREQUENCIES, **circuit) for circuit in circuits]
+    magnitudes = [np.log10(np.abs(z)) for z in impedances]
+    phases = [-np.degrees(np.angle(z)) for z in impedances]
+
+    figures = []
+    for values, title in ((magnitudes, "log|Z| (Ohm)"), (phases, "-fase (graus)")):
+        image = np.full((height, width), 255, np.uint8)
+        box = _plot_box(height, width)
+        low, high = min(v.min() for v in values), max(v.max() for v in values)
+        span = high - low
+        y_range = (low - 0.1 * span, high + 0.1 * span)
+        _draw_axes(image, box, divisions, f_labels, _labels(*y_range, fmt="{:.1f}"), "f (Hz)", title, grid)
+        truth = []
+        for row, series in enumerate(values):
+            points = _to_pixels(log_frequency, series, f_range, y_range, box)
+            _draw_series(image, points, markers and row > 0, label=f"serie {row + 1}", legend_row=row)
+            truth.append(points)
+        figures.append((image, truth))
+    return tuple(figures)
+
+
+def figure_suite(height, width):
+    """
+    Figuras usadas pelo benchmark: nome -> (tipo de gráfico, imagem, curvas de referência).
+    """
+    (magnitude, magnitude_truth), (phase, phase_truth) = bode_figures(height, width)
+    return {
+        "nyquist_randles": ("nyquist",) + nyquist_figure(height, width, (RANDLES,)),
+        "nyquist_warburg": ("nyquist",) + nyquist_figure(height, width, (RANDLES_WARBURG, SECOND_SERIES)),
+        "bode_magnitude": ("bode", magnitude, magnitude_truth),
+        "bode_phase": ("bode", phase, phase_truth),
+    }
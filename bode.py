@@ -1,11 +1,10 @@
 import customtkinter as ctk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.widgets import Button, RadioButtons
 from tkinter import filedialog, messagebox
-import pandas as pd
-import matplotlib.image as mpimg
-import image_processing
+from annotation_view import DisplayPyramid, SeriesArtists, TraceStroke
+from annotation_store import AnnotationStore
+
+# matplotlib, OpenCV e o pipeline de imagem são importados apenas quando são
+# usados (seleção das imagens, processamento e janela de anotação)
 
 
 class BodeAnnotationApp:
@@ -14,6 +13,9 @@ class BodeAnnotationApp:
         self.image_path_phase = None
         self.image_magnitude = None
         self.image_phase = None
+        # Imagens decodificadas uma única vez (exibição e processamento)
+        self.loaded_magnitude = None
+        self.loaded_phase = None
         # Para armazenamento de processamento automático
         self.processed_image_magnitude = None
         # Para armazenamento de processamento automático
@@ -22,9 +24,10 @@ class BodeAnnotationApp:
         self.refined_curves_phase = None
         self.x_min = 0
         self.x_max = 1
-        self.curves_magnitude = {}
-        self.curves_phase = {}
-        self.current_curve = []
+        self.curves_magnitude = AnnotationStore()
+        self.curves_phase = AnnotationStore()
+        self.stroke = None
+        self.task = None
         self.trace_active = False
         self.current_color = "red"
         self.mode = "points"
@@ -34,6 +37,9 @@ class BodeAnnotationApp:
         self.fig = None
         self.ax_magnitude = None
         self.ax_phase = None
+        # Imagens de fundo dos gráficos (DisplayPyramid)
+        self.background_magnitude = None
+        self.background_phase = None
         self.canvas = None
         self.toolbar = None
 
@@ -91,9 +97,10 @@ class BodeAnnotationApp:
             filetypes=[("Image files", ".png;.jpg;*.jpeg")]
         )
         if self.image_path_magnitude:
-            self.image_magnitude = mpimg.imread(
-                self.image_path_magnitude
-            )  # Carrega a imagem
+            from image_loader import load_image
+
+            self.loaded_magnitude = load_image(self.image_path_magnitude)
+            self.image_magnitude = self.loaded_magnitude.rgb  # Carrega a imagem
             messagebox.showinfo(
                 "Imagem Selecionada",
                 f"Imagem de Magnitude selecionada: {self.image_path_magnitude}",
@@ -106,8 +113,10 @@ class BodeAnnotationApp:
         self.image_path_phase = filedialog.askopenfilename(
             filetypes=[("Image files", ".png;.jpg;*.jpeg")])
         if self.image_path_phase:
-            self.image_phase = mpimg.imread(
-                self.image_path_phase)  # Carrega a imagem
+            from image_loader import load_image
+
+            self.loaded_phase = load_image(self.image_path_phase)
+            self.image_phase = self.loaded_phase.rgb  # Carrega a imagem
             messagebox.showinfo(
                 "Imagem Selecionada", f"Imagem de Fase selecionada: {self.image_path_phase}")
 
@@ -134,41 +143,61 @@ class BodeAnnotationApp:
 
         print(f"Processando imagens automaticamente com frequência de {self.x_min} Hz a {self.x_max} Hz...")
 
-        try:
-            # Processar imagens de magnitude e fase
-            print("Chamando processamento de magnitude...")
-            processed_image_magnitude, refined_curves_magnitude = image_processing.process_graph(
-                self.image_path_magnitude, graph_type="bode"
-            )
-            print("Chamando processamento de fase...")
-            processed_image_phase, refined_curves_phase = image_processing.process_graph(
-                self.image_path_phase, graph_type="bode"
-            )
+        import image_processing
+        from background import BackgroundTask, ProgressWindow
 
-            # Validar processamento
-            if processed_image_magnitude is None or processed_image_phase is None:
-                raise ValueError("Erro ao processar imagens. Verifique os arquivos selecionados.")
+        # O pipeline roda em uma thread de trabalho, com magnitude e fase processadas
+        # ao mesmo tempo (ver process_bode_pair); a janela continua respondendo
+        self.task = BackgroundTask(lambda progress: image_processing.process_bode_pair(
+            self.loaded_magnitude, self.loaded_phase, progress=progress)).start()
+        self.progress_window = ProgressWindow(self.root, self.task, "Processando Bode...")
+        self.task.poll(self.root, self.on_automatic_done, self.progress_window.update,
+                       self.on_automatic_error, self.on_automatic_cancelled)
 
-            print("Processamento concluído. Iniciando exibição...")
+    def finish_automatic_task(self):
+        self.progress_window.close()
+        self.task = None
 
-            # Salvar resultados do processamento
-            self.processed_image_magnitude = processed_image_magnitude
-            self.refined_curves_magnitude = refined_curves_magnitude
-            self.processed_image_phase = processed_image_phase
-            self.refined_curves_phase = refined_curves_phase
+    def on_automatic_done(self, result):
+        self.finish_automatic_task()
+        (processed_image_magnitude, refined_curves_magnitude), (processed_image_phase, refined_curves_phase) = result
+
+        # Validar processamento
+        if processed_image_magnitude is None or processed_image_phase is None:
+            self.on_automatic_error(ValueError("Erro ao processar imagens. Verifique os arquivos selecionados."))
+            return
+
+        print("Processamento concluído. Iniciando exibição...")
+
+        # Salvar resultados do processamento
+        self.processed_image_magnitude = processed_image_magnitude
+        self.refined_curves_magnitude = refined_curves_magnitude
+        self.processed_image_phase = processed_image_phase
+        self.refined_curves_phase = refined_curves_phase
+
+        # Exibir interface de anotação
+        self.start_annotation_bode(
+            self.processed_image_magnitude, self.refined_curves_magnitude,
+            self.processed_image_phase, self.refined_curves_phase
+        )
+
+    def on_automatic_error(self, error):
+        if self.task is not None:
+            self.finish_automatic_task()
+        messagebox.showerror("Erro", f"Erro no processamento automático: {error}")
+        print(f"Erro no processamento automático: {error}")
+
+    def on_automatic_cancelled(self):
+        self.finish_automatic_task()
+        print("Processamento automático cancelado.")
 
-            # Exibir interface de anotação
-            self.start_annotation_bode(
-                self.processed_image_magnitude, self.refined_curves_magnitude,
-                self.processed_image_phase, self.refined_curves_phase
-            )
-        except Exception as e:
-            messagebox.showerror("Erro", f"Erro no processamento automático: {e}")
-            print(f"Erro no processamento automático: {e}")
     def create_interface_bode(self):
         """
         Cria os botões e ferramentas de interação para o gráfico de anotação.
         """
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button, RadioButtons
+
         print("Criando interface para anotação do gráfico de Bode...")
 
         button_style = {'hovercolor': 'lightblue'}
@@ -203,6 +232,8 @@ class BodeAnnotationApp:
     def start_annotation_bode(self, processed_image_magnitude=None, refined_curves_magnitude=None,
                               processed_image_phase=None, refined_curves_phase=None):
         print("Iniciando anotação Bode...")
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
 
         self.annotation_root = ctk.CTk()
         self.annotation_root.title("Anotação dos Gráficos Bode")
@@ -213,16 +244,23 @@ class BodeAnnotationApp:
         self.fig, (self.ax_magnitude, self.ax_phase) = plt.subplots(
             2, 1, figsize=(10, 10))
 
+        # Uma linha por série em cada gráfico, atualizada apenas quando a série
+        # muda (as imagens de fundo não são redesenhadas ao anotar ou resetar)
+        self.artists_magnitude = SeriesArtists(self.ax_magnitude, self.curves_magnitude)
+        self.artists_phase = SeriesArtists(self.ax_phase, self.curves_phase)
+
         # Exibir o gráfico de magnitude
         if processed_image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                processed_image_magnitude, cmap='gray', origin='upper', aspect='equal')
-            for curve in refined_curves_magnitude:
-                self.ax_magnitude.plot(
-                    curve[:, 0], curve[:, 1], "-", color="red", linewidth=1)
+            # Cada imagem é exibida a partir de uma pirâmide de resoluções (nível conforme o zoom)
+            self.background_magnitude = DisplayPyramid(
+                self.ax_magnitude, processed_image_magnitude, reduce="max", cmap='gray', origin='upper', aspect='equal')
+            for i, curve in enumerate(refined_curves_magnitude):
+                series = self.curves_magnitude.new_series("red", label=f"curve_{i}")
+                self.curves_magnitude.add_points(series, curve)
+            self.artists_magnitude.update()
         elif self.image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                self.image_magnitude, cmap='gray', origin='upper', aspect='equal')
+            self.background_magnitude = DisplayPyramid(
+                self.ax_magnitude, self.image_magnitude, cmap='gray', origin='upper', aspect='equal')
 
         self.ax_magnitude.set_title("Anotação do Gráfico de Magnitude")
         self.ax_magnitude.set_xlabel(
@@ -231,14 +269,15 @@ class BodeAnnotationApp:
 
         # Exibir o gráfico de fase
         if processed_image_phase is not None:
-            self.ax_phase.imshow(processed_image_phase,
-                                 cmap='gray', origin='upper', aspect='equal')
-            for curve in refined_curves_phase:
-                self.ax_phase.plot(
-                    curve[:, 0], curve[:, 1], "-", color="blue", linewidth=1)
+            self.background_phase = DisplayPyramid(
+                self.ax_phase, processed_image_phase, reduce="max", cmap='gray', origin='upper', aspect='equal')
+            for i, curve in enumerate(refined_curves_phase):
+                series = self.curves_phase.new_series("blue", label=f"curve_{i}")
+                self.curves_phase.add_points(series, curve)
+            self.artists_phase.update()
         elif self.image_phase is not None:
-            self.ax_phase.imshow(self.image_phase, cmap='gray',
-                                 origin='upper', aspect='equal')
+            self.background_phase = DisplayPyramid(
+                self.ax_phase, self.image_phase, cmap='gray', origin='upper', aspect='equal')
 
         self.ax_phase.set_title("Anotação do Gráfico de Fase")
         self.ax_phase.set_xlabel(
@@ -269,40 +308,15 @@ class BodeAnnotationApp:
 
     def reset_annotations_bode(self, event):
         print("Resetando anotações Bode...")
-        self.curves_magnitude = {}
-        self.curves_phase = {}
-
-        # Resetar gráfico de magnitude
-        self.ax_magnitude.clear()
-        if self.processed_image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                self.processed_image_magnitude, cmap='gray', origin='upper', aspect='equal')
-        elif self.image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                self.image_magnitude, cmap='gray', origin='upper', aspect='equal')
-
-        self.ax_magnitude.set_title("Anotação do Gráfico de Magnitude")
-        self.ax_magnitude.set_xlabel(
-            f"Frequência (Hz), de {self.x_min} a {self.x_max}")
-        self.ax_magnitude.set_ylabel("Magnitude (dB)")
-        self.ax_magnitude.grid(False)
-
-        # Resetar gráfico de fase
-        self.ax_phase.clear()
-        if self.processed_image_phase is not None:
-            self.ax_phase.imshow(self.processed_image_phase,
-                                 cmap='gray', origin='upper', aspect='equal')
-        elif self.image_phase is not None:
-            self.ax_phase.imshow(self.image_phase, cmap='gray',
-                                 origin='upper', aspect='equal')
-
-        self.ax_phase.set_title("Anotação do Gráfico de Fase")
-        self.ax_phase.set_xlabel(
-            f"Frequência (Hz), de {self.x_min} a {self.x_max}")
-        self.ax_phase.set_ylabel("Fase (graus)")
-        self.ax_phase.grid(False)
-
-        self.canvas.draw()
+        self.discard_stroke_bode()
+        self.curves_magnitude.clear()
+        self.curves_phase.clear()
+
+        # Remove apenas as linhas das anotações; as imagens, os limites e os
+        # títulos dos dois gráficos são mantidos
+        for artists in (self.artists_magnitude, self.artists_phase):
+            artists.clear()
+            artists.blit()
         print("Anotações resetadas.")
 
     def set_color(self, label):
@@ -327,66 +341,32 @@ class BodeAnnotationApp:
             print(
                 f"Cliques no gráfico de magnitude: {event.xdata}, {event.ydata}")
             if self.mode == "points_bode":
-                if self.current_color not in self.curves_magnitude:
-                    self.curves_magnitude[self.current_color] = []
-                self.curves_magnitude[self.current_color].append(
-                    (event.xdata, event.ydata))
-                self.ax_magnitude.plot(
-                    event.xdata, event.ydata, "o", color=self.current_color)
-                self.canvas.draw()
+                series = self.curves_magnitude.add_points(
+                    self.curves_magnitude.series_for_color(self.current_color), [(event.xdata, event.ydata)])
+                self.artists_magnitude.update([series.id])
+                self.artists_magnitude.blit()
             elif self.mode == "trace_bode":
                 if not self.trace_active:
                     self.trace_active = True
-                    self.current_curve = [(event.xdata, event.ydata)]
+                    self.stroke = TraceStroke(self.ax_magnitude, self.current_color)
+                    self.stroke.add(event.xdata, event.ydata)
                 else:
-                    self.trace_active = False
-                    self.curves_magnitude.setdefault(
-                        self.current_color, []).extend(self.current_curve)
-                    x_coords, y_coords = zip(*self.current_curve)
-                    self.ax_magnitude.plot(
-                        x_coords, y_coords, "-", color=self.current_color)
-                    self.canvas.draw()
-                    self.current_curve = []
+                    self.finish_stroke_bode()
 
         elif event.inaxes == self.ax_phase:
             print(f"Cliques no gráfico de fase: {event.xdata}, {event.ydata}")
             if self.mode == "points_bode":
-                if self.current_color not in self.curves_phase:
-                    self.curves_phase[self.current_color] = []
-                self.curves_phase[self.current_color].append(
-                    (event.xdata, event.ydata))
-                self.ax_phase.plot(event.xdata, event.ydata,
-                                   "o", color=self.current_color)
-                self.canvas.draw()
+                series = self.curves_phase.add_points(
+                    self.curves_phase.series_for_color(self.current_color), [(event.xdata, event.ydata)])
+                self.artists_phase.update([series.id])
+                self.artists_phase.blit()
             elif self.mode == "trace_bode":
                 if not self.trace_active:
                     self.trace_active = True
-                    self.current_curve = [(event.xdata, event.ydata)]
+                    self.stroke = TraceStroke(self.ax_phase, self.current_color)
+                    self.stroke.add(event.xdata, event.ydata)
                 else:
-                    self.trace_active = False
-                    self.curves_phase.setdefault(
-                        self.current_color, []).extend(self.current_curve)
-                    x_coords, y_coords = zip(*self.current_curve)
-                    self.ax_phase.plot(x_coords, y_coords,
-                                       "-", color=self.current_color)
-                    self.canvas.draw()
-                    self.current_curve = []
-
-    def on_motion_bode(self, event):
-        """
-        Lida com movimentos do mouse nos gráficos de magnitude e fase
-        durante o modo de traçado (trace_bode).
-        """
-        if event.inaxes == self.ax_magnitude and self.mode == "trace_bode" and self.trace_active:
-            self.current_curve.append((event.xdata, event.ydata))
-            self.ax_magnitude.plot(
-                event.xdata, event.ydata, ".", color=self.current_color)
-            self.canvas.draw()
-        elif event.inaxes == self.ax_phase and self.mode == "trace_bode" and self.trace_active:
-            self.current_curve.append((event.xdata, event.ydata))
-            self.ax_phase.plot(event.xdata, event.ydata,
-                               ".", color=self.current_color)
-            self.canvas.draw()
+                    self.finish_stroke_bode()
 
     def connect_events_bode(self):
         self.cid_click_magnitude = self.fig.canvas.mpl_connect(
@@ -399,98 +379,80 @@ class BodeAnnotationApp:
         Lida com movimentos do mouse nos gráficos de magnitude e fase
         durante o modo de traçado (trace_bode).
         """
-        if event.inaxes == self.ax_magnitude and self.mode == "trace_bode" and self.trace_active:
-            self.current_curve.append((event.xdata, event.ydata))
-            self.ax_magnitude.plot(
-                event.xdata, event.ydata, ".", color=self.current_color)
-            self.canvas.draw()
-        elif event.inaxes == self.ax_phase and self.mode == "trace_bode" and self.trace_active:
-            self.current_curve.append((event.xdata, event.ydata))
-            self.ax_phase.plot(event.xdata, event.ydata,
-                               ".", color=self.current_color)
-            self.canvas.draw()
+        if self.mode == "trace_bode" and self.trace_active and event.inaxes == self.stroke.ax:
+            # Atualiza o traço em andamento por blitting, sem redesenhar a figura
+            self.stroke.add(event.xdata, event.ydata)
+
+    def finish_stroke_bode(self):
+        self.trace_active = False
+        if self.stroke.ax == self.ax_magnitude:
+            curves, artists = self.curves_magnitude, self.artists_magnitude
+        else:
+            curves, artists = self.curves_phase, self.artists_phase
+        series = curves.add_points(curves.series_for_color(self.current_color), self.stroke.finish())
+        self.stroke = None
+        artists.update([series.id])
+        artists.blit()
+
+    def discard_stroke_bode(self):
+        # Descarta o traço em andamento (se houver) sem salvá-lo
+        if self.stroke is not None:
+            self.stroke.cancel()
+            self.stroke = None
+        self.trace_active = False
 
     def set_mode_points_bode(self, event):
         self.mode = "points_bode"
+        self.discard_stroke_bode()
         print("Modo: Marcar Pontos Bode")
 
     def set_mode_trace_bode(self, event):
         self.mode = "trace_bode"
-        self.current_curve = []
-        self.trace_active = False
+        self.discard_stroke_bode()
         print("Modo: Desenhar Linha Bode")
 
+    def calibration_bode(self, image):
+        """
+        Calibração do eixo de frequência (escala log entre x_min e x_max, na
+        largura da imagem). O eixo vertical fica em pixels. Sem limites válidos,
+        exporta em pixels.
+        """
+        if image is None or not 0 < self.x_min < self.x_max:
+            return None
+        from export import Calibration
+
+        return Calibration.from_image(image.shape, x_limits=(self.x_min, self.x_max), x_scale="log")
+
     def save_curves_bode(self, event):
+        from export import EXPORT_FILETYPES, export_columns, store_columns
+
         print("Salvando anotações Bode...")
-        all_data_magnitude = []
-        all_data_phase = []
-        for color, points in self.curves_magnitude.items():
-            for x, y in points:
-                all_data_magnitude.append({"Color": color, "X": x, "Y": y})
-        for color, points in self.curves_phase.items():
-            for x, y in points:
-                all_data_phase.append({"Color": color, "X": x, "Y": y})
-
-        if not all_data_magnitude and not all_data_phase:
+        if self.curves_magnitude.point_count == 0 and self.curves_phase.point_count == 0:
             print("Nenhuma anotação para salvar.")
             return
 
-        if all_data_magnitude:
-            df_magnitude = pd.DataFrame(all_data_magnitude)
+        if self.curves_magnitude.point_count:
             output_path_magnitude = filedialog.asksaveasfilename(
-                defaultextension="_magnitude.csv", filetypes=[("CSV files", "*.csv")])
+                defaultextension="_magnitude.csv", filetypes=EXPORT_FILETYPES)
             if output_path_magnitude:
-                df_magnitude.to_csv(output_path_magnitude, index=False)
-                print(
-                    f"Anotações de Magnitude salvas em {output_path_magnitude}")
+                image = self.processed_image_magnitude if self.processed_image_magnitude is not None else self.image_magnitude
+                columns = store_columns(self.curves_magnitude, self.calibration_bode(image))
+                if export_columns(output_path_magnitude, columns):
+                    print(
+                        f"Anotações de Magnitude salvas em {output_path_magnitude}")
 
-        if all_data_phase:
-            df_phase = pd.DataFrame(all_data_phase)
+        if self.curves_phase.point_count:
             output_path_phase = filedialog.asksaveasfilename(
-                defaultextension="_phase.csv", filetypes=[("CSV files", "*.csv")])
+                defaultextension="_phase.csv", filetypes=EXPORT_FILETYPES)
             if output_path_phase:
-                df_phase.to_csv(output_path_phase, index=False)
-                print(f"Anotações de Fase salvas em {output_path_phase}")
-
-    def reset_annotations_bode(self, event):
-        print("Resetando anotações Bode...")
-        self.curves_magnitude = {}
-        self.curves_phase = {}
-
-        # Resetar gráfico de magnitude
-        self.ax_magnitude.clear()
-        if self.processed_image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                self.processed_image_magnitude, cmap='gray', origin='upper', aspect='equal')
-        elif self.image_magnitude is not None:
-            self.ax_magnitude.imshow(
-                self.image_magnitude, cmap='gray', origin='upper', aspect='equal')
-
-        self.ax_magnitude.set_title("Anotação do Gráfico de Magnitude")
-        self.ax_magnitude.set_xlabel(
-            f"Frequência (Hz), de {self.x_min} a {self.x_max}")
-        self.ax_magnitude.set_ylabel("Magnitude (dB)")
-        self.ax_magnitude.grid(False)
-
-        # Resetar gráfico de fase
-        self.ax_phase.clear()
-        if self.processed_image_phase is not None:
-            self.ax_phase.imshow(self.processed_image_phase,
-                                 cmap='gray', origin='upper', aspect='equal')
-        elif self.image_phase is not None:
-            self.ax_phase.imshow(self.image_phase, cmap='gray',
-                                 origin='upper', aspect='equal')
-
-        self.ax_phase.set_title("Anotação do Gráfico de Fase")
-        self.ax_phase.set_xlabel(
-            f"Frequência (Hz), de {self.x_min} a {self.x_max}")
-        self.ax_phase.set_ylabel("Fase (graus)")
-        self.ax_phase.grid(False)
-
-        self.canvas.draw()
-        print("Anotações resetadas.")
+                image = self.processed_image_phase if self.processed_image_phase is not None else self.image_phase
+                columns = store_columns(self.curves_phase, self.calibration_bode(image))
+                if export_columns(output_path_phase, columns):
+                    print(f"Anotações de Fase salvas em {output_path_phase}")
 
     def on_closing(self):
+        if self.task is not None:
+            self.task.cancel()
         if self.root is not None:
             self.root.destroy()
             self.root = None
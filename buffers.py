@@ -0,0 +1,119 @@
+"""
+Buffers reaproveitados entre imagens do mesmo tamanho.
+
+Ao processar milhares de figuras do mesmo tamanho (modo em lote), cada etapa
+alocava arrays novos do tamanho da imagem (saídas do CLAHE, do blur, do
+Canny, máscaras, rótulos dos componentes), e a alocação e as faltas de
+página apareciam nos perfis. As funções de image_processing pedem os
+temporários a um BufferPool, que devolve o mesmo array enquanto o nome, o
+tamanho e o tipo forem os mesmos, e passam esses arrays como `dst` ao
+OpenCV.
+
+Cada thread tem o seu pool (ver `thread_pool`): as duas imagens de um par de
+Bode e as séries de cor são processadas em threads diferentes, e cada
+processo do modo em lote tem as suas threads. O conteúdo de um buffer só
+vale até a próxima chamada que pedir o mesmo nome na mesma thread; nada que
+é retornado ao chamador (ou guardado pelo Pipeline) pode estar no pool.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+# Limite de bytes mantidos por pool; os buffers usados há mais tempo saem primeiro
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class BufferPool:
+    """
+    Arrays não inicializados indexados por (nome, forma, tipo), com remoção
+    LRU quando o total passa de `max_bytes`. Não é thread-safe: use um pool
+    por thread.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._buffers = OrderedDict()
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, name, shape, dtype=np.uint8):
+        """
+        Retorna um array de `shape` e `dtype` com conteúdo indefinido.
+        """
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buffer = self._buffers.get(key)
+        if buffer is not None:
+            self._buffers.move_to_end(key)
+            self.hits += 1
+            return buffer
+        self.misses += 1
+        buffer = np.empty(shape, dtype=dtype)
+        self._buffers[key] = buffer
+        self.nbytes += buffer.nbytes
+        self._evict(keep=1)
+        return buffer
+
+    def _evict(self, keep=0):
+        while self.nbytes > self.max_bytes and len(self._buffers) > keep:
+            _, evicted = self._buffers.popitem(last=False)
+            self.nbytes -= evicted.nbytes
+
+    @contextmanager
+    def limit(self, max_bytes):
+        """
+        Reduz o limite do pool durante o bloco (ex.: ao orçamento de memória
+        do processamento em blocos, ver tiling.py).
+        """
+        previous = self.max_bytes
+        self.max_bytes = min(previous, max_bytes)
+        self._evict()
+        try:
+            yield self
+        finally:
+            self.max_bytes = previous
+
+    def zeros(self, name, shape, dtype=np.uint8):
+        buffer = self.get(name, shape, dtype)
+        buffer.fill(0)
+        return buffer
+
+    def clear(self):
+        self._buffers.clear()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self._buffers)
+
+
+_local = threading.local()
+
+
+def thread_pool():
+    """
+    Pool da thread atual (criado no primeiro uso).
+    """
+    pool = getattr(_local, "pool", None)
+    if pool is None:
+        pool = _local.pool = BufferPool()
+    return pool
+
+
+def clahe(clip_limit=3.0, tile_grid=(8, 8)):
+    """
+    Objeto CLAHE da thread atual para estes parâmetros. O OpenCV guarda
+    estado interno no objeto durante o `apply`, então ele não é compartilhado
+    entre threads.
+    """
+    import cv2
+
+    instances = getattr(_local, "clahe", None)
+    if instances is None:
+        instances = _local.clahe = {}
+    key = (float(clip_limit), tuple(tile_grid))
+    instance = instances.get(key)
+    if instance is None:
+        instance = instances[key] = cv2.createCLAHE(clipLimit=clip_limit, tileGridSize=tuple(tile_grid))
+    return instance
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+CACHE_EXTENSION = ".npz"
+# Fração do limite gravada por um processo entre duas varreduras do diretório
+RESCAN_FRACTION = 0.05
+
+
+class StageCache:
+    """
+    Cache persistente das etapas do pipeline, endereçado pelo conteúdo da imagem
+    e pelos parâmetros de cada etapa. Os arrays são gravados em .npz comprimido e
+    o tamanho total do diretório é limitado com remoção LRU (pela data do último uso).
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        # O mesmo cache pode ser usado por duas threads (par de Bode, ver process_bode_pair)
+        self._lock = threading.Lock()
+        self._total_bytes = sum(size for _, _, size in self._entries())
+        # Bytes gravados por este processo desde a última varredura: os outros
+        # processos do lote gravam no mesmo diretório sem passar por aqui
+        self._unscanned_bytes = 0
+
+    @staticmethod
+    def hash_bytes(data):
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def hash_file(path):
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def stage_keys(content_hash, stages):
+        """
+        Gera as chaves de uma sequência de etapas [(nome, parâmetros), ...].
+        Cada chave inclui a chave da etapa anterior, então mudar um parâmetro
+        invalida apenas aquela etapa e as seguintes.
+        """
+        keys = {}
+        previous = content_hash
+        for name, params in stages:
+            payload = json.dumps({"previous": previous, "stage": name, "params": params}, sort_keys=True)
+            previous = hashlib.sha256(payload.encode("utf-8")).hexdigest()
+            keys[name] = previous
+        return keys
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + CACHE_EXTENSION)
+
+    def _entries(self):
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(CACHE_EXTENSION):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    # Removida por outro processo durante a varredura
+                    continue
+                yield entry.path, stat.st_mtime, stat.st_size
+
+    def load(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                arrays = {name: data[name] for name in data.files}
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Entrada de cache inválida ({key}): {e}")
+            return None
+        # Atualiza a data de modificação para marcar o uso recente (LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return arrays
+
+    def save(self, key, **arrays):
+        path = self._path(key)
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **arrays)
+            size = os.path.getsize(tmp_path)
+            try:
+                replaced = os.path.getsize(path)
+            except OSError:
+                replaced = 0
+            os.replace(tmp_path, path)
+            tmp_path = None
+        except OSError as e:
+            print(f"Erro ao gravar no cache: {e}")
+            return
+        finally:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        with self._lock:
+            self._total_bytes += size - replaced
+            self._unscanned_bytes += size
+            if self._unscanned_bytes > self.max_bytes * RESCAN_FRACTION:
+                # Recalcula o total a partir do diretório, com o que os outros processos gravaram
+                self._total_bytes = sum(size for _, _, size in self._entries())
+                self._unscanned_bytes = 0
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def evict(self):
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        """
+        Remove as entradas menos usadas até o cache ficar abaixo de 90% do limite,
+        para que a varredura do diretório não aconteça a cada gravação.
+        """
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        total = sum(size for _, _, size in entries)
+        target = int(self.max_bytes * 0.9)
+        for path, _, size in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
+        self._unscanned_bytes = 0
+
+    def load_array(self, key):
+        arrays = self.load(key)
+        return None if arrays is None else arrays["image"]
+
+    def save_array(self, key, image):
+        self.save(key, image=image)
+
+    def load_curves(self, key):
+        arrays = self.load(key)
+        if arrays is None:
+            return None
+        if len(arrays["offsets"]) < 2:
+            return []
+        return np.split(arrays["points"], arrays["offsets"][1:-1])
+
+    def save_curves(self, key, curves):
+        # As curvas têm tamanhos diferentes: grava os pontos concatenados e os offsets
+        lengths = [len(curve) for curve in curves]
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        points = np.concatenate(curves) if curves else np.empty((0, 2))
+        self.save(key, points=points, offsets=offsets)
@@ -0,0 +1,144 @@
+"""
+Separação das séries de um gráfico colorido pela cor.
+
+A imagem é convertida para Lab uma única vez. Pixels com croma baixa (fundo,
+grade, eixos e textos em preto ou cinza) são descartados, e os demais são
+agrupados pelo matiz (ângulo no plano a*b*) com k-means sobre uma amostra.
+O matiz é usado no lugar da cor completa porque as bordas suavizadas
+(anti-aliasing) de um traço misturam a cor da série com o fundo: a croma e
+a luminosidade mudam, mas o matiz quase não muda.
+
+Cada grupo vira uma máscara binária com os pixels da série, que pode ser
+segmentada separadamente (ver image_processing.process_graph_by_color).
+Séries em preto ou cinza, ou de mesmo matiz com luminosidades diferentes,
+não são separadas.
+"""
+import numpy as np
+
+# Croma mínima (distância ao eixo neutro no plano a*b* do Lab de 8 bits do
+# OpenCV) para que um pixel pertença a alguma série
+MIN_CHROMA = 25
+MAX_SERIES = 8
+# Pixels coloridos usados no k-means e na estimativa da cor de cada série
+SAMPLE_SIZE = 20000
+# Grupos com matizes mais próximos que isso são a mesma série
+MERGE_ANGLE_DEGREES = 20
+# Pixels com matiz mais distante que isso de todos os grupos são descartados
+MAX_ANGLE_DEGREES = 30
+# Grupos com menos que esta fração dos pixels coloridos são descartados
+MIN_SERIES_FRACTION = 0.02
+# Grupos com ao menos esta fração dos pixels colada (a até HALO_DISTANCE
+# pixels) a uma série maior são halos de compressão (JPEG) em volta do traço
+# dela e são incorporados a essa série
+HALO_FRACTION = 0.8
+HALO_DISTANCE = 2
+
+
+class ColorSeries:
+    """
+    Uma série separada pela cor: máscara uint8 (0/255), cor representativa
+    ("#rrggbb") e número de pixels.
+    """
+
+    def __init__(self, mask, color, pixel_count):
+        self.mask = mask
+        self.color = color
+        self.pixel_count = pixel_count
+
+    def __repr__(self):
+        return f"ColorSeries({self.color}, {self.pixel_count} pixels)"
+
+
+def _chromatic_pixels(pixels):
+    # Coordenadas dos pixels coloridos e o vetor unitário do matiz de cada um
+    import cv2
+
+    if pixels.ndim == 3 and pixels.shape[2] == 4:
+        pixels = cv2.cvtColor(pixels, cv2.COLOR_BGRA2BGR)
+    _, a, b = cv2.split(cv2.cvtColor(pixels, cv2.COLOR_BGR2Lab))
+    # Pré-filtro em uint8 (croma >= t implica max(|a|, |b|) >= t/√2); a croma
+    # exata só é calculada para os candidatos
+    candidates = cv2.max(cv2.absdiff(a, 128), cv2.absdiff(b, 128)) >= int(MIN_CHROMA / np.sqrt(2))
+    ys, xs = np.nonzero(candidates)
+    ab = np.column_stack([a[ys, xs], b[ys, xs]]).astype(np.float32) - 128
+    chroma = np.hypot(ab[:, 0], ab[:, 1])
+    keep = chroma >= MIN_CHROMA
+    return ys[keep], xs[keep], ab[keep] / chroma[keep, None], chroma[keep]
+
+
+def _hex_color(bgr):
+    blue, green, red = (int(round(c)) for c in bgr)
+    return f"#{red:02x}{green:02x}{blue:02x}"
+
+
+def separate_colors(pixels, max_series=MAX_SERIES, sample_size=SAMPLE_SIZE, seed=0):
+    """
+    Separa as séries de uma imagem BGR(A) pela cor e retorna uma lista de
+    ColorSeries, da maior para a menor. Retorna uma lista vazia se a imagem
+    for monocromática ou não tiver pixels coloridos.
+    """
+    import cv2
+
+    if pixels.ndim != 3:
+        return []
+    ys, xs, hues, chroma = _chromatic_pixels(pixels)
+    if len(ys) < max_series:
+        return []
+
+    rng = np.random.default_rng(seed)
+    sample = rng.choice(len(ys), min(sample_size, len(ys)), replace=False)
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 50, 1e-3)
+    _, labels, centers = cv2.kmeans(hues[sample], max_series, None, criteria, 3, cv2.KMEANS_PP_CENTERS)
+    sizes = np.bincount(labels.ravel(), minlength=max_series)
+
+    # Une os grupos de matiz próximo, começando pelos maiores
+    merged, weights = [], []
+    min_cos = np.cos(np.radians(MERGE_ANGLE_DEGREES))
+    for k in np.argsort(-sizes):
+        center = centers[k] / (np.linalg.norm(centers[k]) or 1.0)
+        for i, kept in enumerate(merged):
+            if float(center @ kept) >= min_cos:
+                combined = kept * weights[i] + center * sizes[k]
+                merged[i] = combined / np.linalg.norm(combined)
+                weights[i] += sizes[k]
+                break
+        else:
+            merged.append(center)
+            weights.append(sizes[k])
+    centers = np.array([c for c, w in zip(merged, weights) if w >= MIN_SERIES_FRACTION * len(sample)],
+                       dtype=np.float32)
+    if len(centers) == 0:
+        return []
+
+    # Atribui todos os pixels coloridos de uma vez, pelo matiz mais próximo
+    similarity = hues @ centers.T
+    assigned = similarity.argmax(axis=1)
+    valid = similarity[np.arange(len(assigned)), assigned] >= np.cos(np.radians(MAX_ANGLE_DEGREES))
+
+    groups = [np.flatnonzero(valid & (assigned == k)) for k in range(len(centers))]
+    groups = sorted((g for g in groups if len(g)), key=len, reverse=True)
+
+    # Vizinhança das séries já aceitas: índice da série dona de cada pixel (-1 se nenhuma)
+    owner = np.full(pixels.shape[:2], -1, dtype=np.int8)
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2 * HALO_DISTANCE + 1, 2 * HALO_DISTANCE + 1))
+    series, members_of = [], []
+    for members in groups:
+        owners = owner[ys[members], xs[members]]
+        near = owners[owners >= 0]
+        if len(near) >= HALO_FRACTION * len(members):
+            target = int(np.bincount(near).argmax())
+            series[target].mask[ys[members], xs[members]] = 255
+            series[target].pixel_count += len(members)
+            continue
+        mask = np.zeros(pixels.shape[:2], dtype=np.uint8)
+        mask[ys[members], xs[members]] = 255
+        owner[(cv2.dilate(mask, kernel) > 0) & (owner < 0)] = len(series)
+        series.append(ColorSeries(mask, None, len(members)))
+        members_of.append(members)
+
+    for s, members in zip(series, members_of):
+        # Cor representativa: mediana dos pixels mais saturados (o núcleo do traço)
+        subset = members if len(members) <= sample_size else rng.choice(members, sample_size, replace=False)
+        core = subset[chroma[subset] >= np.median(chroma[subset])]
+        s.color = _hex_color(np.median(pixels[ys[core], xs[core], :3], axis=0))
+    return series
@@ -0,0 +1,251 @@
+import importlib.util
+import os
+
+import numpy as np
+
+# Formato de saída a partir da extensão do arquivo
+EXPORT_FORMATS = {
+    ".csv": "csv",
+    ".parquet": "parquet",
+    ".npz": "npz",
+    ".h5": "hdf5",
+    ".hdf5": "hdf5",
+}
+
+# Pacotes opcionais necessários para gravar cada formato
+FORMAT_DEPENDENCIES = {
+    "parquet": "pyarrow",
+    "hdf5": "h5py",
+}
+
+# Tipos de arquivo para os diálogos de salvar das telas de anotação
+EXPORT_FILETYPES = [
+    ("CSV files", "*.csv"),
+    ("Parquet files", "*.parquet"),
+    ("NumPy files", "*.npz"),
+    ("HDF5 files", "*.h5"),
+]
+
+
+class AxisCalibration:
+    """
+    Transformação de um eixo: coordenada em pixels -> valor no gráfico.
+
+    `pixel_min` e `pixel_max` são as posições (em pixels) correspondentes a
+    `value_min` e `value_max`. Com `scale="log"` a interpolação é feita em
+    log10, como no eixo de frequência dos gráficos de Bode.
+    """
+
+    def __init__(self, pixel_min, pixel_max, value_min, value_max, scale="linear"):
+        if scale not in ("linear", "log"):
+            raise ValueError(f"Escala desconhecida: {scale}")
+        if scale == "log" and (value_min <= 0 or value_max <= 0):
+            raise ValueError("Eixos em escala log exigem limites positivos.")
+        self.pixel_min = float(pixel_min)
+        self.pixel_max = float(pixel_max)
+        self.value_min = float(value_min)
+        self.value_max = float(value_max)
+        self.scale = scale
+
+    @classmethod
+    def identity(cls):
+        return cls(0.0, 1.0, 0.0, 1.0)
+
+    def apply(self, pixels):
+        t = (np.asarray(pixels, dtype=np.float64) - self.pixel_min) / (self.pixel_max - self.pixel_min)
+        if self.scale == "log":
+            low, high = np.log10(self.value_min), np.log10(self.value_max)
+            return np.power(10.0, low + t * (high - low))
+        return self.value_min + t * (self.value_max - self.value_min)
+
+
+class Calibration:
+    """
+    Transformação pixel -> dados para os dois eixos, aplicada a arrays Nx2
+    inteiros de uma vez.
+    """
+
+    def __init__(self, x_axis=None, y_axis=None):
+        self.x_axis = x_axis if x_axis is not None else AxisCalibration.identity()
+        self.y_axis = y_axis if y_axis is not None else AxisCalibration.identity()
+
+    @classmethod
+    def from_image(cls, shape, x_limits=None, y_limits=None, x_scale="linear", y_scale="linear"):
+        """
+        Calibração em que a imagem inteira cobre os limites informados, como no
+        `imshow(..., extent=[x_min, x_max, y_min, y_max], origin="upper")`:
+        as bordas da imagem são os limites e a linha 0 é o topo (y máximo).
+        Um eixo sem limites fica em pixels.
+        """
+        height, width = shape[:2]
+        x_axis = y_axis = None
+        if x_limits is not None:
+            x_axis = AxisCalibration(-0.5, width - 0.5, x_limits[0], x_limits[1], x_scale)
+        if y_limits is not None:
+            y_axis = AxisCalibration(height - 0.5, -0.5, y_limits[0], y_limits[1], y_scale)
+        return cls(x_axis, y_axis)
+
+    def apply(self, points):
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        return np.column_stack([self.x_axis.apply(points[:, 0]), self.y_axis.apply(points[:, 1])])
+
+
+def export_format(path, fmt=None):
+    if fmt is None:
+        fmt = EXPORT_FORMATS.get(os.path.splitext(path)[1].lower())
+    if fmt not in EXPORT_FORMATS.values():
+        raise ValueError(f"Formato de exportação não suportado: {path}")
+    return fmt
+
+
+def missing_dependency(fmt):
+    """
+    Pacote opcional que falta para gravar o formato `fmt`, ou None.
+    """
+    package = FORMAT_DEPENDENCIES.get(fmt)
+    if package is not None and importlib.util.find_spec(package) is None:
+        return package
+    return None
+
+
+def _export_errors():
+    # Erros do pyarrow (ex.: ArrowTypeError em uma coluna de tipo misto, que não é ValueError)
+    errors = (ImportError, ValueError, OSError)
+    try:
+        import pyarrow
+    except ImportError:
+        return errors
+    return errors + (pyarrow.ArrowException,)
+
+
+def _as_column(values):
+    # Colunas de texto (rótulos, cores, nomes de arquivo) viram arrays de str
+    values = np.asarray(values)
+    if values.dtype == object:
+        values = values.astype(str)
+    return values
+
+
+class CurveWriter:
+    """
+    Escreve colunas de pontos (dicionário nome -> array) em CSV, Parquet, npz
+    ou HDF5, bloco a bloco, sem montar linhas intermediárias.
+
+    CSV, Parquet e HDF5 são gravados à medida que os blocos chegam; o npz não
+    permite acrescentar dados, então os blocos são concatenados ao fechar.
+    """
+
+    def __init__(self, path, fmt=None):
+        self.path = path
+        self.format = export_format(path, fmt)
+        self.rows = 0
+        self._columns = None
+        self._handle = None
+        self._chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, columns):
+        columns = {name: _as_column(values) for name, values in columns.items()}
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("Todas as colunas devem ter o mesmo tamanho.")
+        if self._columns is None:
+            self._columns = list(columns)
+        elif list(columns) != self._columns:
+            raise ValueError("As colunas devem ser as mesmas em todos os blocos.")
+
+        getattr(self, f"_write_{self.format}")(columns)
+        self.rows += lengths.pop()
+
+    def _write_csv(self, columns):
+        import pandas as pd
+
+        pd.DataFrame(columns).to_csv(self.path, mode="w" if self.rows == 0 else "a",
+                                     header=self.rows == 0, index=False)
+
+    def _write_parquet(self, columns):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table(columns)
+        if self._handle is None:
+            self._handle = pq.ParquetWriter(self.path, table.schema)
+        self._handle.write_table(table)
+
+    def _write_npz(self, columns):
+        self._chunks.append(columns)
+
+    def _write_hdf5(self, columns):
+        import h5py
+
+        if self._handle is None:
+            self._handle = h5py.File(self.path, "w")
+            for name, values in columns.items():
+                dtype = h5py.string_dtype() if values.dtype.kind == "U" else values.dtype
+                self._handle.create_dataset(name, shape=(0,), maxshape=(None,), dtype=dtype, chunks=True)
+        for name, values in columns.items():
+            dataset = self._handle[name]
+            start = dataset.shape[0]
+            dataset.resize((start + len(values),))
+            dataset[start:] = values.astype(object) if values.dtype.kind == "U" else values
+
+    def close(self):
+        if self.format == "npz" and self._columns is not None:
+            np.savez_compressed(self.path, **{
+                name: np.concatenate([chunk[name] for chunk in self._chunks]) for name in self._columns
+            })
+            self._chunks = []
+        if self._handle is not None:
+            self._handle.close()
+            self._handle = None
+
+
+def curve_columns(curves, calibration=None, colors=None):
+    """
+    Colunas Curve, X e Y de uma lista de curvas (arrays Nx2), com a
+    calibração aplicada ao array concatenado. Com `colors` (uma cor por
+    curva, ver a separação por cor), inclui também a coluna Color.
+    """
+    if not curves:
+        columns = {"Curve": np.empty(0, dtype=np.int64), "X": np.empty(0), "Y": np.empty(0)}
+        if colors is not None:
+            columns["Color"] = np.empty(0, dtype=str)
+        return columns
+    lengths = [len(curve) for curve in curves]
+    ids = np.repeat(np.arange(len(curves)), lengths)
+    points = np.concatenate(curves)
+    if calibration is not None:
+        points = calibration.apply(points)
+    columns = {"Curve": ids, "X": points[:, 0], "Y": points[:, 1]}
+    if colors is not None:
+        columns["Color"] = np.repeat(np.asarray(colors), lengths)
+    return columns
+
+
+def store_columns(store, calibration=None):
+    """
+    Colunas Series, Label, Color, X e Y de um AnnotationStore.
+    """
+    series_ids, labels, colors, points = store.columns()
+    if calibration is not None:
+        points = calibration.apply(points)
+    return {"Series": series_ids, "Label": labels, "Color": colors, "X": points[:, 0], "Y": points[:, 1]}
+
+
+def export_columns(path, columns, fmt=None):
+    """
+    Grava as colunas em `path` (formato pela extensão). Retorna o caminho, ou
+    None em caso de erro.
+    """
+    try:
+        with CurveWriter(path, fmt) as writer:
+            writer.write(columns)
+        return path
+    except _export_errors() as e:
+        print(f"Erro ao exportar {path}: {e}")
+        return None
@@ -0,0 +1,123 @@
+import hashlib
+import os
+
+import cv2
+import numpy as np
+
+
+class LoadedImage:
+    """
+    Imagem decodificada uma única vez em um buffer uint8.
+    As visões RGB (exibição) e em escala de cinza (processamento) são derivadas
+    desse buffer: a RGB é uma visão sem cópia e a cinza é calculada uma só vez
+    (ou é o próprio buffer, quando a imagem original já é monocromática).
+    """
+
+    def __init__(self, encoded, name="<memória>"):
+        self.encoded = encoded
+        self.name = name
+        self._pixels = None
+        self._gray = None
+        self._content_hash = None
+
+    @classmethod
+    def from_array(cls, pixels, name="<array>"):
+        """
+        Envolve um array já decodificado (cinza, BGR ou BGRA), sem cópia.
+        """
+        image = cls(None, name=name)
+        image._pixels = pixels
+        return image
+
+    def __repr__(self):
+        return f"LoadedImage({self.name!r})"
+
+    @property
+    def content_hash(self):
+        # Calculado sobre os bytes do arquivo, sem precisar decodificar a imagem
+        if self._content_hash is None:
+            digest = hashlib.sha256()
+            if self.encoded is not None:
+                digest.update(self.encoded)
+            else:
+                digest.update(f"{self._pixels.shape}{self._pixels.dtype}".encode("utf-8"))
+                digest.update(np.ascontiguousarray(self._pixels))
+            self._content_hash = digest.hexdigest()
+        return self._content_hash
+
+    @property
+    def pixels(self):
+        if self._pixels is None:
+            pixels = cv2.imdecode(self.encoded, cv2.IMREAD_UNCHANGED)
+            if pixels is None:
+                raise ValueError(f"Erro ao carregar a imagem: {self.name}")
+            if pixels.dtype != np.uint8:
+                # Imagens de 16 bits: mantém apenas os 8 bits mais significativos
+                if pixels.dtype == np.uint16:
+                    pixels = (pixels >> 8).astype(np.uint8)
+                else:
+                    pixels = cv2.normalize(pixels, None, 0, 255, cv2.NORM_MINMAX, dtype=cv2.CV_8U)
+            self._pixels = pixels
+        return self._pixels
+
+    @property
+    def shape(self):
+        return self.pixels.shape[:2]
+
+    @property
+    def rgb(self):
+        """
+        Visão para exibição no matplotlib (RGB, ou 2D para imagens em cinza).
+        """
+        pixels = self.pixels
+        if pixels.ndim == 2:
+            return pixels
+        # Inverte a ordem dos canais BGR(A) -> RGB sem copiar o buffer
+        return pixels[..., 2::-1]
+
+    @property
+    def gray(self):
+        if self._gray is None and self._pixels is None:
+            # Só o processamento precisa da imagem: decodifica direto em cinza,
+            # sem manter o buffer colorido (3x maior) em memória
+            self._gray = cv2.imdecode(self.encoded, cv2.IMREAD_GRAYSCALE)
+            if self._gray is None:
+                raise ValueError(f"Erro ao carregar a imagem: {self.name}")
+        if self._gray is None:
+            pixels = self.pixels
+            if pixels.ndim == 2:
+                self._gray = pixels
+            elif pixels.shape[2] == 4:
+                self._gray = cv2.cvtColor(pixels, cv2.COLOR_BGRA2GRAY)
+            else:
+                self._gray = cv2.cvtColor(pixels, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+
+def load_image(source):
+    """
+    Aceita um caminho, bytes codificados (PNG/JPEG), um array já decodificado
+    ou um LoadedImage já carregado.
+    """
+    if isinstance(source, LoadedImage):
+        return source
+    if isinstance(source, np.ndarray):
+        return LoadedImage.from_array(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return LoadedImage(np.frombuffer(source, dtype=np.uint8))
+    if not os.path.isfile(source):
+        raise ValueError(f"Erro ao carregar a imagem: {source}")
+    return LoadedImage(np.fromfile(source, dtype=np.uint8), name=str(source))
+
+
+def as_grayscale(source):
+    """
+    Retorna a imagem em escala de cinza, sem decodificar novamente se a fonte
+    já for um LoadedImage ou um array.
+    """
+    if isinstance(source, np.ndarray):
+        if source.ndim == 2:
+            return source
+        code = cv2.COLOR_BGRA2GRAY if source.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        return cv2.cvtColor(source, code)
+    return load_image(source).gray
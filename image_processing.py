@@ -1,147 +1,702 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
 import numpy as np
-from scipy.interpolate import splprep, splev
 
+import buffers
+from image_loader import as_grayscale, load_image
+from instrumentation import DISABLED, count, record_error
+from plot_area import uncrop
 
-def preprocess_image(image_path, graph_type="generic"):
-    try:
-        # Carregar a imagem em escala de cinza
-        image = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        if image is None:
-            raise ValueError(f"Erro ao carregar a imagem: {image_path}")
 
-        # Melhorar contraste
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        enhanced_image = clahe.apply(image)
+def canny_thresholds(blurred_image, graph_type="generic"):
+    if graph_type == "bode":
+        # Ajustar thresholds dinamicamente para gráficos de Bode
+        median = np.median(blurred_image)
+        return int(max(0, 0.4 * median)), int(min(255, 1.2 * median))
+    # Ajustes para gráficos genéricos ou Nyquist
+    return 50, 150
 
-        # Reduzir ruído
-        blurred_image = cv2.medianBlur(enhanced_image, 5)
 
-        if graph_type == "bode":
-            # Ajustar thresholds dinamicamente para gráficos de Bode
-            median = np.median(blurred_image)
-            lower_thresh = int(max(0, 0.4 * median))
-            upper_thresh = int(min(255, 1.2 * median))
-        else:
-            # Ajustes para gráficos genéricos ou Nyquist
-            lower_thresh, upper_thresh = 50, 150
+# As funções de imagem aceitam `dst`: um array uint8 do tamanho da entrada que
+# recebe o resultado e é retornado. Os temporários intermediários vêm do pool
+# da thread (ver buffers.py); sem `dst`, o resultado é sempre um array novo.
+
+
+def enhance_image(image, clip_limit=3.0, clahe_grid=(8, 8), blur_size=5, dst=None):
+    # Melhorar contraste (o objeto CLAHE é reaproveitado pela thread)
+    enhanced_image = buffers.clahe(clip_limit, clahe_grid).apply(
+        image, dst=buffers.thread_pool().get("clahe", image.shape))
+
+    # Reduzir ruído
+    return cv2.medianBlur(enhanced_image, blur_size, dst=dst)
+
+
+def detect_edges(blurred_image, thresholds, dst=None):
+    lower_thresh, upper_thresh = thresholds
+
+    # Detectar bordas
+    edges = cv2.Canny(blurred_image, lower_thresh, upper_thresh,
+                      edges=buffers.thread_pool().get("canny", blurred_image.shape))
 
-        # Detectar bordas
-        edges = cv2.Canny(blurred_image, lower_thresh, upper_thresh)
+    # Fechar arestas desconectadas
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    return cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, dst=dst, iterations=2)
 
-        # Fechar arestas desconectadas
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
-        closed_edges = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
 
-        return closed_edges
+def preprocess_image(image_path, graph_type="generic", thresholds=None, clahe_grid=(8, 8), dst=None):
+    """
+    Pré-processa a imagem e retorna as bordas fechadas. `thresholds` e
+    `clahe_grid` permitem fixar os limiares do Canny e a grade do CLAHE quando
+    a imagem é processada em blocos (ver tiling.py).
+    """
+    try:
+        # Carregar a imagem em escala de cinza (aceita caminho, LoadedImage ou array)
+        image = as_grayscale(image_path)
+        blurred_image = enhance_image(image, clahe_grid=clahe_grid, dst=buffers.thread_pool().get("blur", image.shape))
+        return detect_edges(blurred_image, thresholds or canny_thresholds(blurred_image, graph_type), dst=dst)
     except Exception as e:
         print(f"Erro no pré-processamento da imagem: {e}")
+        record_error(e)
         return None
 
 
-def remove_text_and_symbols(image, graph_type="generic"):
+def crop_to_plot_area(gray):
+    """
+    Recorta a imagem em cinza para o interior da área do gráfico (ver
+    plot_area.py) e retorna (recorte, (y0, y1, x0, x1)). O recorte é uma
+    visão, sem cópia. Sem eixos reconhecíveis, retorna a imagem inteira.
+    """
+    full = (0, gray.shape[0], 0, gray.shape[1])
+    try:
+        from plot_area import detect_plot_area
+
+        box = detect_plot_area(gray) or full
+    except Exception as e:
+        print(f"Erro ao detectar a área do gráfico: {e}")
+        record_error(e)
+        box = full
+    y0, y1, x0, x1 = box
+    count("plot_area_pixels", (y1 - y0) * (x1 - x0))
+    return gray[y0:y1, x0:x1], box
+
+
+# Resolução (em pixels) para a qual os limites de área dos símbolos foram ajustados
+SYMBOL_REFERENCE_PIXELS = 1_000_000
+
+
+def _fill_small_holes(binary, max_hole_area, pool):
+    # Preenche apenas buracos pequenos (interior de marcadores e letras), sem
+    # preencher regiões grandes como a área interna da moldura do gráfico.
+    # `binary` é alterada no lugar.
+    inverted = cv2.bitwise_not(binary, dst=pool.get("holes", binary.shape))
+    n_holes, hole_labels, hole_stats, _ = cv2.connectedComponentsWithStats(
+        inverted, labels=pool.get("labels", binary.shape, np.int32), connectivity=4)
+    x, y, w, h, area = hole_stats.T
+    touches_border = (x == 0) | (y == 0) | (x + w == binary.shape[1]) | (y + h == binary.shape[0])
+    hole_lut = np.where((area <= max_hole_area) & ~touches_border, 255, 0).astype(np.uint8)
+    # mode="clip" evita a cópia intermediária que o take faz com `out` no modo padrão
+    return np.bitwise_or(binary, hole_lut.take(hole_labels, out=inverted, mode="clip"), out=binary)
+
+
+def _unchanged(image, dst=None):
+    # Saída de uma etapa que falhou: a entrada sem alteração, mas nunca o próprio
+    # array de entrada, que pode ser um buffer do pool da thread
+    if image is None:
+        return None
+    if dst is not None and dst.shape == image.shape:
+        np.copyto(dst, image, casting="unsafe")
+        return dst
+    return np.array(image, copy=True)
+
+
+def remove_text_and_symbols(image, graph_type="generic", min_area=10, max_area=800, min_fill_ratio=0.4,
+                            full_shape=None, dst=None):
+    """
+    Remove marcadores e símbolos pequenos usando as estatísticas dos componentes
+    conectados, de forma vetorizada: um componente é removido se a área estiver
+    entre os limites e ocupar mais que `min_fill_ratio` da caixa envolvente.
+    A taxa de preenchimento é o filtro de forma: marcadores (com os buracos
+    pequenos preenchidos) e letras ocupam a maior parte da caixa, e trechos
+    diagonais ou curvos de uma curva, só uma faixa dela. Os limites de área valem para imagens de
+    ~1 MP e são escalados proporcionalmente ao número de pixels da imagem
+    (`full_shape` é o tamanho da imagem inteira quando `image` é um bloco).
+    """
     try:
-        # Detectar contornos para identificar símbolos ou ruídos
-        edges = cv2.Canny(image, 50, 150, apertureSize=3)
-        contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-        mask = np.zeros_like(image)
-        for contour in contours:
-            area = cv2.contourArea(contour)
-            perimeter = cv2.arcLength(contour, True)
-            if 10 < area < 800:  # Faixa de áreas para símbolos pequenos
-                circularity = (4 * np.pi * area) / (perimeter**2 + 1e-5)
-                if circularity > 0.7:  # Alta circularidade = símbolos
-                    cv2.drawContours(mask, [contour], -1, 255, -1)
-
-        image_cleaned = cv2.bitwise_and(image, cv2.bitwise_not(mask))
+        height, width = full_shape or image.shape[:2]
+        scale = height * width / SYMBOL_REFERENCE_PIXELS
+        min_area, max_area = min_area * scale, max_area * scale
+
+        pool = buffers.thread_pool()
+        _, binary = cv2.threshold(image, 50, 255, cv2.THRESH_BINARY, dst=pool.get("binary", image.shape))
+        filled = _fill_small_holes(binary, max_area, pool)
+        n_labels, labels, stats, _ = cv2.connectedComponentsWithStats(
+            filled, labels=pool.get("labels", image.shape, np.int32), connectivity=8)
+
+        w = stats[:, cv2.CC_STAT_WIDTH].astype(np.float64)
+        h = stats[:, cv2.CC_STAT_HEIGHT].astype(np.float64)
+        area = stats[:, cv2.CC_STAT_AREA].astype(np.float64)
+        fill_ratio = area / (w * h)
+
+        is_symbol = (area > min_area) & (area < max_area) & (fill_ratio > min_fill_ratio)
+        is_symbol[0] = False  # Rótulo 0 é o fundo
+
+        # Uma única escrita na imagem, via tabela de consulta sobre os rótulos
+        keep_lut = np.where(is_symbol, 0, 255).astype(np.uint8)
+        keep = keep_lut.take(labels, out=filled, mode="clip")
+        image_cleaned = cv2.bitwise_and(image, keep, dst=dst)
+        count("components", n_labels - 1)
+        count("symbols", int(is_symbol.sum()))
         return image_cleaned
     except Exception as e:
         print(f"Erro ao remover símbolos e ruídos: {e}")
-        return image
-
-
-def remove_grid_lines(image, graph_type="generic"):
+        record_error(e)
+        return _unchanged(image, dst)
+
+
+# Método de remoção da grade usado por padrão para cada tipo de gráfico
+GRID_REMOVAL_METHODS = {"bode": "morphology"}
+DEFAULT_GRID_REMOVAL_METHOD = "hough"
+
+
+def grid_removal_method(graph_type, method=None):
+    return method or GRID_REMOVAL_METHODS.get(graph_type, DEFAULT_GRID_REMOVAL_METHOD)
+
+
+# Parâmetros do HoughLinesP por tipo de gráfico: (votos, comprimento mínimo, intervalo máximo)
+HOUGH_PARAMETERS = {"bode": (80, 30, 10)}
+# Configurações padrão (ex.: gráficos Nyquist)
+DEFAULT_HOUGH_PARAMETERS = (100, 50, 5)
+
+
+def hough_parameters(graph_type, hough=None):
+    return hough or HOUGH_PARAMETERS.get(graph_type, DEFAULT_HOUGH_PARAMETERS)
+
+
+def _grid_mask_hough(image, graph_type, hough=None):
+    pool = buffers.thread_pool()
+    edges = cv2.Canny(image, 50, 150, edges=pool.get("canny", image.shape), apertureSize=3)
+
+    threshold, min_line_length, max_line_gap = hough_parameters(graph_type, hough)
+    lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=threshold, minLineLength=min_line_length,
+                            maxLineGap=max_line_gap)
+
+    mask = pool.zeros("grid_mask", image.shape)
+    if lines is not None:
+        count("lines", len(lines))
+        for x1, y1, x2, y2 in lines.reshape(-1, 4):
+            cv2.line(mask, (x1, y1), (x2, y2), 255, 2)
+    return mask
+
+
+def grid_line_mask(image, direction, full_shape=None, min_length_fraction=0.25, max_gap_fraction=0.005):
+    """
+    Traços horizontais ou verticais (`direction`) mais longos que
+    `min_length_fraction` do lado da imagem inteira (`full_shape`), após o
+    fechamento das interrupções de até `max_gap_fraction` do maior lado. O
+    resultado de cada linha (ou coluna) depende só dela mesma, então a imagem
+    pode ser processada em faixas (ver tiling.py). O array retornado é um
+    buffer da thread.
+    """
+    pool = buffers.thread_pool()
+    _, binary = cv2.threshold(image, 50, 255, cv2.THRESH_BINARY, dst=pool.get("binary", image.shape))
+    height, width = full_shape or binary.shape
+    gap = max(10, int(max(height, width) * max_gap_fraction))
+    if direction == "horizontal":
+        gap_kernel, line_kernel = (gap, 1), (max(3, int(width * min_length_fraction)), 1)
+    else:
+        gap_kernel, line_kernel = (1, gap), (1, max(3, int(height * min_length_fraction)))
+    joined = cv2.morphologyEx(binary, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, gap_kernel),
+                              dst=pool.get("joined", binary.shape))
+    return cv2.morphologyEx(joined, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, line_kernel),
+                            dst=pool.get(direction, binary.shape))
+
+
+def _grid_mask_morphology(image, full_shape=None):
+    # Aberturas separáveis: só sobrevivem traços horizontais/verticais mais longos
+    # que uma fração da imagem. O fechamento antes une linhas tracejadas e as
+    # interrupções nos cruzamentos da grade (as bordas de cada célula são separadas)
+    horizontal = grid_line_mask(image, "horizontal", full_shape)
+    mask = cv2.bitwise_or(horizontal, grid_line_mask(image, "vertical", full_shape), dst=horizontal)
+    return cv2.dilate(mask, np.ones((3, 3), np.uint8), dst=buffers.thread_pool().get("grid_mask", image.shape))
+
+
+def _dilate_profile(flags):
+    dilated = flags.copy()
+    dilated[1:] |= flags[:-1]
+    dilated[:-1] |= flags[1:]
+    return dilated
+
+
+def _grid_mask_projection(image, min_fill_fraction=0.5):
+    # Perfis de projeção: linhas/colunas quase totalmente preenchidas são da grade
+    _, binary = cv2.threshold(image, 50, 1, cv2.THRESH_BINARY)
+    height, width = binary.shape
+    rows = cv2.reduce(binary, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() > min_fill_fraction * width
+    cols = cv2.reduce(binary, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel() > min_fill_fraction * height
+    # Inclui um pixel vizinho de cada lado, como a espessura das linhas do Hough
+    # (sem dar a volta: uma linha na borda não marca a borda oposta)
+    rows, cols = _dilate_profile(rows), _dilate_profile(cols)
+    return np.where(rows[:, None] | cols[None, :], np.uint8(255), np.uint8(0))
+
+
+def remove_grid_lines(image, graph_type="generic", method=None, full_shape=None, hough=None, dst=None):
+    """
+    Remove as linhas da grade. O método padrão depende do tipo de gráfico
+    (GRID_REMOVAL_METHODS) e pode ser escolhido explicitamente:
+    - "hough": Canny + HoughLinesP, desenhando cada segmento detectado;
+    - "morphology": aberturas horizontais/verticais, O(pixels);
+    - "projection": perfis de projeção por linha/coluna, O(pixels).
+    `full_shape` é o tamanho da imagem inteira quando `image` é um bloco e
+    `hough` substitui os parâmetros do HoughLinesP (ver HOUGH_PARAMETERS).
+    """
     try:
-        edges = cv2.Canny(image, 50, 150, apertureSize=3)
-
-        if graph_type == "bode":
-            # Detecção de linhas ajustada para gráficos de Bode
-            lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=80, minLineLength=30, maxLineGap=10)
+        method = grid_removal_method(graph_type, method)
+        if method == "morphology":
+            mask = _grid_mask_morphology(image, full_shape)
+        elif method == "projection":
+            mask = _grid_mask_projection(image)
+        elif method == "hough":
+            mask = _grid_mask_hough(image, graph_type, hough)
         else:
-            # Configurações padrão (ex.: gráficos Nyquist)
-            lines = cv2.HoughLinesP(edges, 1, np.pi / 180, threshold=100, minLineLength=50, maxLineGap=5)
-
-        mask = np.zeros_like(image)
-        if lines is not None:
-            for line in lines:
-                x1, y1, x2, y2 = line[0]
-                cv2.line(mask, (x1, y1), (x2, y2), 255, 2)
+            raise ValueError(f"Método de remoção da grade desconhecido: {method}")
 
-        image_without_grid = cv2.bitwise_and(image, cv2.bitwise_not(mask))
+        # A máscara é temporária: é invertida no lugar
+        image_without_grid = cv2.bitwise_and(image, cv2.bitwise_not(mask, dst=mask), dst=dst)
         return image_without_grid
     except Exception as e:
         print(f"Erro ao remover linhas da malha: {e}")
-        return image
-
-
-def segment_curves(image):
+        record_error(e)
+        return _unchanged(image, dst)
+
+
+# Métodos de segmentação das curvas (ver segment_curves)
+SEGMENTATION_METHODS = ("contours", "skeleton")
+DEFAULT_SEGMENTATION_METHOD = "contours"
+# Fechamento antes do afinamento, como fração do maior lado da imagem: une as
+# duas bordas do Canny de cada traço para que o esqueleto fique no centro dele
+SKELETON_FILL_FRACTION = 0.004
+# Comprimento mínimo padrão das curvas por método, como fração do maior lado
+# da imagem (descarta restos de rótulos e marcadores). Nos contornos o limite é
+# menor: a remoção da grade pode partir a curva em trechos em alta resolução
+MIN_LENGTH_FRACTION = {"contours": 0.02, "skeleton": 0.05}
+
+
+def segment_curves(image, min_area=200, method=None, min_length=None):
+    """
+    Separa as curvas da imagem sem grade:
+    - "contours": contorno externo de cada componente com área maior que
+      `min_area` ou com ao menos `min_length` pixels de comprimento (um traço
+      fino vira um laço fechado em volta dele, com área quase nula);
+    - "skeleton": afina a imagem até um esqueleto de um pixel e rastreia
+      poligonais abertas pelo centro dos traços, emendando os ramos nas
+      junções (ver skeleton.py); curvas com menos de `min_length` pixels são
+      descartadas. Traços de até ~SKELETON_FILL_FRACTION do tamanho da imagem
+      são preenchidos antes do afinamento.
+    O padrão de `min_length` é MIN_LENGTH_FRACTION[method] do maior lado, no
+    mínimo 20.
+    """
     try:
+        method = method or DEFAULT_SEGMENTATION_METHOD
         _, binary_image = cv2.threshold(image, 50, 255, cv2.THRESH_BINARY)
+        if method not in SEGMENTATION_METHODS:
+            raise ValueError(f"Método de segmentação desconhecido: {method}")
+        side = max(binary_image.shape)
+        if min_length is None:
+            min_length = max(20, int(side * MIN_LENGTH_FRACTION[method]))
+        if method == "skeleton":
+            from skeleton import thin, trace_centerlines
+
+            size = max(3, int(side * SKELETON_FILL_FRACTION)) | 1
+            kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (size, size))
+            filled = cv2.morphologyEx(binary_image, cv2.MORPH_CLOSE, kernel)
+            curves = trace_centerlines(thin(filled), min_length=min_length)
+            count("curves", len(curves))
+            return curves
         contours, _ = cv2.findContours(binary_image, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-        curves = [c for c in contours if cv2.contourArea(c) > 200]
+        # O contorno de um traço aberto vai e volta: o comprimento é meio perímetro
+        curves = [c for c in contours
+                  if cv2.contourArea(c) > min_area or cv2.arcLength(c, True) / 2 >= min_length]
+        count("contours", len(contours))
+        count("curves", len(curves))
         return curves
     except Exception as e:
         print(f"Erro na segmentação das curvas: {e}")
+        record_error(e)
         return []
 
 
-def refine_curves(curves):
-    try:
-        refined_curves = []
-        for contour in curves:
-            x = contour[:, 0, 0]
-            y = contour[:, 0, 1]
-
-            # Ajustar spline para suavizar curvas
-            tck, _ = splprep([x, y], s=0.01)
-            u = np.linspace(0, 1, 1000)
-            x_smooth, y_smooth = splev(u, tck)
-
-            refined_curves.append(np.array([x_smooth, y_smooth]).T)
-        return refined_curves
-    except Exception as e:
-        print(f"Erro no refinamento das curvas: {e}")
-        return []
+def _refine_contour(contour, smoothing=0.25, spacing=2.0, curvature_gain=10.0, max_points=1000):
+    # O scipy só é carregado quando alguma curva chega ao refinamento
+    from scipy.interpolate import splprep, splev
 
-def process_graph(image_path, graph_type="bode"):
-    try:
-        print(f"Processando imagem: {image_path}")
-        processed_image = preprocess_image(image_path, graph_type)
-        if processed_image is None:
-            raise ValueError("Erro ao pré-processar a imagem.")
+    points = contour.reshape(-1, 2).astype(np.float64)
 
-        print("Removendo textos e símbolos...")
-        image_cleaned = remove_text_and_symbols(processed_image, graph_type)
+    # Remover pontos repetidos consecutivos (o splprep falha com segmentos de comprimento zero)
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    keep = np.concatenate([[True], steps > 0])
+    points, steps = points[keep], steps[steps > 0]
+    if len(points) < 4:
+        return None
 
-        print("Removendo linhas da grade...")
-        image_without_grid = remove_grid_lines(image_cleaned, graph_type)
+    # Parametrizar pelo comprimento de arco normalizado
+    arc = np.concatenate([[0.0], np.cumsum(steps)])
+    length = arc[-1]
+
+    # Os contornos do findContours (CHAIN_APPROX_SIMPLE) guardam só as pontas dos
+    # trechos retos; sem pontos no meio desses trechos a spline oscila. Reamostra
+    # a poligonal a cada pixel antes do ajuste.
+    if steps.max() > 1.5:
+        dense = np.linspace(0.0, length, int(np.ceil(length)) + 1)
+        points = np.column_stack([np.interp(dense, arc, points[:, 0]), np.interp(dense, arc, points[:, 1])])
+        arc = dense
+
+    tck, _ = splprep(points.T, u=arc / length, s=smoothing * len(points))
+
+    # Estimar a curvatura em uma amostragem uniforme e distribuir os pontos finais
+    # proporcionalmente ao comprimento de arco ponderado pela curvatura
+    probe = np.linspace(0, 1, int(np.clip(length / spacing, 16, 4 * max_points)))
+    dx, dy = splev(probe, tck, der=1)
+    ddx, ddy = splev(probe, tck, der=2)
+    speed = np.hypot(dx, dy)
+    curvature = np.abs(dx * ddy - dy * ddx) / np.maximum(speed ** 3, 1e-12)
+    density = speed * (1 + curvature_gain * curvature)
+    cumulative = np.concatenate([[0.0], np.cumsum((density[1:] + density[:-1]) / 2 * np.diff(probe))])
+
+    n_points = int(np.clip(cumulative[-1] / spacing, 2, max_points))
+    u = np.interp(np.linspace(0, cumulative[-1], n_points), cumulative, probe)
+    x_smooth, y_smooth = splev(u, tck)
+    return np.column_stack([x_smooth, y_smooth])
+
+
+def _refine_contour_safe(contour, *args):
+    try:
+        return _refine_contour(contour, *args)
+    except Exception as e:
+        print(f"Erro no refinamento de uma curva ({len(contour)} pontos): {e}")
+        return None
 
-        print("Segmentando curvas...")
-        detected_curves = segment_curves(image_without_grid)
-        print(f"Curvas detectadas: {len(detected_curves)}")
 
-        print("Refinando curvas...")
-        refined_curves = refine_curves(detected_curves)
+def refine_curves(curves, smoothing=0.25, spacing=2.0, curvature_gain=10.0, max_points=1000, executor=None):
+    """
+    Suaviza cada contorno com uma spline e amostra os pontos de acordo com o
+    comprimento de arco e a curvatura: cerca de um ponto a cada `spacing` pixels
+    em trechos retos, mais denso nas curvas e no máximo `max_points` por curva.
+
+    `smoothing` é o erro quadrático médio tolerado por ponto (em pixels²), o que
+    absorve o serrilhado dos contornos sem interpolar cada pixel. Uma falha em
+    um contorno descarta apenas aquele contorno. Se `executor` for informado
+    (ex.: ProcessPoolExecutor), os ajustes são distribuídos entre os processos.
+    """
+    params = (smoothing, spacing, curvature_gain, max_points)
+    if executor is not None and len(curves) > 1:
+        results = executor.map(_refine_contour_safe, curves, *[[value] * len(curves) for value in params],
+                               chunksize=max(1, len(curves) // 32))
+    else:
+        results = (_refine_contour_safe(contour, *params) for contour in curves)
+    refined = [curve for curve in results if curve is not None]
+    count("discarded", len(curves) - len(refined))
+    return refined
+
+
+def pipeline_stages(graph_type, memory_budget=None, segmentation=None, crop=False):
+    """
+    Etapas do pipeline e os parâmetros que afetam o resultado de cada uma
+    (usados para montar as chaves do cache).
+    """
+    return [
+        ("preprocess", {"graph_type": graph_type, "memory_budget": memory_budget, "plot_area": bool(crop)}),
+        ("symbols", {"graph_type": graph_type, "method": "components", "shape": "fill_ratio"}),
+        ("grid", {"graph_type": graph_type, "method": grid_removal_method(graph_type)}),
+        ("curves", {"segmentation": segmentation or DEFAULT_SEGMENTATION_METHOD, "refine": "adaptive",
+                    "resample": True, "smoothing": 0.25, "spacing": 2.0, "curvature_gain": 10.0, "max_points": 1000}),
+    ]
+
+
+# Etapas reportadas ao callback `progress` do process_graph, em ordem
+PIPELINE_STEPS = ("load", "preprocess", "symbols", "grid", "segment", "refine")
+
+
+def _report(progress, stage):
+    if progress is not None:
+        progress(stage, PIPELINE_STEPS.index(stage) / len(PIPELINE_STEPS))
+
+
+def _remove_grid_uncropped(image, graph_type, box, shape):
+    # Grava a imagem sem grade direto na posição do recorte na imagem inteira
+    if box is None:
+        return remove_grid_lines(image, graph_type)
+    y0, y1, x0, x1 = box
+    full = np.zeros(shape, dtype=np.uint8)
+    remove_grid_lines(image, graph_type, dst=full[y0:y1, x0:x1])
+    return full
+
+
+def _run_image_stages(source, graph_type, cache, keys, instrumentation=DISABLED, context=None, progress=None,
+                      crop=False):
+    names = ("preprocess", "symbols", "grid")
+
+    # Retoma a partir da etapa mais avançada que já estiver no cache
+    image = None
+    first = 0
+    if cache is not None:
+        for index in range(len(names) - 1, -1, -1):
+            image = cache.load_array(keys[names[index]])
+            if image is not None:
+                print(f"Etapa '{names[index]}' recuperada do cache.")
+                count("cache_hits")
+                first = index + 1
+                break
+    if first == len(names):
+        return image
 
-        if not refined_curves:
-            print("Nenhuma curva refinada encontrada.")
+    # Com `crop`, as etapas processam só o interior dos eixos e a saída da
+    # grade volta ao tamanho da imagem inteira, nas coordenadas originais
+    gray = as_grayscale(source)
+    region, box = crop_to_plot_area(gray) if crop else (gray, None)
+    if region is not gray:
+        y0, y1, x0, x1 = box
+        print(f"Área do gráfico: x {x0}-{x1}, y {y0}-{y1} ({region.size / gray.size:.0%} da imagem)")
+    # As saídas intermediárias usam os buffers da thread (já gravadas no cache
+    # quando ele existe); só a imagem sem grade, que é retornada, é nova
+    pool = buffers.thread_pool()
+    stages = [
+        ("preprocess", "Pré-processando imagem...",
+         lambda _: preprocess_image(region, graph_type, dst=pool.get("edges", region.shape))),
+        # Os limites de área dos símbolos valem para a imagem inteira
+        ("symbols", "Removendo textos e símbolos...",
+         lambda image: remove_text_and_symbols(image, graph_type, full_shape=gray.shape,
+                                               dst=pool.get("symbols", image.shape))),
+        ("grid", "Removendo linhas da grade...",
+         lambda image: _remove_grid_uncropped(image, graph_type, box, gray.shape)),
+    ]
+
+    for name, message, stage in stages[first:]:
+        print(message)
+        _report(progress, name)
+        with instrumentation.stage(name, **(context or {})) as record:
+            record.input(image if image is not None else source)
+            image = stage(image)
+            record.output(image)
+        if image is None:
+            raise ValueError("Erro ao pré-processar a imagem.")
+        if cache is not None:
+            cache.save_array(keys[name], image)
+    return image
+
+
+def process_graph(image_path, graph_type="bode", cache=None, memory_budget=None, instrumentation=None,
+                  progress=None, segmentation=None, crop=False):
+    """
+    Executa o pipeline completo e retorna (imagem sem grade, curvas refinadas).
+    Com `memory_budget` (bytes), as etapas de imagem rodam em blocos com pico
+    de memória limitado (ver tiling.py), para digitalizações muito grandes.
+    Com `instrumentation` (ver instrumentation.py), cada etapa e o total são
+    medidos e enviados aos destinos configurados. `progress(etapa, fração)`
+    é chamado antes de cada etapa (ver PIPELINE_STEPS); uma exceção levantada
+    por ele interrompe o processamento (usado para cancelar, ver background.py).
+    `segmentation` escolhe o método do segment_curves (SEGMENTATION_METHODS).
+    Com `crop`, as etapas de imagem processam só a área do gráfico (ver
+    plot_area.py); a imagem e as curvas retornadas continuam nas coordenadas
+    da imagem inteira.
+    """
+    instrumentation = instrumentation or DISABLED
+    name = image_path if isinstance(image_path, str) else getattr(image_path, "name", "<array>")
+    context = {"image": name, "graph_type": graph_type}
+    with instrumentation.stage("process_graph", **context) as total:
+        try:
+            # Lê o arquivo uma vez; a decodificação só acontece se alguma etapa precisar
+            _report(progress, "load")
+            with instrumentation.stage("load", **context) as record:
+                image = load_image(image_path)
+                record.output(image)
+            print(f"Processando imagem: {image.name}")
+            keys = None
+            image_without_grid = None
+            if cache is not None:
+                keys = cache.stage_keys(image.content_hash, pipeline_stages(graph_type, memory_budget, segmentation, crop))
+                image_without_grid = cache.load_array(keys["grid"])
+                refined_curves = cache.load_curves(keys["curves"])
+                if image_without_grid is not None and refined_curves:
+                    print("Resultado recuperado do cache.")
+                    total.count("cache_hits", 1)
+                    total.output(refined_curves)
+                    return image_without_grid, refined_curves
+
+            if image_without_grid is None and memory_budget is not None:
+                from tiling import remove_background_tiled
+
+                print("Processando a imagem em blocos...")
+                _report(progress, "preprocess")
+                with instrumentation.stage("tiled", **context) as record:
+                    record.input(image)
+                    image_without_grid = remove_background_tiled(image, graph_type, memory_budget, crop=crop)
+                    record.output(image_without_grid)
+                if image_without_grid is None:
+                    raise ValueError("Erro ao pré-processar a imagem.")
+                if cache is not None:
+                    cache.save_array(keys["grid"], image_without_grid)
+            elif image_without_grid is None:
+                image_without_grid = _run_image_stages(image, graph_type, cache, keys, instrumentation, context,
+                                                       progress, crop)
+
+            print("Segmentando curvas...")
+            _report(progress, "segment")
+            with instrumentation.stage("segment", **context) as record:
+                record.input(image_without_grid)
+                detected_curves = segment_curves(image_without_grid, method=segmentation)
+                record.output(detected_curves)
+            print(f"Curvas detectadas: {len(detected_curves)}")
+
+            print("Refinando curvas...")
+            _report(progress, "refine")
+            with instrumentation.stage("refine", **context) as record:
+                record.input(detected_curves)
+                refined_curves = refine_curves(detected_curves)
+                record.output(refined_curves)
+
+            if not refined_curves:
+                print("Nenhuma curva refinada encontrada.")
+                total.error(ValueError("Nenhuma curva refinada encontrada."))
+                return None, None
+
+            if cache is not None:
+                cache.save_curves(keys["curves"], refined_curves)
+
+            print("Processamento concluído com sucesso.")
+            total.output(refined_curves)
+            return image_without_grid, refined_curves
+        except Exception as e:
+            print(f"Erro no processamento do gráfico: {e}")
+            total.error(e)
             return None, None
 
-        print("Processamento concluído com sucesso.")
-        return image_without_grid, refined_curves
-    except Exception as e:
-        print(f"Erro no processamento do gráfico: {e}")
-        return None, None
-
 
+def process_bode_pair(magnitude_image, phase_image, cache=None, memory_budget=None, instrumentation=None,
+                      progress=None, segmentation=None, crop=False):
+    """
+    Executa o pipeline nas imagens de magnitude e de fase de um gráfico de Bode
+    ao mesmo tempo, em duas threads, e retorna
+    ((imagem sem grade, curvas) da magnitude, (imagem sem grade, curvas) da fase).
+
+    As etapas do OpenCV liberam o GIL, então o tempo total fica próximo ao da
+    imagem mais lenta; o ajuste das splines (scipy) ainda é serializado.
+    `progress(etapa, fração)` recebe a média do progresso das duas imagens,
+    com a etapa prefixada por "magnitude" ou "fase".
+    """
+    lock = threading.Lock()
+    fractions = {"magnitude": 0.0, "fase": 0.0}
+
+    def report_for(label):
+        if progress is None:
+            return None
+
+        def report(stage, fraction):
+            with lock:
+                fractions[label] = fraction
+                total = sum(fractions.values()) / len(fractions)
+            progress(f"{label}: {stage}", total)
+        return report
+
+    with ThreadPoolExecutor(max_workers=2, thread_name_prefix="bode") as executor:
+        futures = [executor.submit(process_graph, image, "bode", cache, memory_budget, instrumentation,
+                                   report_for(label), segmentation, crop)
+                   for label, image in (("magnitude", magnitude_image), ("fase", phase_image))]
+        return tuple(future.result() for future in futures)
+
+
+def _process_color_series(mask, graph_type, segmentation, instrumentation, context, full_shape=None):
+    # Máscara de uma série: já está sem fundo, grade e textos (sem cor)
+    with instrumentation.stage("symbols", **context) as record:
+        record.input(mask)
+        cleaned = remove_text_and_symbols(mask, graph_type, full_shape=full_shape)
+        record.output(cleaned)
+    if cleaned is None:
+        raise ValueError("Erro ao remover símbolos da série.")
+    with instrumentation.stage("segment", **context) as record:
+        record.input(cleaned)
+        detected_curves = segment_curves(cleaned, method=segmentation)
+        record.output(detected_curves)
+    with instrumentation.stage("refine", **context) as record:
+        record.input(detected_curves)
+        refined_curves = refine_curves(detected_curves)
+        record.output(refined_curves)
+    return cleaned, refined_curves
+
+
+def process_graph_by_color(image_path, graph_type="nyquist", max_series=None, instrumentation=None, progress=None,
+                           segmentation=None, crop=False):
+    """
+    Separa as séries de um gráfico colorido pela cor (ver color_separation.py)
+    e segmenta e refina a máscara de cada série em paralelo. Retorna
+    (união das máscaras, lista de (cor "#rrggbb", curvas refinadas)), com uma
+    entrada por série, ou (None, None) em caso de erro.
+
+    Não usa o cache de etapas nem o processamento em blocos. `progress`,
+    `instrumentation` e `crop` funcionam como no process_graph.
+    """
+    from color_separation import MAX_SERIES, separate_colors
+
+    instrumentation = instrumentation or DISABLED
+    name = image_path if isinstance(image_path, str) else getattr(image_path, "name", "<array>")
+    context = {"image": name, "graph_type": graph_type}
+    with instrumentation.stage("process_graph_by_color", **context) as total:
+        try:
+            if progress is not None:
+                progress("load", 0.0)
+            with instrumentation.stage("load", **context) as record:
+                image = load_image(image_path)
+                record.output(image)
+            print(f"Processando imagem por cor: {image.name}")
+
+            print("Separando séries por cor...")
+            if progress is not None:
+                progress("colors", 0.1)
+            pixels = image.pixels
+            box = (0, pixels.shape[0], 0, pixels.shape[1])
+            if crop:
+                with instrumentation.stage("plot_area", **context):
+                    _, box = crop_to_plot_area(image.gray)
+                y0, y1, x0, x1 = box
+                pixels = pixels[y0:y1, x0:x1]
+            with instrumentation.stage("colors", **context) as record:
+                record.input(pixels)
+                color_series = separate_colors(pixels, max_series or MAX_SERIES)
+                record.count("series", len(color_series))
+            if not color_series:
+                raise ValueError("Nenhuma série colorida encontrada na imagem.")
+            print(f"Séries encontradas: {', '.join(s.color for s in color_series)}")
+
+            # As etapas do OpenCV liberam o GIL; o ajuste das splines (scipy) é serializado
+            workers = min(len(color_series), os.cpu_count() or 1)
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="color") as executor:
+                futures = [executor.submit(_process_color_series, s.mask, graph_type, segmentation, instrumentation,
+                                           {**context, "series": s.color}, image.shape)
+                           for s in color_series]
+                results = []
+                for i, future in enumerate(futures):
+                    if progress is not None:
+                        progress(f"série {i + 1}/{len(futures)}", 0.2 + 0.8 * i / len(futures))
+                    results.append(future.result())
+
+            # Volta às coordenadas da imagem inteira
+            combined = np.zeros(pixels.shape[:2], dtype=np.uint8)
+            offset = np.array([box[2], box[0]])
+            series = []
+            for s, (cleaned, refined_curves) in zip(color_series, results):
+                combined |= cleaned
+                if refined_curves:
+                    series.append((s.color, [curve + offset for curve in refined_curves]))
+            combined = uncrop(combined, box, image.shape)
+            if not series:
+                raise ValueError("Nenhuma curva refinada encontrada.")
+
+            print("Processamento concluído com sucesso.")
+            total.output([curve for _, curves in series for curve in curves])
+            return combined, series
+        except Exception as e:
+            print(f"Erro no processamento do gráfico por cor: {e}")
+            total.error(e)
+            return None, None
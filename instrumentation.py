@@ -0,0 +1,280 @@
+"""
+Instrumentação das etapas do pipeline: tempo de parede e de CPU da thread, pico de
+memória, tamanho das entradas/saídas, contagens (contornos, linhas, ...) e
+erros, enviados para um ou mais destinos (logging, arquivo JSON-lines ou
+texto no formato do Prometheus).
+
+Sem destinos configurados, `Instrumentation.stage` devolve um objeto nulo
+compartilhado e nada é medido.
+"""
+import json
+import logging
+import sys
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Pilha de etapas ativas por thread, usada por `count` e `record_error`
+_active = threading.local()
+# Etapas abertas em todas as threads: o pico do tracemalloc é do processo
+# inteiro, então só vale para uma etapa que não se sobrepôs a outra thread
+_open_stages = set()
+_open_lock = threading.Lock()
+
+
+def describe(value):
+    """
+    Resumo do tamanho de uma entrada/saída de etapa, sem copiar os dados.
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.ndarray):
+        return {"shape": list(value.shape), "bytes": int(value.nbytes)}
+    if isinstance(value, (list, tuple)):
+        return {"items": len(value), "points": int(sum(len(item) for item in value if hasattr(item, "__len__")))}
+    if hasattr(value, "encoded") and value.encoded is not None:
+        return {"encoded_bytes": len(value.encoded)}
+    return {"type": type(value).__name__}
+
+
+def _max_rss_bytes():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+    def input(self, value):
+        pass
+
+    def output(self, value):
+        pass
+
+    def count(self, name, value):
+        pass
+
+    def error(self, exception):
+        pass
+
+
+NULL_STAGE = _NullStage()
+
+
+class Stage:
+    """
+    Medição de uma etapa, usada como gerenciador de contexto. Exceções são
+    registradas no campo `error` e propagadas.
+    """
+
+    def __init__(self, instrumentation, name, context):
+        self.instrumentation = instrumentation
+        self.record = {"stage": name, **context, "input": None, "output": None, "counts": {}, "error": None}
+        self._child_peak = 0
+        self._thread = threading.get_ident()
+        self._concurrent = False
+
+    def input(self, value):
+        self.record["input"] = describe(value)
+
+    def output(self, value):
+        self.record["output"] = describe(value)
+
+    def count(self, name, value):
+        self.record["counts"][name] = self.record["counts"].get(name, 0) + value
+
+    def error(self, exception):
+        self.record["error"] = {"type": type(exception).__name__, "message": str(exception)}
+
+    def __enter__(self):
+        stack = getattr(_active, "stack", None)
+        if stack is None:
+            stack = _active.stack = []
+        stack.append(self)
+        with _open_lock:
+            others = [stage for stage in _open_stages if stage._thread != self._thread]
+            if others:
+                # Ex.: magnitude e fase de um par de Bode em threads (ver process_bode_pair)
+                for stage in others:
+                    stage._concurrent = True
+                self._concurrent = True
+            _open_stages.add(self)
+            if self.instrumentation.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                if not others:
+                    tracemalloc.reset_peak()
+        self._wall = time.perf_counter()
+        # Tempo de CPU desta thread: não inclui as threads internas do OpenCV
+        # nem as de outros executores (ex.: o refinamento das curvas)
+        self._cpu = time.thread_time()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.record["wall_s"] = time.perf_counter() - self._wall
+        self.record["cpu_s"] = time.thread_time() - self._cpu
+        _active.stack.pop()
+        with _open_lock:
+            _open_stages.discard(self)
+            concurrent = self._concurrent
+        if self.instrumentation.trace_memory:
+            # Etapas internas zeram o pico do tracemalloc: considera o maior pico delas
+            peak = max(tracemalloc.get_traced_memory()[1], self._child_peak)
+            # Com etapas de outras threads abertas ao mesmo tempo o pico mistura
+            # as alocações delas: o campo fica vazio e `concurrent` indica o motivo
+            self.record["peak_bytes"] = None if concurrent else peak
+            if _active.stack:
+                parent = _active.stack[-1]
+                parent._child_peak = max(parent._child_peak, peak)
+        self.record["concurrent"] = concurrent
+        self.record["max_rss_bytes"] = _max_rss_bytes()
+        if exc_value is not None:
+            self.error(exc_value)
+        self.record["timestamp"] = time.time()
+        self.instrumentation.emit(self.record)
+        return False
+
+
+class Instrumentation:
+    """
+    Conjunto de destinos (sinks) para os registros das etapas. Cada destino
+    é um objeto com o método `emit(record)`.
+
+    Com `trace_memory`, o pico de memória de cada etapa é medido com o
+    tracemalloc (arrays NumPy, incluindo os devolvidos pelo OpenCV), o que
+    deixa o processamento mais lento; o pico de RSS do processo é sempre
+    registrado quando disponível.
+    """
+
+    def __init__(self, sinks=(), trace_memory=False):
+        self.sinks = list(sinks)
+        self.trace_memory = trace_memory
+
+    @property
+    def enabled(self):
+        return bool(self.sinks)
+
+    def stage(self, name, **context):
+        if not self.sinks:
+            return NULL_STAGE
+        return Stage(self, name, context)
+
+    def emit(self, record):
+        for sink in self.sinks:
+            try:
+                sink.emit(record)
+            except Exception as e:
+                print(f"Erro ao registrar métricas da etapa '{record['stage']}': {e}")
+
+
+DISABLED = Instrumentation()
+
+
+def count(name, value=1):
+    """
+    Soma `value` à contagem `name` da etapa ativa nesta thread (se houver).
+    """
+    stack = getattr(_active, "stack", None)
+    if stack:
+        stack[-1].count(name, value)
+
+
+def record_error(exception):
+    """
+    Registra um erro tratado dentro de uma função (que não chega a propagar)
+    na etapa ativa nesta thread (se houver).
+    """
+    stack = getattr(_active, "stack", None)
+    if stack:
+        stack[-1].error(exception)
+
+
+class LoggingSink:
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("extrator.pipeline")
+        self.level = level
+
+    def emit(self, record):
+        self.logger.log(self.level, "etapa %s: %s", record["stage"], json.dumps(record, default=str))
+
+
+class JsonLinesSink:
+    """
+    Acrescenta um registro JSON por linha em `path`. Cada linha é escrita com
+    uma única chamada em modo append, então vários processos podem usar o
+    mesmo arquivo.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def emit(self, record):
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+
+
+class PrometheusSink:
+    """
+    Agrega os registros por etapa e os exporta no formato de texto do
+    Prometheus (`render()`), por exemplo para um endpoint /metrics.
+    """
+
+    def __init__(self, prefix="extrator"):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._stages = {}
+
+    def emit(self, record):
+        with self._lock:
+            totals = self._stages.setdefault(record["stage"], {
+                "count": 0, "errors": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_bytes": 0, "counts": {},
+            })
+            totals["count"] += 1
+            totals["errors"] += record["error"] is not None
+            totals["wall_s"] += record["wall_s"]
+            totals["cpu_s"] += record["cpu_s"]
+            totals["peak_bytes"] = max(totals["peak_bytes"], record.get("peak_bytes") or 0)
+            for name, value in record["counts"].items():
+                totals["counts"][name] = totals["counts"].get(name, 0) + value
+
+    def render(self):
+        # Cada família é um bloco contínuo: a linha TYPE e depois todas as amostras
+        p = self.prefix
+        families = [
+            ("stage_runs_total", "counter", lambda totals: [("", totals["count"])]),
+            ("stage_errors_total", "counter", lambda totals: [("", totals["errors"])]),
+            ("stage_wall_seconds_total", "counter", lambda totals: [("", f"{totals['wall_s']:.6f}")]),
+            ("stage_cpu_seconds_total", "counter", lambda totals: [("", f"{totals['cpu_s']:.6f}")]),
+            ("stage_peak_bytes", "gauge", lambda totals: [("", totals["peak_bytes"])]),
+            ("stage_items_total", "counter",
+             lambda totals: [(f',item="{name}"', value) for name, value in sorted(totals["counts"].items())]),
+        ]
+        lines = []
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for name, kind, samples in families:
+                lines.append(f"# TYPE {p}_{name} {kind}")
+                for stage, totals in stages:
+                    for labels, value in samples(totals):
+                        lines.append(f'{p}_{name}{{stage="{stage}"{labels}}} {value}')
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path):
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.render())
@@ -0,0 +1,357 @@
+"""
+Fila persistente de trabalhos do modo em lote, em um arquivo SQLite local.
+
+Cada imagem vira um trabalho com os parâmetros da execução, o estado
+(pending, running, done, failed), o número de tentativas, o processo que o
+pegou, o arquivo de saída, o tempo de processamento e a mensagem de erro.
+Assim, um lote de horas que morre no meio (falta de memória em uma
+digitalização enorme, reinício da máquina) pode ser retomado: os trabalhos
+concluídos são pulados e os que estavam em andamento voltam para a fila.
+
+Os processos pegam os trabalhos de forma atômica (BEGIN IMMEDIATE), então
+vários processos, ou várias execuções do batch.py, podem dividir a mesma
+fila. Uma falha devolve o trabalho à fila até `max_attempts` tentativas. Quando
+um processo de trabalho morre, os trabalhos em andamento voltam à fila sem
+contar a tentativa (ver `release_interrupted`) e o batch.py os repete um a
+um: só o trabalho que derrubar o processo sozinho perde uma tentativa.
+
+Uso: python job_queue.py fila.db   (resumo: vazão, falhas por etapa e por diretório)
+"""
+import argparse
+import json
+import os
+import socket
+import sqlite3
+import time
+
+PENDING, RUNNING, DONE, FAILED = "pending", "running", "done", "failed"
+DEFAULT_MAX_ATTEMPTS = 3
+# Trabalhos em andamento há mais tempo que isso (em segundos) em outra
+# máquina são considerados abandonados
+DEFAULT_STALE_AFTER = 6 * 3600
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY,
+    image TEXT NOT NULL,
+    params TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    output TEXT,
+    error TEXT,
+    elapsed_s REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    UNIQUE (image, params)
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, params);
+"""
+
+
+class Job:
+    def __init__(self, job_id, image, params, attempts, worker):
+        self.id = job_id
+        self.image = image
+        self.params = params
+        self.attempts = attempts
+        self.worker = worker
+
+    def __repr__(self):
+        return f"Job({self.id}, {self.image!r}, tentativa {self.attempts})"
+
+
+def worker_id():
+    """
+    Identificação do processo atual: "máquina:pid".
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _process_alive(worker):
+    # Só dá para verificar processos da própria máquina; os outros contam como vivos
+    host, _, pid = (worker or "").rpartition(":")
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    # Um processo morto cujo pai também morreu pode continuar como zumbi até ser recolhido (Linux)
+    try:
+        with open(f"/proc/{pid}/stat", encoding="utf-8") as stat:
+            return stat.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except (OSError, IndexError):
+        return True
+
+
+def params_key(params):
+    # Forma canônica dos parâmetros: trabalhos com parâmetros diferentes são distintos
+    return json.dumps(params, sort_keys=True)
+
+
+class ErrorSink:
+    """
+    Destino de instrumentação que guarda a primeira etapa com erro de cada
+    imagem, já que o process_graph apenas retorna (None, None) na falha.
+    """
+
+    def __init__(self):
+        self.error = None
+
+    def emit(self, record):
+        if record.get("error") and self.error is None:
+            self.error = f"{record['stage']}: {record['error']['message']}"
+
+    def reset(self):
+        self.error = None
+
+
+class JobQueue:
+    """
+    Fila de trabalhos em um arquivo SQLite. Cada processo abre a sua
+    instância (a conexão não é compartilhada entre processos).
+    """
+
+    def __init__(self, path, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        # Autocommit: as transações são abertas explicitamente onde importam
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add(self, images, params):
+        """
+        Enfileira as imagens com estes parâmetros e retorna quantos trabalhos
+        novos foram criados (imagens já enfileiradas com os mesmos parâmetros,
+        inclusive as concluídas, são ignoradas).
+        """
+        key = params_key(params)
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            before = self._db.total_changes
+            self._db.executemany("INSERT OR IGNORE INTO jobs (image, params, created) VALUES (?, ?, ?)",
+                                 [(image, key, now) for image in images])
+            added = self._db.total_changes - before
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return added
+
+    def claim(self, params, worker=None, job_ids=None):
+        """
+        Pega o próximo trabalho pendente com estes parâmetros (e, com
+        `job_ids`, entre estes ids) e o marca como em andamento, ou retorna
+        None se não houver nenhum.
+        """
+        query = "SELECT id, image, attempts FROM jobs WHERE status = ? AND params = ?"
+        values = [PENDING, params_key(params)]
+        if job_ids is not None:
+            query += f" AND id IN ({', '.join('?' * len(job_ids))})"
+            values.extend(job_ids)
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self._db.execute(query + " ORDER BY id LIMIT 1", values).fetchone()
+            if row is None:
+                self._db.execute("COMMIT")
+                return None
+            job_id, image, attempts = row
+            worker = worker or worker_id()
+            self._db.execute("UPDATE jobs SET status = ?, attempts = attempts + 1, worker = ?, started = ?, "
+                             "finished = NULL WHERE id = ?", (RUNNING, worker, time.time(), job_id))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return Job(job_id, image, params, attempts + 1, worker)
+
+    def _finish(self, job, assignments, values):
+        # Só altera o trabalho se ele ainda for desta tentativa: se o
+        # requeue_stale o devolveu à fila e outro processo o pegou, o
+        # resultado atrasado é descartado. Retorna se a linha foi alterada.
+        cursor = self._db.execute(f"UPDATE jobs SET {assignments} "
+                                  "WHERE id = ? AND status = ? AND worker = ? AND attempts = ?",
+                                  (*values, job.id, RUNNING, job.worker, job.attempts))
+        return cursor.rowcount == 1
+
+    def complete(self, job, output, elapsed):
+        """
+        Registra o resultado. Retorna False se o trabalho não pertence mais a
+        esta tentativa (ver `_finish`).
+        """
+        return self._finish(job, "status = ?, output = ?, error = NULL, elapsed_s = ?, finished = ?",
+                            (DONE, output, elapsed, time.time()))
+
+    def fail(self, job, error, elapsed=None):
+        """
+        Registra a falha: o trabalho volta para a fila ou, depois de
+        `max_attempts` tentativas, fica como falho. Retorna o novo estado, ou
+        None se o trabalho não pertence mais a esta tentativa.
+        """
+        status = FAILED if job.attempts >= self.max_attempts else PENDING
+        if not self._finish(job, "status = ?, error = ?, elapsed_s = ?, finished = ?",
+                            (status, error, elapsed, time.time())):
+            return None
+        return status
+
+    def release_interrupted(self):
+        """
+        Devolve à fila, sem contar a tentativa, os trabalhos em andamento cujo
+        processo não existe mais nesta máquina. Não se sabe qual deles derrubou
+        o processo (os outros foram encerrados junto com o pool): o chamador
+        deve repeti-los um a um, com `claim(job_ids=...)`, e usar
+        `requeue_stale` se o processo morrer de novo. Retorna os ids.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute("SELECT id, worker FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+            released = [job_id for job_id, worker in rows if not _process_alive(worker)]
+            for job_id in released:
+                self._db.execute("UPDATE jobs SET status = ?, attempts = attempts - 1 WHERE id = ?",
+                                 (PENDING, job_id))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return released
+
+    def requeue_stale(self, stale_after=DEFAULT_STALE_AFTER):
+        """
+        Devolve à fila os trabalhos em andamento cujo processo não existe mais
+        (nesta máquina) ou que começaram há mais de `stale_after` segundos.
+        Cada um conta como uma tentativa; no limite, fica como falho.
+        Retorna o número de trabalhos recuperados.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self._db.execute("SELECT id, worker, started, attempts FROM jobs WHERE status = ?",
+                                    (RUNNING,)).fetchall()
+            now = time.time()
+            stale = [(job_id, attempts) for job_id, worker, started, attempts in rows
+                     if not _process_alive(worker) or now - (started or 0) > stale_after]
+            for job_id, attempts in stale:
+                status = FAILED if attempts >= self.max_attempts else PENDING
+                self._db.execute("UPDATE jobs SET status = ?, error = ?, finished = ? WHERE id = ?",
+                                 (status, "Processo de trabalho interrompido", now, job_id))
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return len(stale)
+
+    def retry_failed(self, params):
+        """
+        Devolve à fila os trabalhos falhos com estes parâmetros que ainda têm
+        tentativas (ex.: depois de aumentar `max_attempts`).
+        """
+        return self._db.execute("UPDATE jobs SET status = ? WHERE status = ? AND params = ? AND attempts < ?",
+                                (PENDING, FAILED, params_key(params), self.max_attempts)).rowcount
+
+    def results(self, images, params):
+        """
+        (imagem, arquivo de saída ou None, segundos) de cada imagem com estes
+        parâmetros, na ordem de `images`, incluindo as concluídas em
+        execuções anteriores.
+        """
+        rows = {image: (output if status == DONE else None, elapsed or 0.0)
+                for image, status, output, elapsed in self._db.execute(
+                    "SELECT image, status, output, elapsed_s FROM jobs WHERE params = ?", (params_key(params),))}
+        return [(image, *rows.get(image, (None, 0.0))) for image in images]
+
+    def pending(self, params=None):
+        if params is None:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ?", (PENDING,)).fetchone()[0]
+        return self._db.execute("SELECT COUNT(*) FROM jobs WHERE status = ? AND params = ?",
+                                (PENDING, params_key(params))).fetchone()[0]
+
+    def summary(self, top=5):
+        """
+        Resumo da fila: trabalhos por estado, vazão dos concluídos (imagens/s
+        entre o primeiro início e o último término, tempos médio e p95),
+        erros mais frequentes, diretórios com mais falhas e imagens mais lentas.
+        """
+        db = self._db
+        counts = dict(db.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        done, first, last, mean = db.execute(
+            "SELECT COUNT(*), MIN(started), MAX(finished), AVG(elapsed_s) FROM jobs WHERE status = ?",
+            (DONE,)).fetchone()
+        elapsed = sorted(value for value, in db.execute("SELECT elapsed_s FROM jobs WHERE status = ? "
+                                                        "AND elapsed_s IS NOT NULL", (DONE,)))
+        span = (last - first) if done and last and first else 0.0
+        # O caminho da imagem sai da mensagem para que o mesmo erro em imagens diferentes seja agrupado
+        errors = db.execute("SELECT REPLACE(error, image, '<imagem>') AS message, COUNT(*) FROM jobs "
+                            "WHERE error IS NOT NULL AND status != ? GROUP BY message ORDER BY COUNT(*) DESC "
+                            "LIMIT ?", (DONE, top)).fetchall()
+        by_directory = {}
+        for image, status in db.execute("SELECT image, status FROM jobs"):
+            totals = by_directory.setdefault(os.path.dirname(image), [0, 0])
+            totals[0] += 1
+            totals[1] += status == FAILED
+        directories = sorted(((directory, failed, total) for directory, (total, failed) in by_directory.items()
+                              if failed), key=lambda item: (-item[1], item[0]))[:top]
+        slowest = db.execute("SELECT image, elapsed_s FROM jobs WHERE status = ? AND elapsed_s IS NOT NULL "
+                             "ORDER BY elapsed_s DESC LIMIT ?", (DONE, top)).fetchall()
+        return {
+            "jobs": {status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)},
+            "throughput": done / span if span > 0 else None,
+            "mean_s": mean,
+            "p95_s": elapsed[min(len(elapsed) - 1, int(0.95 * len(elapsed)))] if elapsed else None,
+            "errors": errors,
+            "failed_directories": directories,
+            "slowest": slowest,
+        }
+
+
+def format_summary(summary):
+    jobs = summary["jobs"]
+    lines = [f"Trabalhos: {jobs[DONE]} concluídos, {jobs[FAILED]} falhos, {jobs[PENDING]} pendentes, "
+             f"{jobs[RUNNING]} em andamento"]
+    if summary["throughput"] is not None:
+        lines.append(f"Vazão: {summary['throughput']:.2f} imagens/s (média {summary['mean_s']:.2f} s, "
+                     f"p95 {summary['p95_s']:.2f} s por imagem)")
+    if summary["errors"]:
+        lines.append("Erros mais frequentes:")
+        lines.extend(f"  {total:5d}  {error}" for error, total in summary["errors"])
+    if summary["failed_directories"]:
+        lines.append("Diretórios com falhas:")
+        lines.extend(f"  {failed:5d}/{total:<5d} {directory or '.'}"
+                     for directory, failed, total in summary["failed_directories"])
+    if summary["slowest"]:
+        lines.append("Imagens mais lentas:")
+        lines.extend(f"  {elapsed:7.2f} s  {image}" for image, elapsed in summary["slowest"])
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumo de uma fila de trabalhos do batch.py.")
+    parser.add_argument("queue", help="Arquivo SQLite da fila (batch.py --queue).")
+    parser.add_argument("--top", type=int, default=5, help="Itens em cada lista do resumo.")
+    args = parser.parse_args(argv)
+    if not os.path.isfile(args.queue):
+        print(f"Fila não encontrada: {args.queue}")
+        return 1
+    with JobQueue(args.queue) as jobs:
+        print(format_summary(jobs.summary(args.top)))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
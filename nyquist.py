@@ -1,14 +1,10 @@
 import customtkinter as ctk
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
-from matplotlib.widgets import Button, RadioButtons
 from tkinter import filedialog, messagebox
-import pandas as pd
-import matplotlib.image as mpimg
-import image_processing
-import annotation_loader  # Importar annotation_loader para o uso do LabelMe
-import numpy as np
+from annotation_view import DisplayPyramid, SeriesArtists, TraceStroke
+from annotation_store import AnnotationStore
 
+# matplotlib, OpenCV e o pipeline de imagem são importados apenas quando a
+# janela de anotação é aberta, para que a tela inicial abra rapidamente
 
 
 class NyquistAnnotationApp:
@@ -19,8 +15,16 @@ class NyquistAnnotationApp:
         self.x_max = 1
         self.y_min = 0
         self.y_max = 1
-        self.curves = {}
-        self.current_curve = []
+        # Séries anotadas (arrays por série, com índice espacial para a borracha)
+        self.curves = AnnotationStore()
+        # Séries geradas pelo modo automático, substituídas a cada ajuste de parâmetros
+        self.automatic_series = []
+        # Modo automático com as séries separadas pela cor (ver color_separation.py)
+        self.separate_colors = False
+        self.stroke = None
+        self.task = None
+        self.pipeline = None
+        self.tuning_panel = None
         self.trace_active = False
         self.current_color = "red"
         self.mode = mode
@@ -59,6 +63,12 @@ class NyquistAnnotationApp:
             entry.grid(row=limits.index(limit), column=1, padx=10, pady=10)
             self.entries[limit] = entry
 
+        self.separate_colors_var = ctk.BooleanVar(value=self.separate_colors)
+        if self.mode == "automatic":
+            separate_colors_box = ctk.CTkCheckBox(self.root, text="Separar séries por cor", font=("Manrope", 14),
+                                                  variable=self.separate_colors_var)
+            separate_colors_box.pack(pady=5)
+
         start_annotation_button = ctk.CTkButton(self.root, text="Iniciar Anotação", font=("Manrope", 16), command=self.process_limits_nyquist)
         start_annotation_button.pack(pady=20)
 
@@ -88,12 +98,17 @@ class NyquistAnnotationApp:
             messagebox.showerror("Erro", "Selecione uma imagem antes de continuar.")
             return
 
+        self.separate_colors = self.separate_colors_var.get()
         self.on_closing()
         self.start_annotation_nyquist()
 
 
 
     def start_annotation_nyquist(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg, NavigationToolbar2Tk
+        from image_loader import load_image
+
         print(f"Iniciando anotação Nyquist no modo {self.mode}...")
         self.annotation_root = ctk.CTk()
         self.annotation_root.title("Anotação do Gráfico Nyquist")
@@ -101,26 +116,17 @@ class NyquistAnnotationApp:
         self.annotation_root.resizable(True, True)
 
         self.fig, self.ax = plt.subplots(figsize=(10, 6))
-        self.image = mpimg.imread(self.image_path)
-
-        if self.mode == "automatic":
-            processed_image = image_processing.preprocess_image(self.image_path)
-            image_cleaned = image_processing.remove_text_and_symbols(processed_image)
-            image_without_grid = image_processing.remove_grid_lines(image_cleaned)
-            detected_curves = image_processing.segment_curves(image_without_grid)
-            refined_curves = image_processing.refine_curves(detected_curves)
-
-            self.ax.imshow(image_without_grid, cmap='gray', origin='upper', aspect='equal', 
-                        extent=[self.x_min, self.x_max, self.y_min, self.y_max])
-
-            self.curves = {f"curve_{i}": curve for i, curve in enumerate(refined_curves)}
-
-            for curve in refined_curves:
-                self.ax.plot(curve[:, 0], curve[:, 1], "-", color=self.current_color, linewidth=1)
-
-        else:
-            self.ax.imshow(self.image, cmap='gray', origin='upper', aspect='equal', 
-                        extent=[self.x_min, self.x_max, self.y_min, self.y_max])
+        # Decodifica a imagem uma única vez para exibição e processamento
+        self.loaded_image = load_image(self.image_path)
+        self.image = self.loaded_image.rgb
+
+        # No modo automático a imagem original é exibida enquanto o pipeline
+        # roda em segundo plano (ver start_automatic_processing). O AxesImage é
+        # mantido até o fim e exibe o nível da pirâmide adequado ao zoom atual
+        self.background = DisplayPyramid(self.ax, self.image, extent=[self.x_min, self.x_max, self.y_min, self.y_max],
+                                         cmap='gray', origin='upper', aspect='equal')
+        # Uma linha por série, atualizada apenas quando a série muda
+        self.artists = SeriesArtists(self.ax, self.curves)
 
         self.ax.set_title("Anotação do Gráfico Nyquist")
         self.ax.set_xlabel(f"Real (Z), de {self.x_min} a {self.x_max}")
@@ -137,37 +143,147 @@ class NyquistAnnotationApp:
         self.create_interface_nyquist()
         self.connect_events()
 
+        if self.mode == "automatic" and not self.separate_colors:
+            tuning_button = ctk.CTkButton(self.annotation_root, text="Ajustar Parâmetros", font=("Manrope", 16),
+                                          command=self.open_tuning_panel)
+            tuning_button.pack(pady=(10, 0))
+
         back_button = ctk.CTkButton(self.annotation_root, text="Voltar", font=("Manrope", 16), command=self.on_closing_annotation)
         back_button.pack(pady=10)
 
         self.annotation_root.protocol("WM_DELETE_WINDOW", self.on_closing_annotation)
+        if self.mode == "automatic":
+            self.start_automatic_processing()
         self.annotation_root.mainloop()
 
+    def start_automatic_processing(self):
+        """
+        Executa o pipeline em uma thread de trabalho, com a janela de progresso,
+        sem bloquear a janela de anotação.
+        """
+        import image_processing
+        from background import BackgroundTask, ProgressWindow
+
+        def run(progress):
+            if self.separate_colors:
+                image_without_grid, series = image_processing.process_graph_by_color(
+                    self.loaded_image, graph_type="nyquist", progress=progress)
+                if series is None:
+                    return None, None, None
+                # Uma série anotada por curva, com a cor da série de origem
+                curves = [curve for _, series_curves in series for curve in series_curves]
+                colors = [color for color, series_curves in series for _ in series_curves]
+                return image_without_grid, curves, colors
+            return image_processing.process_graph(self.loaded_image, graph_type="nyquist", progress=progress) + (None,)
+
+        self.task = BackgroundTask(run).start()
+        self.progress_window = ProgressWindow(self.annotation_root, self.task, "Processando Nyquist...")
+
+        def finish():
+            self.progress_window.close()
+            self.task = None
+
+        def on_done(result):
+            finish()
+            image_without_grid, refined_curves, colors = result
+            if image_without_grid is None:
+                messagebox.showerror("Erro", "Erro no processamento automático. Verifique a imagem selecionada.")
+                return
+            self.show_automatic_result(image_without_grid, refined_curves, colors)
+
+        def on_error(error):
+            finish()
+            messagebox.showerror("Erro", f"Erro no processamento automático: {error}")
+
+        def on_cancelled():
+            finish()
+            print("Processamento automático cancelado.")
+
+        self.task.poll(self.annotation_root, on_done, self.progress_window.update, on_error, on_cancelled)
+
+    def show_automatic_result(self, image_without_grid, refined_curves, colors=None):
+        """
+        Exibe a imagem sem grade e as curvas detectadas, substituindo as
+        curvas de um resultado automático anterior (as anotações manuais são
+        mantidas). `colors` traz a cor de cada curva (separação por cor); sem
+        ele, todas usam a cor selecionada.
+        """
+        from export import Calibration
+
+        self.background.set_image(image_without_grid, reduce="max", cmap='gray')
+        self.curves.remove_series(self.automatic_series)
+        previous = self.automatic_series
+        self.automatic_series = []
+
+        # As curvas saem em pixels: converte para as coordenadas do gráfico,
+        # as mesmas do extent da imagem e das anotações manuais
+        calibration = Calibration.from_image(image_without_grid.shape, x_limits=(self.x_min, self.x_max),
+                                             y_limits=(self.y_min, self.y_max))
+        for i, curve in enumerate(refined_curves):
+            color = colors[i] if colors is not None else self.current_color
+            series = self.curves.new_series(color, label=f"curve_{i}")
+            self.curves.add_points(series, calibration.apply(curve))
+            self.automatic_series.append(series.id)
+        self.artists.update(previous + self.automatic_series)
+        # A imagem de fundo mudou: redesenho completo (o fundo em cache é atualizado)
+        self.canvas.draw()
 
+    def open_tuning_panel(self):
+        """
+        Abre o painel de ajuste dos parâmetros: cada mudança recalcula só as
+        etapas afetadas (ver pipeline.py) e substitui as curvas automáticas.
+        """
+        from pipeline import Pipeline
+        from tuning_panel import TuningPanel
+
+        if self.tuning_panel is not None and self.tuning_panel.window is not None:
+            self.tuning_panel.window.focus()
+            return
+        if self.pipeline is None:
+            self.pipeline = Pipeline(self.loaded_image, graph_type="nyquist")
+        self.tuning_panel = TuningPanel(self.annotation_root, self.pipeline, self.show_automatic_result,
+                                        "Ajuste de Parâmetros - Nyquist")
 
     def create_interface_nyquist(self):
+        import matplotlib.pyplot as plt
+        from matplotlib.widgets import Button, LassoSelector, RadioButtons, RectangleSelector
+
         button_style = {'hovercolor': 'lightblue'}
 
-        ax_points = plt.axes([0.1, 0.90, 0.12, 0.05])
+        ax_points = plt.axes([0.05, 0.90, 0.10, 0.05])
         self.btn_points = Button(ax_points, "Marcar Pontos", color='lightgray', **button_style)
         self.btn_points.on_clicked(self.set_mode_points)
 
-        ax_trace = plt.axes([0.25, 0.90, 0.12, 0.05])
+        ax_trace = plt.axes([0.16, 0.90, 0.10, 0.05])
         self.btn_trace = Button(ax_trace, "Desenhar Linha", color='lightgray', **button_style)
         self.btn_trace.on_clicked(self.set_mode_trace)
 
-        ax_eraser = plt.axes([0.40, 0.90, 0.12, 0.05])
+        ax_eraser = plt.axes([0.27, 0.90, 0.10, 0.05])
         self.btn_eraser = Button(ax_eraser, "Borracha", color='lightgray', **button_style)
         self.btn_eraser.on_clicked(self.set_mode_eraser)
 
-        ax_reset = plt.axes([0.55, 0.90, 0.12, 0.05])
+        ax_eraser_rect = plt.axes([0.38, 0.90, 0.10, 0.05])
+        self.btn_eraser_rect = Button(ax_eraser_rect, "Apagar Área", color='lightgray', **button_style)
+        self.btn_eraser_rect.on_clicked(self.set_mode_eraser_rect)
+
+        ax_eraser_lasso = plt.axes([0.49, 0.90, 0.10, 0.05])
+        self.btn_eraser_lasso = Button(ax_eraser_lasso, "Apagar Laço", color='lightgray', **button_style)
+        self.btn_eraser_lasso.on_clicked(self.set_mode_eraser_lasso)
+
+        ax_reset = plt.axes([0.60, 0.90, 0.10, 0.05])
         self.btn_reset = Button(ax_reset, "Resetar", color='lightgray', **button_style)
         self.btn_reset.on_clicked(self.reset_annotations_nyquist)
 
-        ax_save = plt.axes([0.70, 0.90, 0.12, 0.05])
+        ax_save = plt.axes([0.71, 0.90, 0.10, 0.05])
         self.btn_save = Button(ax_save, "Salvar", color='green', **button_style)
         self.btn_save.on_clicked(self.save_curves_nyquist)
 
+        # Seletores de área da borracha, ativos apenas nos modos correspondentes
+        self.rect_selector = RectangleSelector(self.ax, self.on_select_rect, useblit=True, button=[1])
+        self.rect_selector.set_active(False)
+        self.lasso_selector = LassoSelector(self.ax, self.on_select_lasso, useblit=True, button=[1])
+        self.lasso_selector.set_active(False)
+
         ax_colors = plt.axes([0.85, 0.75, 0.08, 0.2])
         self.radio_colors = RadioButtons(ax_colors, ["vermelho", "azul", "verde", "laranja", "rosa"], activecolor='black')
         self.radio_colors.on_clicked(self.set_color)
@@ -179,18 +295,38 @@ class NyquistAnnotationApp:
     # Funções adicionais continuam as mesmas...
     def set_mode_eraser(self, event):
         self.mode = "eraser"
+        self.discard_stroke()
+        self.update_selectors()
         print("Modo: Borracha")
 
     def set_mode_points(self, event):
         self.mode = "points"
+        self.discard_stroke()
+        self.update_selectors()
         print("Modo: Marcar Pontos")
 
     def set_mode_trace(self, event):
         self.mode = "trace"
-        self.current_curve = []
-        self.trace_active = False
+        self.discard_stroke()
+        self.update_selectors()
         print("Modo: Desenhar Linha")
 
+    def set_mode_eraser_rect(self, event):
+        self.mode = "eraser_rect"
+        self.discard_stroke()
+        self.update_selectors()
+        print("Modo: Apagar Área (arraste um retângulo)")
+
+    def set_mode_eraser_lasso(self, event):
+        self.mode = "eraser_lasso"
+        self.discard_stroke()
+        self.update_selectors()
+        print("Modo: Apagar Laço (contorne os pontos)")
+
+    def update_selectors(self):
+        self.rect_selector.set_active(self.mode == "eraser_rect")
+        self.lasso_selector.set_active(self.mode == "eraser_lasso")
+
     def set_color(self, label):
         color_mapping = {
             "vermelho": "red",
@@ -203,33 +339,38 @@ class NyquistAnnotationApp:
         self.current_color = color_mapping.get(label, "red")
         print(f"Cor selecionada: {self.current_color}")
 
+    def discard_stroke(self):
+        # Descarta o traço em andamento (se houver) sem salvá-lo
+        if self.stroke is not None:
+            self.stroke.cancel()
+            self.stroke = None
+        self.trace_active = False
+
     def reset_annotations_nyquist(self, event):
         print("Resetando anotações Nyquist...")
-        self.curves = {}
-        self.ax.clear()
-        self.ax.imshow(self.image, cmap='gray', origin='upper',
-                       extent=[self.x_min, self.x_max, self.y_min, self.y_max],
-                       aspect='equal')  # Manter a proporção fixa da imagem
-        self.ax.set_title("Anotação do Gráfico Nyquist")
-        self.ax.set_xlabel(f"Real (Z), de {self.x_min} a {self.x_max}")
-        self.ax.set_ylabel(f"Imag (Z), de {self.y_min} a {self.y_max}")
-        self.canvas.draw()
+        self.discard_stroke()
+        self.curves.clear()
+        self.automatic_series = []
+        self.artists.clear()
+        if self.background.levels[0] is not self.image:
+            # Volta da imagem sem grade do modo automático para a original
+            self.background.set_image(self.image, reduce="area")
+            self.canvas.draw()
+        else:
+            self.artists.blit()
         print("Anotações resetadas.")
 
     def save_curves_nyquist(self, event):
+        from export import EXPORT_FILETYPES, export_columns, store_columns
+
         print("Salvando anotações Nyquist...")
-        all_data = []
-        for color, points in self.curves.items():
-            for x, y in points:
-                all_data.append({"Color": color, "X": x, "Y": y})
-        if not all_data:
+        if self.curves.point_count == 0:
             print("Nenhuma anotação para salvar.")
             return
-        df = pd.DataFrame(all_data)
-        output_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
+        output_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=EXPORT_FILETYPES)
         if output_path:
-            df.to_csv(output_path, index=False)
-            print(f"Anotações salvas em {output_path}")
+            if export_columns(output_path, store_columns(self.curves)):
+                print(f"Anotações salvas em {output_path}")
         else:
             print("Operação de salvamento cancelada.")
 
@@ -238,70 +379,62 @@ class NyquistAnnotationApp:
             return
 
         if self.mode == "eraser":
-            # Apagar o ponto ou segmento mais próximo
-            min_distance = float("inf")
-            closest_point = None
-            closest_curve_key = None
-
-            for curve_key, points in self.curves.items():
-                for point in points:
-                    distance = np.sqrt((event.xdata - point[0]) ** 2 + (event.ydata - point[1]) ** 2)
-                    if distance < min_distance:
-                        min_distance = distance
-                        closest_point = point
-                        closest_curve_key = curve_key
-
-            # Se encontrou um ponto próximo, remova-o
-            if closest_point and min_distance < 10:  # Tolerância para o clique
-                self.curves[closest_curve_key].remove(closest_point)
-                print(f"Ponto apagado: {closest_point}")
-                self.redraw_curves()  # Atualizar o gráfico
+            # Apagar o ponto mais próximo, consultando o índice espacial
+            point, affected = self.curves.erase_nearest(event.xdata, event.ydata, max_distance=10)  # Tolerância para o clique
+            if point is not None:
+                print(f"Ponto apagado: {point}")
+                self.redraw_curves(affected)  # Atualizar o gráfico
             else:
                 print("Nenhum ponto próximo encontrado.")
 
         elif self.mode == "points":
-            if self.current_color not in self.curves:
-                self.curves[self.current_color] = []
-            self.curves[self.current_color].append((event.xdata, event.ydata))
-            self.ax.plot(event.xdata, event.ydata, "o", color=self.current_color)
-            self.canvas.draw()
+            series = self.curves.add_points(self.curves.series_for_color(self.current_color),
+                                            [(event.xdata, event.ydata)])
+            self.redraw_curves([series.id])
             print(f"Ponto marcado: ({event.xdata}, {event.ydata})")
 
         elif self.mode == "trace":
             if not self.trace_active:
                 self.trace_active = True
-                self.current_curve = [(event.xdata, event.ydata)]
+                self.stroke = TraceStroke(self.ax, self.current_color)
+                self.stroke.add(event.xdata, event.ydata)
                 print("Traçado iniciado.")
             else:
                 self.trace_active = False
-                self.curves.setdefault(self.current_color, []).extend(self.current_curve)
-                x_coords, y_coords = zip(*self.current_curve)
-                self.ax.plot(x_coords, y_coords, "-", color=self.current_color)
-                self.canvas.draw()
-                self.current_curve = []
+                series = self.curves.add_points(self.curves.series_for_color(self.current_color),
+                                                self.stroke.finish())
+                self.stroke = None
+                self.redraw_curves([series.id])
                 print("Traçado finalizado e salvo.")
-    def redraw_curves(self):
-        # Limpa o eixo sem remover o fundo
-        self.ax.clear()
-        self.ax.imshow(self.image, cmap='gray', origin='upper', 
-                    extent=[self.x_min, self.x_max, self.y_min, self.y_max])
-
-        # Redesenha todas as curvas
-        for color, points in self.curves.items():
-            if points:
-                x_coords, y_coords = zip(*points)
-                self.ax.plot(x_coords, y_coords, "-", color=color, linewidth=1)
-        
-        self.canvas.draw()
+    def on_select_rect(self, eclick, erelease):
+        ids = self.curves.index.in_rect(eclick.xdata, eclick.ydata, erelease.xdata, erelease.ydata)
+        print(f"Pontos apagados na área: {len(ids)}")
+        self.erase_points(ids)
+
+    def on_select_lasso(self, vertices):
+        if len(vertices) < 3:
+            return
+        ids = self.curves.index.in_polygon(vertices)
+        print(f"Pontos apagados no laço: {len(ids)}")
+        self.erase_points(ids)
+
+    def erase_points(self, ids):
+        affected = self.curves.erase_ids(ids)
+        if affected:
+            self.redraw_curves(affected)  # Atualizar o gráfico
+
+    def redraw_curves(self, series_ids=None):
+        # Atualiza só as linhas das séries alteradas (todas, se None) e as
+        # redesenha sobre o fundo em cache, sem reprocessar a imagem
+        self.artists.update(series_ids)
+        self.artists.blit()
 
 
     def on_motion(self, event):
         if event.inaxes != self.ax or self.mode != "trace" or not self.trace_active:
             return
-        # Adicionar o ponto atual à curva em andamento
-        self.current_curve.append((event.xdata, event.ydata))
-        self.ax.plot(event.xdata, event.ydata, ".", color=self.current_color)
-        self.canvas.draw()
+        # Adicionar o ponto atual ao traço em andamento (redesenho por blitting)
+        self.stroke.add(event.xdata, event.ydata)
 
 
     def on_closing(self):
@@ -310,6 +443,11 @@ class NyquistAnnotationApp:
             self.root = None
 
     def on_closing_annotation(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self.tuning_panel is not None:
+            self.tuning_panel.close()
+            self.tuning_panel = None
         if self.annotation_root is not None:
             self.annotation_root.destroy()
             self.annotation_root = None
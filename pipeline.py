@@ -0,0 +1,206 @@
+"""
+Pipeline incremental para o ajuste interativo dos parâmetros.
+
+As etapas formam um grafo (DAG): cada uma depende das saídas de etapas
+anteriores e de alguns parâmetros. Os resultados intermediários ficam em
+memória; mudar um parâmetro descarta apenas as etapas que dependem dele (e
+as seguintes), então mudar a área mínima da segmentação, por exemplo,
+recalcula só a segmentação e o refinamento.
+
+Os parâmetros com valor None usam o padrão do tipo de gráfico (limiares
+automáticos do Canny, HOUGH_PARAMETERS); `Pipeline.value` devolve o valor
+efetivamente usado.
+"""
+import image_processing
+from image_loader import as_grayscale
+from instrumentation import DISABLED
+from plot_area import uncrop
+
+
+class PipelineStage:
+    def __init__(self, name, inputs, params, function):
+        self.name = name
+        self.inputs = inputs
+        self.params = params
+        self.function = function
+
+
+def _thresholds(pipeline, blurred):
+    low, high = pipeline.params["canny_low"], pipeline.params["canny_high"]
+    if low is not None and high is not None:
+        return low, high
+    auto_low, auto_high = image_processing.canny_thresholds(blurred, pipeline.graph_type)
+    return (auto_low if low is None else low), (auto_high if high is None else high)
+
+
+def _area(pipeline, gray):
+    # Caixa (y0, y1, x0, x1) processada pelas etapas de imagem
+    if pipeline.params["crop"]:
+        return image_processing.crop_to_plot_area(gray)[1]
+    return 0, gray.shape[0], 0, gray.shape[1]
+
+
+def _crop(gray, area):
+    y0, y1, x0, x1 = area
+    return gray[y0:y1, x0:x1]
+
+
+def _hough(pipeline):
+    names = ("hough_threshold", "hough_min_line_length", "hough_max_line_gap")
+    defaults = image_processing.hough_parameters(pipeline.graph_type)
+    return tuple(default if pipeline.params[name] is None else pipeline.params[name]
+                 for name, default in zip(names, defaults))
+
+
+# Etapas em ordem topológica: (nome, etapas de entrada, parâmetros, função)
+STAGES = (
+    PipelineStage("gray", (), (), lambda pipeline: as_grayscale(pipeline.source)),
+    PipelineStage("area", ("gray",), ("crop",), _area),
+    PipelineStage("enhance", ("gray", "area"), ("clip_limit", "blur_size"),
+                  lambda pipeline, gray, area: image_processing.enhance_image(
+                      _crop(gray, area), pipeline.params["clip_limit"], blur_size=pipeline.params["blur_size"])),
+    PipelineStage("thresholds", ("enhance",), ("canny_low", "canny_high"), _thresholds),
+    PipelineStage("edges", ("enhance", "thresholds"), (),
+                  lambda pipeline, blurred, thresholds: image_processing.detect_edges(blurred, thresholds)),
+    PipelineStage("symbols", ("edges", "gray"), (),
+                  lambda pipeline, edges, gray: image_processing.remove_text_and_symbols(
+                      edges, pipeline.graph_type, full_shape=gray.shape)),
+    # A imagem sem grade volta ao tamanho da imagem inteira (coordenadas originais)
+    PipelineStage("grid", ("symbols", "area", "gray"), ("grid_method", "hough_threshold", "hough_min_line_length",
+                                                        "hough_max_line_gap"),
+                  lambda pipeline, image, area, gray: uncrop(image_processing.remove_grid_lines(
+                      image, pipeline.graph_type, pipeline.params["grid_method"], hough=_hough(pipeline)),
+                      area, gray.shape)),
+    PipelineStage("segment", ("grid",), ("segmentation", "min_area"),
+                  lambda pipeline, image: image_processing.segment_curves(
+                      image, pipeline.params["min_area"], pipeline.params["segmentation"])),
+    PipelineStage("refine", ("segment",), ("smoothing", "spacing"),
+                  lambda pipeline, curves: image_processing.refine_curves(
+                      curves, pipeline.params["smoothing"], pipeline.params["spacing"])),
+)
+
+# Valores padrão, os mesmos usados pelo process_graph
+DEFAULT_PARAMETERS = {
+    "crop": False,
+    "clip_limit": 3.0,
+    "blur_size": 5,
+    "canny_low": None,
+    "canny_high": None,
+    "grid_method": None,
+    "hough_threshold": None,
+    "hough_min_line_length": None,
+    "hough_max_line_gap": None,
+    "segmentation": None,
+    "min_area": 200,
+    "smoothing": 0.25,
+    "spacing": 2.0,
+}
+
+# Parâmetros expostos no painel de ajuste: (nome, rótulo, mínimo, máximo, passos, tipo)
+TUNABLE_PARAMETERS = (
+    ("clip_limit", "Contraste (CLAHE)", 1.0, 8.0, 14, float),
+    ("blur_size", "Filtro de mediana", 1, 15, 7, int),
+    ("canny_low", "Canny: limiar inferior", 0, 255, 255, int),
+    ("canny_high", "Canny: limiar superior", 0, 255, 255, int),
+    ("hough_threshold", "Hough: votos", 10, 300, 29, int),
+    ("hough_min_line_length", "Hough: comprimento mínimo", 5, 300, 59, int),
+    ("hough_max_line_gap", "Hough: intervalo máximo", 1, 50, 49, int),
+    ("min_area", "Área mínima da curva", 0, 2000, 100, int),
+    ("smoothing", "Suavização da spline", 0.0, 2.0, 40, float),
+)
+
+
+class Pipeline:
+    """
+    Pipeline de uma imagem com os resultados de cada etapa guardados em
+    memória. `set_params` descarta as etapas afetadas e `run` recalcula
+    apenas o que estiver faltando.
+
+    A instância não é thread-safe: `set_params` não deve ser chamado
+    enquanto `run` estiver executando em outra thread (ver tuning_panel.py).
+    """
+
+    def __init__(self, source, graph_type="nyquist", instrumentation=None, **params):
+        self.source = source
+        self.graph_type = graph_type
+        self.instrumentation = instrumentation or DISABLED
+        self.stages = {stage.name: stage for stage in STAGES}
+        self.params = dict(DEFAULT_PARAMETERS)
+        self.results = {}
+        self.set_params(**params)
+
+    def set_params(self, **params):
+        """
+        Atualiza os parâmetros e retorna os nomes das etapas descartadas.
+        """
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f"Parâmetros desconhecidos: {', '.join(sorted(unknown))}")
+        changed = {name for name, value in params.items() if self.params[name] != value}
+        self.params.update(params)
+        return self.invalidate([stage.name for stage in STAGES if changed.intersection(stage.params)])
+
+    def invalidate(self, names):
+        """
+        Descarta os resultados das etapas informadas e das que dependem delas.
+        """
+        stale = set(names)
+        for stage in STAGES:
+            if stale.intersection(stage.inputs):
+                stale.add(stage.name)
+        removed = [stage.name for stage in STAGES if stage.name in stale and stage.name in self.results]
+        for name in removed:
+            del self.results[name]
+        return removed
+
+    def pending(self, target="refine"):
+        """
+        Etapas que precisam ser calculadas para obter `target`, em ordem.
+        """
+        needed = set()
+
+        def visit(name):
+            if name in needed or name in self.results:
+                return
+            needed.add(name)
+            for upstream in self.stages[name].inputs:
+                visit(upstream)
+
+        visit(target)
+        return [stage.name for stage in STAGES if stage.name in needed]
+
+    def result(self, target="refine", progress=None):
+        """
+        Resultado da etapa `target`, calculando as etapas que faltarem.
+        `progress(etapa, fração)` é chamado antes de cada uma (e pode levantar
+        uma exceção para cancelar, ver background.py).
+        """
+        pending = self.pending(target)
+        for i, name in enumerate(pending):
+            if progress is not None:
+                progress(name, i / len(pending))
+            stage = self.stages[name]
+            with self.instrumentation.stage(name, graph_type=self.graph_type, incremental=True) as record:
+                output = stage.function(self, *(self.results[upstream] for upstream in stage.inputs))
+                record.output(output)
+            if output is None:
+                raise ValueError(f"Erro na etapa '{name}' do pipeline.")
+            self.results[name] = output
+        return self.results[target]
+
+    def run(self, progress=None):
+        """
+        Retorna (imagem sem grade, curvas refinadas), como o process_graph.
+        """
+        curves = self.result("refine", progress)
+        return self.results["grid"], curves
+
+    def value(self, name):
+        """
+        Valor efetivo de um parâmetro, resolvendo os padrões do tipo de gráfico.
+        """
+        if name in ("canny_low", "canny_high") and self.params[name] is None and "thresholds" in self.results:
+            return self.results["thresholds"][name == "canny_high"]
+        if name.startswith("hough_") and self.params[name] is None:
+            return _hough(self)[("hough_threshold", "hough_min_line_length", "hough_max_line_gap").index(name)]
+        return self.params[name]
@@ -0,0 +1,105 @@
+"""
+Detecção da área do gráfico (o retângulo dos eixos) para que as etapas de
+imagem processem só o interior dele, sem margens, rótulos, títulos e
+legendas externas.
+
+A moldura é localizada em um nível reduzido da imagem (redução pelo mínimo,
+que preserva linhas finas escuras) como a caixa envolvente das linhas
+horizontais e verticais longas: eixos, moldura e grade. Com eixos em "L" (sem
+moldura), o eixo vertical define a altura e o horizontal a largura. As
+bordas são então ajustadas em resolução total para ficarem logo depois das
+linhas dos eixos, que também saem do recorte.
+"""
+import math
+
+import numpy as np
+
+# Lado máximo do nível reduzido usado na detecção
+DETECTION_MAX_SIDE = 1024
+# Comprimento mínimo das linhas dos eixos, como fração do lado do gráfico
+MIN_LINE_FRACTION = 0.3
+# A área detectada precisa cobrir ao menos esta fração da imagem
+MIN_AREA_FRACTION = 0.2
+# Fração mínima de pixels escuros de uma linha/coluna para ela ser um eixo
+AXIS_FILL_FRACTION = 0.5
+# Faixa (fração do maior lado) examinada em cada borda à procura dos eixos
+AXIS_BAND_FRACTION = 0.01
+
+
+def _reduce_min(gray, factor):
+    # Mínimo de cada bloco factor x factor: linhas escuras de 1 pixel sobrevivem
+    import cv2
+
+    if factor == 1:
+        return gray
+    eroded = cv2.erode(gray, np.ones((factor, factor), np.uint8), anchor=(0, 0), borderType=cv2.BORDER_REPLICATE)
+    return eroded[::factor, ::factor]
+
+
+def _axis_band(profile, fill, start, stop, step):
+    # Percorre o perfil a partir de `start` enquanto as posições forem do eixo e
+    # retorna a primeira posição depois dele (ou `start`, se não houver eixo)
+    position = start
+    found = False
+    while 0 <= position < len(profile) and position != stop:
+        if profile[position] >= fill:
+            found = True
+        elif found:
+            return position
+        position += step
+    return position if found else start
+
+
+def detect_plot_area(gray, min_line_fraction=MIN_LINE_FRACTION):
+    """
+    Retorna o interior da área do gráfico como (y0, y1, x0, x1) em
+    coordenadas da imagem `gray`, ou None se não houver eixos reconhecíveis.
+    """
+    import cv2
+
+    height, width = gray.shape
+    factor = max(1, math.ceil(max(height, width) / DETECTION_MAX_SIDE))
+    small = _reduce_min(gray, factor)
+    threshold, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    small_height, small_width = ink.shape
+
+    lines = []
+    for kernel in ((max(3, int(small_width * min_line_fraction)), 1), (1, max(3, int(small_height * min_line_fraction)))):
+        opened = cv2.morphologyEx(ink, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_RECT, kernel))
+        points = cv2.findNonZero(opened)
+        if points is None:
+            return None
+        lines.append(cv2.boundingRect(points))
+    (hx, hy, hw, hh), (vx, vy, vw, vh) = lines
+    x0, x1 = min(hx, vx) * factor, min(width, max(hx + hw, vx + vw) * factor)
+    y0, y1 = min(hy, vy) * factor, min(height, max(hy + hh, vy + vh) * factor)
+    if (x1 - x0) * (y1 - y0) < MIN_AREA_FRACTION * height * width:
+        return None
+
+    # Ajuste em resolução total: pula as linhas/colunas dos eixos em cada borda
+    dark = (gray[y0:y1, x0:x1] <= threshold).astype(np.uint8)
+    rows = cv2.reduce(dark, 1, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+    cols = cv2.reduce(dark, 0, cv2.REDUCE_SUM, dtype=cv2.CV_32S).ravel()
+    # A caixa pode passar um pouco das linhas, e os eixos engrossam com a resolução
+    band = max(4 * factor, int(AXIS_BAND_FRACTION * max(height, width)))
+    row_fill, col_fill = AXIS_FILL_FRACTION * (x1 - x0), AXIS_FILL_FRACTION * (y1 - y0)
+    top = _axis_band(rows, row_fill, 0, band, 1)
+    bottom = _axis_band(rows, row_fill, len(rows) - 1, len(rows) - 1 - band, -1) + 1
+    left = _axis_band(cols, col_fill, 0, band, 1)
+    right = _axis_band(cols, col_fill, len(cols) - 1, len(cols) - 1 - band, -1) + 1
+    if bottom <= top or right <= left:
+        return None
+    return y0 + top, y0 + bottom, x0 + left, x0 + right
+
+
+def uncrop(region, box, shape):
+    """
+    Devolve `region` (o resultado de uma etapa sobre o recorte `box`) em uma
+    imagem do tamanho `shape`, com zeros fora da área do gráfico.
+    """
+    if region.shape[:2] == tuple(shape):
+        return region
+    y0, y1, x0, x1 = box
+    full = np.zeros(tuple(shape) + region.shape[2:], dtype=region.dtype)
+    full[y0:y1, x0:x1] = region
+    return full
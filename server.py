@@ -0,0 +1,511 @@
+"""
+Serviço local de extração de curvas (HTTP), para outras ferramentas chamarem
+o extrator sem pagar a inicialização do interpretador e os imports do
+OpenCV/SciPy a cada imagem.
+
+Os processos de trabalho são criados e aquecidos (imports e uma extração
+de uma figura pequena) antes de o servidor aceitar conexões. Os pedidos
+entram em uma fila limitada; quando ela está cheia, o servidor responde 503
+com Retry-After (contrapressão) em vez de acumular trabalho. Se um processo
+morrer (ex.: falta de memória em uma imagem enorme), os pedidos em execução
+falham com 500 e o pool é recriado e aquecido de novo; enquanto isso o
+/healthz responde 503 e os pedidos esperam na fila. Um despachante
+envia os pedidos aos processos em lotes de até `batch_size`: com todos os
+processos ocupados, os pedidos que chegam se acumulam e saem juntos, em uma
+única ida e volta entre processos.
+
+Endpoints:
+- POST /extract: corpo com os bytes da imagem (PNG/JPEG). Parâmetros na
+  query string: graph_type (nyquist|bode), x_min, x_max, y_min, y_max,
+  x_scale, y_scale (linear|log), segmentation, crop (0|1) e format
+  (json|npz). Retorna as curvas em JSON ({"curves": [{"x": [...], "y":
+  [...]}, ...]}) ou um .npz com as colunas Curve, X e Y.
+- GET /healthz: estado do serviço e ocupação da fila.
+- GET /metrics: métricas no formato de texto do Prometheus (etapas do
+  pipeline nos processos de trabalho, pedidos, lotes e fila).
+
+Uso: python server.py --port 8765 --workers 4
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import queue
+import threading
+import time
+from concurrent import futures
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from batch import _get_cache, _init_worker, calibration_for, opencv_threads_per_worker
+from cache import DEFAULT_MAX_BYTES
+from export import curve_columns
+from image_processing import SEGMENTATION_METHODS
+from instrumentation import Instrumentation, PrometheusSink
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_QUEUE_SIZE = 64
+DEFAULT_BATCH_SIZE = 4
+# Tamanho máximo do corpo de um pedido
+MAX_IMAGE_BYTES = 64 * 1024 * 1024
+# Tempo máximo de espera pelo resultado de um pedido, em segundos
+REQUEST_TIMEOUT = 300
+GRAPH_TYPES = ("nyquist", "bode")
+
+
+class ServiceBusy(Exception):
+    """
+    A fila de pedidos está cheia.
+    """
+
+
+class _RecordList:
+    # Destino de instrumentação que guarda os registros para devolvê-los ao servidor
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+def _warm_worker(cv_threads):
+    # Inicializa o processo de trabalho: threads do OpenCV, imports e uma
+    # extração de uma figura pequena (carrega o SciPy e aloca os buffers)
+    import cv2
+
+    import image_processing
+
+    _init_worker(cv_threads)
+    figure = np.full((128, 128), 255, dtype=np.uint8)
+    cv2.circle(figure, (64, 64), 40, 0, 2)
+    with contextlib.redirect_stdout(io.StringIO()):
+        image_processing.process_graph(figure, "nyquist", crop=False)
+
+
+def _ping():
+    return os.getpid()
+
+
+def _extract(request, instrumentation, cache):
+    import image_processing
+    from image_loader import LoadedImage
+
+    image = LoadedImage(np.frombuffer(request["image"], dtype=np.uint8), name=request["name"])
+    start = time.perf_counter()
+    image_without_grid, curves = image_processing.process_graph(
+        image, request["graph_type"], cache=cache, instrumentation=instrumentation,
+        segmentation=request["segmentation"], crop=request["crop"])
+    elapsed = time.perf_counter() - start
+    if curves is None:
+        return {"error": "Nenhuma curva encontrada na imagem.", "elapsed_s": elapsed}
+    columns = curve_columns(curves, calibration_for(image_without_grid.shape, request["calibration"]))
+    return {"columns": columns, "elapsed_s": elapsed}
+
+
+def process_requests(requests, cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Executa um lote de pedidos em um processo de trabalho. Retorna
+    (resultados na ordem dos pedidos, registros de instrumentação). As
+    mensagens do pipeline são descartadas: os erros voltam nos resultados.
+    """
+    sink = _RecordList()
+    instrumentation = Instrumentation([sink])
+    cache = _get_cache(cache_dir, cache_max_bytes)
+    results = []
+    for request in requests:
+        first = len(sink.records)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                result = _extract(request, instrumentation, cache)
+        except Exception as e:
+            result = {"error": str(e)}
+        if "error" in result:
+            # A mensagem da etapa que falhou é mais útil que a genérica
+            failed = [r["error"]["message"] for r in sink.records[first:] if r.get("error")]
+            if failed:
+                result["error"] = failed[-1]
+        results.append(result)
+    return results, sink.records
+
+
+class ExtractionService:
+    """
+    Pool de processos aquecidos com fila limitada e despacho em lotes.
+    `submit` devolve um Future com o resultado de `process_requests` para o
+    pedido ou levanta ServiceBusy se a fila estiver cheia.
+    """
+
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE, batch_size=DEFAULT_BATCH_SIZE,
+                 cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = max(1, batch_size)
+        self.cache_dir = cache_dir
+        self.cache_max_bytes = cache_max_bytes
+        self.metrics = PrometheusSink()
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Um lote em execução por processo: o resto espera na fila, onde a contrapressão atua
+        self._slots = threading.BoundedSemaphore(self.workers)
+        self._lock = threading.Lock()
+        self._counters = {"batches": 0, "batched_requests": 0, "rejected": 0, "restarts": 0, "responses": {}}
+        self._executor = None
+        self._dispatcher = None
+        # Limpo enquanto o pool é recriado depois da morte de um processo
+        self._ready = threading.Event()
+        self.running = False
+
+    def _start_pool(self):
+        cv_threads = opencv_threads_per_worker(self.workers)
+        executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_warm_worker, initargs=(cv_threads,))
+        # Os processos são criados sob demanda: um pedido vazio por processo
+        # força a criação e o aquecimento de todos antes do primeiro pedido real
+        try:
+            for future in [executor.submit(_ping) for _ in range(self.workers)]:
+                future.result()
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        return executor, cv_threads
+
+    def start(self):
+        self._executor, cv_threads = self._start_pool()
+        self._ready.set()
+        self._dispatcher = threading.Thread(target=self._dispatch, name="despachante", daemon=True)
+        self._dispatcher.start()
+        self.running = True
+        print(f"Serviço pronto com {self.workers} processos ({cv_threads} threads OpenCV por processo).")
+
+    def close(self):
+        if not self.running:
+            return
+        self.running = False
+        self._queue.put(None)
+        self._ready.set()
+        self._dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _restart(self, broken):
+        # Chamado quando `broken` levanta BrokenProcessPool; só o primeiro
+        # aviso de cada pool quebrado o recria, em outra thread (o callback do
+        # Future roda na thread de gerenciamento do próprio pool)
+        with self._lock:
+            if broken is not self._executor or not self._ready.is_set() or not self.running:
+                return
+            self._ready.clear()
+            self._counters["restarts"] += 1
+        print("Um processo de trabalho foi interrompido; recriando o pool...")
+        threading.Thread(target=self._replace_pool, args=(broken,), name="reinicio", daemon=True).start()
+
+    def _replace_pool(self, broken):
+        broken.shutdown(wait=False, cancel_futures=True)
+        while self.running:
+            try:
+                self._executor, _ = self._start_pool()
+                print("Pool de processos recriado.")
+                break
+            except Exception as e:
+                print(f"Erro ao recriar o pool de processos: {e}")
+                time.sleep(1)
+        self._ready.set()
+
+    def submit(self, request):
+        future = Future()
+        try:
+            self._queue.put_nowait((request, future))
+        except queue.Full:
+            with self._lock:
+                self._counters["rejected"] += 1
+            raise ServiceBusy() from None
+        return future
+
+    @property
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _dispatch(self):
+        while True:
+            self._slots.acquire()
+            item = self._queue.get()
+            if item is None:
+                self._slots.release()
+                return
+            batch = [item]
+            # Junta ao lote os pedidos que já estiverem esperando
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    # Encerramento: processa o lote atual e para na próxima volta
+                    self._queue.put(None)
+                    break
+                batch.append(item)
+            with self._lock:
+                self._counters["batches"] += 1
+                self._counters["batched_requests"] += len(batch)
+            while True:
+                # Espera o pool ser recriado, se um processo tiver morrido
+                self._ready.wait()
+                executor = self._executor
+                try:
+                    future = executor.submit(process_requests, [request for request, _ in batch],
+                                             self.cache_dir, self.cache_max_bytes)
+                except Exception as e:
+                    if isinstance(e, BrokenProcessPool) and self.running:
+                        self._restart(executor)
+                        continue
+                    self._slots.release()
+                    for _, waiter in batch:
+                        waiter.set_exception(e)
+                    break
+                future.add_done_callback(lambda done, batch=batch, executor=executor:
+                                         self._finish(batch, done, executor))
+                break
+
+    def _finish(self, batch, done, executor):
+        self._slots.release()
+        try:
+            results, records = done.result()
+        except Exception as e:
+            if isinstance(e, BrokenProcessPool):
+                self._restart(executor)
+            for _, waiter in batch:
+                waiter.set_exception(e)
+            return
+        for record in records:
+            self.metrics.emit(record)
+        for (_, waiter), result in zip(batch, results):
+            waiter.set_result(result)
+
+    def count_response(self, status):
+        with self._lock:
+            self._counters["responses"][status] = self._counters["responses"].get(status, 0) + 1
+
+    def health(self):
+        if not self.running:
+            status = "stopping"
+        else:
+            status = "ok" if self._ready.is_set() else "restarting"
+        return {"status": status, "workers": self.workers, "restarts": self._counters["restarts"],
+                "queue_depth": self.queue_depth, "queue_size": self._queue.maxsize}
+
+    def render_metrics(self):
+        p = self.metrics.prefix
+        with self._lock:
+            counters = dict(self._counters, responses=dict(self._counters["responses"]))
+        lines = [
+            f"# TYPE {p}_requests_total counter",
+            *(f'{p}_requests_total{{status="{status}"}} {total}'
+              for status, total in sorted(counters["responses"].items())),
+            f"# TYPE {p}_requests_rejected_total counter",
+            f"{p}_requests_rejected_total {counters['rejected']}",
+            f"# TYPE {p}_batches_total counter",
+            f"{p}_batches_total {counters['batches']}",
+            f"# TYPE {p}_batched_requests_total counter",
+            f"{p}_batched_requests_total {counters['batched_requests']}",
+            f"# TYPE {p}_queue_depth gauge",
+            f"{p}_queue_depth {self.queue_depth}",
+            f"# TYPE {p}_workers gauge",
+            f"{p}_workers {self.workers}",
+            f"# TYPE {p}_worker_pool_restarts_total counter",
+            f"{p}_worker_pool_restarts_total {counters['restarts']}",
+        ]
+        return "\n".join(lines) + "\n" + self.metrics.render()
+
+
+def parse_request(query, body):
+    """
+    Monta o pedido para process_requests a partir da query string e do corpo.
+    Levanta ValueError com a mensagem para o cliente se algo for inválido.
+    """
+    params = {name: values[-1] for name, values in parse_qs(query).items()}
+    graph_type = params.get("graph_type", "nyquist")
+    if graph_type not in GRAPH_TYPES:
+        raise ValueError(f"graph_type inválido: {graph_type}")
+    output_format = params.get("format", "json")
+    if output_format not in ("json", "npz"):
+        raise ValueError(f"format inválido: {output_format}")
+    segmentation = params.get("segmentation") or None
+    if segmentation is not None and segmentation not in SEGMENTATION_METHODS:
+        raise ValueError(f"segmentation inválido: {segmentation} (use {', '.join(SEGMENTATION_METHODS)})")
+
+    def limits(axis):
+        low, high = params.get(f"{axis}_min"), params.get(f"{axis}_max")
+        if low is None and high is None:
+            return None
+        if low is None or high is None:
+            raise ValueError(f"Informe {axis}_min e {axis}_max juntos.")
+        return float(low), float(high)
+
+    x_limits, y_limits = limits("x"), limits("y")
+    calibration = None
+    if x_limits or y_limits:
+        default_x_scale = "log" if graph_type == "bode" else "linear"
+        calibration = {"x_limits": x_limits, "y_limits": y_limits,
+                       "x_scale": params.get("x_scale", default_x_scale), "y_scale": params.get("y_scale", "linear")}
+        # Valida escalas e limites antes de ocupar um processo
+        calibration_for((1, 1), calibration)
+    if not body:
+        raise ValueError("O corpo do pedido deve conter a imagem.")
+    request = {
+        "image": body,
+        "name": params.get("name", "<pedido>"),
+        "graph_type": graph_type,
+        "calibration": calibration,
+        "segmentation": segmentation,
+        "crop": params.get("crop", "0") in ("1", "true", "yes"),
+    }
+    return request, output_format
+
+
+def encode_result(result, output_format):
+    """
+    Corpo e Content-Type da resposta para as colunas de um pedido concluído.
+    """
+    columns = result["columns"]
+    if output_format == "npz":
+        buffer = io.BytesIO()
+        np.savez(buffer, **columns)
+        return buffer.getvalue(), "application/octet-stream"
+    bounds = np.flatnonzero(np.diff(columns["Curve"])) + 1
+    curves = [{"x": x.tolist(), "y": y.tolist()}
+              for x, y in zip(np.split(columns["X"], bounds), np.split(columns["Y"], bounds)) if len(x)]
+    payload = {"curves": curves, "points": int(len(columns["X"])), "elapsed_s": result["elapsed_s"]}
+    return json.dumps(payload).encode("utf-8"), "application/json"
+
+
+class ExtractionHandler(BaseHTTPRequestHandler):
+    server_version = "ExtratorCurvas/1.0"
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def service(self):
+        return self.server.service
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        self.service.count_response(status)
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, payload, headers=None):
+        self._send(status, json.dumps(payload).encode("utf-8"), headers=headers)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/healthz":
+            health = self.service.health()
+            self._send_json(200 if health["status"] == "ok" else 503, health)
+        elif path == "/metrics":
+            self._send(200, self.service.render_metrics().encode("utf-8"), "text/plain; version=0.0.4")
+        else:
+            self._send_json(404, {"error": "Caminho desconhecido."})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/extract":
+            self._send_json(404, {"error": "Caminho desconhecido."})
+            return
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self._send_json(411, {"error": "Content-Length é obrigatório."})
+            return
+        if not length.strip().isdigit():
+            # O corpo não pode ser lido sem um tamanho válido: a conexão é encerrada
+            self.close_connection = True
+            self._send_json(400, {"error": f"Content-Length inválido: {length}"})
+            return
+        length = int(length)
+        if length > MAX_IMAGE_BYTES:
+            self.close_connection = True
+            self._send_json(413, {"error": f"Imagem maior que {MAX_IMAGE_BYTES} bytes."})
+            return
+        body = self.rfile.read(length)
+        try:
+            request, output_format = parse_request(url.query, body)
+        except ValueError as e:
+            self._send_json(400, {"error": str(e)})
+            return
+
+        try:
+            future = self.service.submit(request)
+        except ServiceBusy:
+            self._send_json(503, {"error": "Fila cheia, tente novamente."}, headers={"Retry-After": "1"})
+            return
+        try:
+            result = future.result(timeout=REQUEST_TIMEOUT)
+        except futures.TimeoutError:
+            self._send_json(504, {"error": "Tempo esgotado."})
+            return
+        except Exception as e:
+            self._send_json(500, {"error": f"Erro no processo de trabalho: {e}"})
+            return
+        if "error" in result:
+            self._send_json(422, {"error": result["error"], "elapsed_s": result.get("elapsed_s")})
+            return
+        body, content_type = encode_result(result, output_format)
+        self._send(200, body, content_type)
+
+
+class ExtractionServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Conexões pendentes no listen(): com o padrão (5), rajadas de clientes
+    # recebem "connection reset" antes de chegar à fila e ao 503
+    request_queue_size = 128
+
+
+def create_server(service, host=DEFAULT_HOST, port=DEFAULT_PORT, verbose=False):
+    """
+    Servidor HTTP (uma thread por conexão) ligado a um ExtractionService já iniciado.
+    """
+    server = ExtractionServer((host, port), ExtractionHandler)
+    server.service = service
+    server.verbose = verbose
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serviço local de extração de curvas (HTTP).")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Endereço (padrão: apenas localhost).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="Número de processos (padrão: núcleos da CPU).")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Pedidos em espera antes de responder 503.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                        help="Máximo de pedidos enviados juntos a um processo.")
+    parser.add_argument("--cache-dir", default=None, help="Diretório do cache de etapas (desativado se omitido).")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024))
+    parser.add_argument("-v", "--verbose", action="store_true", help="Registra cada pedido HTTP.")
+    args = parser.parse_args(argv)
+
+    service = ExtractionService(args.workers, args.queue_size, args.batch_size, args.cache_dir,
+                                args.cache_max_mb * 1024 * 1024)
+    service.start()
+    server = create_server(service, args.host, args.port, args.verbose)
+    print(f"Servindo em http://{args.host}:{server.server_address[1]} (Ctrl+C para encerrar)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
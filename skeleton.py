@@ -0,0 +1,238 @@
+"""
+Extração das linhas centrais das curvas: afinamento da imagem binária até
+um esqueleto de um pixel (Zhang-Suen) e rastreamento do esqueleto em
+poligonais abertas e ordenadas.
+
+Diferente do contorno externo (findContours), que contorna os dois lados de
+cada traço e devolve um laço fechado, cada curva sai como uma única
+poligonal pelo centro do traço. Nas junções, ramos curtos (espúrios do
+afinamento) são descartados e os ramos restantes são emendados pela
+continuidade da direção, de forma que curvas que se cruzam continuam
+inteiras.
+"""
+import numpy as np
+
+# Vizinhos P2..P9 do Zhang-Suen, no sentido horário a partir do norte: (dy, dx)
+NEIGHBOURS = ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1))
+
+
+def _zhang_suen_luts():
+    # Para cada combinação dos 8 vizinhos (bit k = P(k+2)), se o pixel pode ser
+    # removido na primeira e na segunda subiteração
+    luts = np.zeros((2, 256), dtype=bool)
+    for code in range(256):
+        p = [(code >> k) & 1 for k in range(8)]
+        p2, p3, p4, p5, p6, p7, p8, p9 = p
+        neighbours = sum(p)
+        transitions = sum(p[k] == 0 and p[(k + 1) % 8] == 1 for k in range(8))
+        if not (2 <= neighbours <= 6 and transitions == 1):
+            continue
+        luts[0, code] = p2 * p4 * p6 == 0 and p4 * p6 * p8 == 0
+        luts[1, code] = p2 * p4 * p8 == 0 and p2 * p6 * p8 == 0
+    return luts
+
+
+_LUTS = _zhang_suen_luts()
+
+
+def _neighbour_codes(padded, ys, xs):
+    code = np.zeros(len(ys), dtype=np.uint8)
+    for bit, (dy, dx) in enumerate(NEIGHBOURS):
+        code |= padded[ys + dy, xs + dx] << bit
+    return code
+
+
+def thin(binary):
+    """
+    Afina uma imagem binária (não zero = traço) até um esqueleto de um pixel
+    e retorna uma imagem uint8 0/255. Usa o cv2.ximgproc (opencv-contrib)
+    quando disponível; senão, o Zhang-Suen em NumPy, que a cada iteração
+    examina apenas os pixels do traço que restam.
+    """
+    import cv2
+
+    binary = np.where(binary > 0, np.uint8(255), np.uint8(0))
+    if hasattr(cv2, "ximgproc"):
+        return cv2.ximgproc.thinning(binary, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+
+    padded = np.pad(binary // 255, 1)
+    ys, xs = np.nonzero(padded)
+    while True:
+        removed = 0
+        for lut in _LUTS:
+            delete = lut[_neighbour_codes(padded, ys, xs)]
+            if delete.any():
+                padded[ys[delete], xs[delete]] = 0
+                ys, xs = ys[~delete], xs[~delete]
+                removed += int(delete.sum())
+        if removed == 0:
+            break
+    return padded[1:-1, 1:-1] * np.uint8(255)
+
+
+def _adjacency(skeleton):
+    """
+    Vizinhos de cada pixel do esqueleto: (ys, xs, matriz Nx8 de índices ou -1).
+    Uma ligação diagonal é ignorada quando os dois pixels também se ligam por
+    um vizinho em comum na horizontal/vertical, para que os degraus do
+    esqueleto não pareçam junções.
+    """
+    height, width = skeleton.shape
+    ys, xs = np.nonzero(skeleton)
+    index = np.full((height + 2, width + 2), -1, dtype=np.int32)
+    index[ys + 1, xs + 1] = np.arange(len(ys), dtype=np.int32)
+    neighbours = np.empty((len(ys), 8), dtype=np.int32)
+    for k, (dy, dx) in enumerate(NEIGHBOURS):
+        neighbours[:, k] = index[ys + 1 + dy, xs + 1 + dx]
+        if dy and dx:
+            shortcut = (index[ys + 1 + dy, xs + 1] >= 0) | (index[ys + 1, xs + 1 + dx] >= 0)
+            neighbours[shortcut, k] = -1
+    return ys, xs, neighbours
+
+
+def _trace(neighbours):
+    """
+    Percorre o grafo do esqueleto e retorna (poligonais como listas de índices
+    de pixels, pixels que são nós). Nós são pontas e junções (grau != 2); cada
+    poligonal vai de um nó a outro, e laços sem nós saem fechados.
+    """
+    degree = (neighbours >= 0).sum(axis=1)
+    is_node = degree != 2
+    visited = np.zeros(len(neighbours), dtype=bool)
+    adjacent = [row[row >= 0].tolist() for row in neighbours]
+    paths = []
+
+    def walk(start, first):
+        path = [start]
+        previous, current = start, first
+        while True:
+            path.append(current)
+            if is_node[current] or current == start:
+                return path
+            visited[current] = True
+            a, b = adjacent[current]
+            previous, current = current, (b if a == previous else a)
+
+    for node in np.flatnonzero(is_node).tolist():
+        for first in adjacent[node]:
+            if is_node[first]:
+                if node < first:
+                    paths.append([node, first])
+            elif not visited[first]:
+                paths.append(walk(node, first))
+
+    # Laços fechados (sem pontas nem junções)
+    for start in np.flatnonzero(~is_node & ~visited).tolist():
+        if not visited[start]:
+            visited[start] = True
+            paths.append(walk(start, adjacent[start][0]))
+    return paths, is_node
+
+
+def _node_clusters(paths, is_node, size):
+    # Nós vizinhos (ligados diretamente) formam uma única junção
+    parent = np.arange(size)
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for path in paths:
+        if len(path) == 2 and is_node[path[0]] and is_node[path[1]]:
+            parent[find(path[0])] = find(path[1])
+    return find
+
+
+def _direction(points, at_start, reach):
+    # Direção de saída de uma ponta da poligonal, medida em até `reach` pixels
+    if at_start:
+        tip, inner = points[0], points[min(reach, len(points) - 1)]
+    else:
+        tip, inner = points[-1], points[max(-reach - 1, -len(points))]
+    vector = tip - inner
+    norm = np.hypot(*vector)
+    return vector / norm if norm else vector
+
+
+def trace_centerlines(skeleton, spur_length=10, min_length=20, max_turn_degrees=45, reach=10):
+    """
+    Rastreia um esqueleto de um pixel e retorna as curvas como arrays Nx2
+    (x, y) ordenados, na mesma convenção dos contornos do OpenCV.
+
+    - Ramos com uma ponta solta e menos de `spur_length` pixels, ligados a
+      uma junção, são descartados.
+    - Em cada junção, os ramos restantes são emendados aos pares pela menor
+      mudança de direção (até `max_turn_degrees`); com apenas dois ramos, eles
+      são sempre emendados.
+    - Curvas com menos de `min_length` pixels são descartadas.
+
+    O custo é linear no número de pixels do esqueleto.
+    """
+    ys, xs, neighbours = _adjacency(skeleton)
+    if len(ys) == 0:
+        return []
+    paths, is_node = _trace(neighbours)
+    find = _node_clusters(paths, is_node, len(ys))
+    points = np.column_stack([xs, ys])
+
+    # Remove as ligações internas das junções
+    paths = [path for path in paths
+             if not (len(path) == 2 and is_node[path[0]] and is_node[path[1]] and find(path[0]) == find(path[1]))]
+
+    def junction(pixel):
+        # Junção (grupo de nós) de uma ponta, ou None se for uma ponta solta
+        if not is_node[pixel]:
+            return None
+        return find(pixel) if (neighbours[pixel] >= 0).sum() > 1 else None
+
+    # Descarta os ramos espúrios curtos (ponta solta ligada a uma junção)
+    paths = [path for path in paths
+             if not (len(path) < spur_length
+                     and (junction(path[0]) is None) != (junction(path[-1]) is None))]
+
+    curves = {i: points[path] for i, path in enumerate(paths)}
+    # Junção de cada ponta das curvas: {curva: [junção do início, junção do fim]}
+    ends = {i: [junction(path[0]), junction(path[-1])] for i, path in enumerate(paths)}
+    incident = {}
+    for i, (start, end) in ends.items():
+        for cluster in (start, end):
+            if cluster is not None:
+                incident.setdefault(cluster, set()).add(i)
+
+    min_cos = np.cos(np.radians(max_turn_degrees))
+    for cluster, members in incident.items():
+        tips = [(i, side) for i in members if i in curves for side in (0, 1) if ends[i][side] == cluster]
+        # Pares de ramos que se continuam (direções de saída quase opostas)
+        candidates = []
+        for a in range(len(tips)):
+            for b in range(a + 1, len(tips)):
+                (i, i_side), (j, j_side) = tips[a], tips[b]
+                if i == j:
+                    continue
+                cos = float(np.dot(_direction(curves[i], i_side == 0, reach),
+                                   _direction(curves[j], j_side == 0, reach)))
+                if len(tips) == 2 or cos <= -min_cos:
+                    candidates.append((cos, tips[a], tips[b]))
+
+        for _, (i, i_side), (j, j_side) in sorted(candidates):
+            # Uma emenda anterior pode ter consumido ou invertido as curvas
+            if i == j or i not in curves or j not in curves:
+                continue
+            if ends[i][i_side] != cluster or ends[j][j_side] != cluster:
+                continue
+            # i passa a terminar na junção e j a começar nela; o resultado fica em i
+            first = curves[i][::-1] if i_side == 0 else curves[i]
+            start = ends[i][1] if i_side == 0 else ends[i][0]
+            second = curves.pop(j)
+            second = second if j_side == 0 else second[::-1]
+            end = ends.pop(j)[1 if j_side == 0 else 0]
+            curves[i] = np.concatenate([first, second])
+            # Uma ponta que volta à mesma junção (laço) fica solta
+            ends[i] = [None if start == cluster else start, None if end == cluster else end]
+            if ends[i][1] is not None:
+                incident[end].discard(j)
+                incident[end].add(i)
+
+    return [curve.astype(np.int32) for curve in curves.values() if len(curve) >= min_length]
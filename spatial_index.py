@@ -0,0 +1,193 @@
+import numpy as np
+
+
+class PointIndex:
+    """
+    Índice espacial incremental dos pontos anotados.
+
+    Os pontos ficam em arrays que crescem por duplicação, cada um com um id
+    estável e a chave da curva a que pertence. A busca do vizinho mais próximo
+    usa uma KD-tree sobre os pontos existentes na última reconstrução, mais uma
+    varredura vetorizada dos pontos inseridos depois dela. Remoções apenas
+    marcam os pontos como apagados; a árvore é reconstruída quando os pontos
+    novos ou apagados passam de uma fração do total. Na reconstrução, se os
+    apagados passam de `compact_ratio` das posições, os arrays são compactados
+    e os ids renumerados: `on_compact` recebe o array antigo -> novo (-1 para
+    os apagados).
+    """
+
+    def __init__(self, rebuild_ratio=0.25, min_rebuild=256, compact_ratio=0.5, on_compact=None):
+        self.rebuild_ratio = rebuild_ratio
+        self.min_rebuild = min_rebuild
+        self.compact_ratio = compact_ratio
+        self.on_compact = on_compact
+        self._points = np.empty((64, 2), dtype=np.float64)
+        self._codes = np.empty(64, dtype=np.int32)
+        self._alive = np.zeros(64, dtype=bool)
+        self._size = 0
+        self._keys = []
+        self._key_codes = {}
+        self._tree = None
+        self._tree_ids = np.empty(0, dtype=np.int64)
+        # Ids menores que _tree_end já estavam presentes na última reconstrução
+        self._tree_end = 0
+        self._tree_dead = 0
+
+    def __len__(self):
+        return int(self._alive[:self._size].sum())
+
+    def clear(self):
+        self.__init__(self.rebuild_ratio, self.min_rebuild, self.compact_ratio, self.on_compact)
+
+    def _code(self, key):
+        if key not in self._key_codes:
+            self._key_codes[key] = len(self._keys)
+            self._keys.append(key)
+        return self._key_codes[key]
+
+    def _reserve(self, extra):
+        needed = self._size + extra
+        if needed <= len(self._points):
+            return
+        capacity = max(needed, 2 * len(self._points))
+        for name in ("_points", "_codes", "_alive"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def add(self, points, key):
+        """
+        Insere os pontos (array Nx2 ou lista de tuplas) da curva `key` e
+        retorna os ids atribuídos.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self._reserve(len(points))
+        ids = np.arange(self._size, self._size + len(points))
+        self._points[ids] = points
+        self._codes[ids] = self._code(key)
+        self._alive[ids] = True
+        self._size += len(points)
+        remap = self._maybe_rebuild()
+        return ids if remap is None else remap[ids]
+
+    def alive_ids(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        return ids[self._alive[ids]]
+
+    def remove(self, ids):
+        """
+        Apaga os pontos e retorna os ids que ainda estavam vivos. Os ids podem
+        ser renumerados em seguida (ver `on_compact`).
+        """
+        ids = self.alive_ids(ids)
+        self._alive[ids] = False
+        self._tree_dead += int(np.count_nonzero(ids < self._tree_end))
+        self._maybe_rebuild()
+        return ids
+
+    def _maybe_rebuild(self):
+        limit = max(self.min_rebuild, self.rebuild_ratio * len(self._tree_ids))
+        if self._size - self._tree_end > limit or self._tree_dead > limit:
+            return self.rebuild()
+        return None
+
+    def rebuild(self):
+        """
+        Reconstrói a árvore com os pontos vivos. Retorna o array de
+        renumeração dos ids se os arrays foram compactados, senão None.
+        """
+        from scipy.spatial import cKDTree
+
+        alive = np.flatnonzero(self._alive[:self._size])
+        remap = None
+        if self._size - len(alive) > self.compact_ratio * self._size:
+            remap = self._compact(alive)
+            alive = np.arange(self._size)
+        self._tree_ids = alive
+        self._tree = cKDTree(self._points[alive]) if len(alive) else None
+        self._tree_dead = 0
+        self._tree_end = self._size
+        if remap is not None and self.on_compact is not None:
+            self.on_compact(remap)
+        return remap
+
+    def _compact(self, alive):
+        # Move os pontos vivos para o início, na mesma ordem, e libera as posições apagadas
+        remap = np.full(self._size, -1, dtype=np.int64)
+        remap[alive] = np.arange(len(alive))
+        for name in ("_points", "_codes"):
+            array = getattr(self, name)
+            array[:len(alive)] = array[alive]
+        self._alive[:len(alive)] = True
+        self._alive[len(alive):self._size] = False
+        self._size = len(alive)
+        return remap
+
+    def nearest(self, x, y, max_distance=np.inf):
+        """
+        Id do ponto vivo mais próximo de (x, y) dentro de `max_distance`, ou None.
+        """
+        best_id, best_distance = None, max_distance
+
+        if self._tree is not None:
+            k = 8
+            while True:
+                k = min(k, len(self._tree_ids))
+                distances, positions = self._tree.query((x, y), k=k, distance_upper_bound=best_distance)
+                distances, positions = np.atleast_1d(distances), np.atleast_1d(positions)
+                found = positions < len(self._tree_ids)
+                ids = self._tree_ids[positions[found]]
+                alive = self._alive[ids]
+                if alive.any():
+                    first = np.argmax(alive)
+                    best_id, best_distance = int(ids[first]), float(distances[found][first])
+                    break
+                # Todos os vizinhos consultados foram apagados: amplia a busca
+                if not found.all() or k == len(self._tree_ids):
+                    break
+                k *= 4
+
+        # Pontos inseridos depois da última reconstrução: varredura vetorizada
+        start = self._tree_end
+        if start < self._size:
+            pending = np.arange(start, self._size)[self._alive[start:self._size]]
+            if len(pending):
+                distances = np.hypot(*(self._points[pending] - (x, y)).T)
+                closest = np.argmin(distances)
+                if distances[closest] < best_distance:
+                    best_id, best_distance = int(pending[closest]), float(distances[closest])
+        return best_id
+
+    def in_rect(self, x0, y0, x1, y1):
+        x0, x1 = min(x0, x1), max(x0, x1)
+        y0, y1 = min(y0, y1), max(y0, y1)
+        points = self._points[:self._size]
+        inside = ((points[:, 0] >= x0) & (points[:, 0] <= x1) &
+                  (points[:, 1] >= y0) & (points[:, 1] <= y1) & self._alive[:self._size])
+        return np.flatnonzero(inside)
+
+    def in_polygon(self, vertices):
+        from matplotlib.path import Path
+
+        inside = Path(vertices).contains_points(self._points[:self._size]) & self._alive[:self._size]
+        return np.flatnonzero(inside)
+
+    def point(self, point_id):
+        return tuple(self._points[point_id])
+
+    def key_of(self, point_id):
+        return self._keys[self._codes[point_id]]
+
+    def keys_of(self, ids):
+        return {self._keys[code] for code in np.unique(self._codes[ids])}
+
+    def points_for(self, key):
+        """
+        Pontos vivos da curva `key`, na ordem de inserção.
+        """
+        if key not in self._key_codes:
+            return np.empty((0, 2))
+        size = self._size
+        mask = (self._codes[:size] == self._key_codes[key]) & self._alive[:size]
+        return self._points[:size][mask]
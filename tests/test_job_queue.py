@@ -0,0 +1,111 @@
+import multiprocessing
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+from job_queue import DONE, FAILED, PENDING, RUNNING, JobQueue, params_key
+
+PARAMS = {"graph_type": "nyquist"}
+
+
+def _rows(path, params=PARAMS):
+    with sqlite3.connect(path) as db:
+        return {image: (status, attempts, error) for image, status, attempts, error in
+                db.execute("SELECT image, status, attempts, error FROM jobs WHERE params = ?",
+                           (params_key(params),))}
+
+
+def _dead_worker():
+    # "máquina:pid" de um processo que já terminou
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}"
+
+
+def test_claim(tmp_path):
+    path = str(tmp_path / "fila.db")
+    with JobQueue(path) as jobs:
+        assert jobs.add(["a.png", "b.png", "c.png"], PARAMS) == 3
+        assert jobs.add(["a.png"], PARAMS) == 0
+        jobs.add(["a.png"], {"graph_type": "bode"})
+
+        first = jobs.claim(PARAMS, worker="w1")
+        assert (first.image, first.attempts, first.worker) == ("a.png", 1, "w1")
+        assert jobs.claim(PARAMS, job_ids=[first.id]) is None
+        second = jobs.claim(PARAMS, worker="w2")
+        third = jobs.claim(PARAMS, worker="w3")
+        assert (second.image, third.image) == ("b.png", "c.png")
+        assert jobs.claim(PARAMS) is None
+        assert jobs.pending(PARAMS) == 0
+        assert jobs.pending() == 1
+
+        assert jobs.complete(first, "a.csv", 0.5)
+        assert jobs.fail(second, "grid: erro") == PENDING
+        assert jobs.claim(PARAMS, worker="w2").image == "b.png"
+    rows = _rows(path)
+    assert rows["a.png"] == (DONE, 1, None)
+    assert rows["b.png"][:2] == (RUNNING, 2)
+
+
+def test_late_result_after_requeue_is_discarded(tmp_path):
+    path = str(tmp_path / "fila.db")
+    with JobQueue(path, max_attempts=3) as jobs:
+        jobs.add(["a.png", "b.png"], PARAMS)
+        # Processo em outra máquina: só volta para a fila por tempo
+        late = jobs.claim(PARAMS, worker="outra-maquina:1")
+        late_failure = jobs.claim(PARAMS, worker="outra-maquina:2")
+        assert jobs.requeue_stale(stale_after=0) == 2
+
+        current = jobs.claim(PARAMS, worker="w1")
+        assert current.image == "a.png" and current.attempts == 2
+        assert not jobs.complete(late, "atrasado.csv", 1.0)
+        assert jobs.fail(late_failure, "erro atrasado") is None
+        assert jobs.complete(current, "a.csv", 1.0)
+    rows = _rows(path)
+    assert rows["a.png"] == (DONE, 2, None)
+    assert rows["b.png"] == (PENDING, 1, "Processo de trabalho interrompido")
+
+
+def test_release_interrupted_does_not_use_an_attempt(tmp_path):
+    path = str(tmp_path / "fila.db")
+    with JobQueue(path) as jobs:
+        jobs.add(["a.png", "b.png"], PARAMS)
+        dead = jobs.claim(PARAMS, worker=_dead_worker())
+        alive = jobs.claim(PARAMS)
+        assert jobs.release_interrupted() == [dead.id]
+        assert jobs.claim(PARAMS, job_ids=[alive.id]) is None
+        retried = jobs.claim(PARAMS, job_ids=[dead.id])
+        assert retried.attempts == 1
+    assert _rows(path)["b.png"][:2] == (RUNNING, 1)
+
+
+def _process_one(image_path, *args, **kwargs):
+    # Substitui o processamento no processo de trabalho (herdado pelo fork)
+    if "poison" in image_path:
+        time.sleep(0.1)
+        os._exit(1)
+    time.sleep(0.5)
+    return [(image_path, image_path + ".csv", 0.5)]
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="o teste substitui a função no processo pai")
+def test_worker_crash_only_charges_the_crashing_job(tmp_path, monkeypatch, capsys):
+    batch = pytest.importorskip("batch")
+    monkeypatch.setattr(batch, "process_one", _process_one)
+    path = str(tmp_path / "fila.db")
+    images = [str(tmp_path / name) for name in ("a_poison.png", "b.png", "c.png", "d.png", "e.png", "f.png")]
+    options = (None,) * 9
+
+    results = batch._run_queue(path, 2, PARAMS, images, str(tmp_path), "nyquist", 3, 1, options, False, None)
+
+    assert "serão repetidos um a um" in capsys.readouterr().out
+    rows = _rows(path)
+    assert rows[images[0]] == (FAILED, 2, "Processo de trabalho interrompido")
+    for image in images[1:]:
+        assert rows[image] == (DONE, 1, None)
+    assert results == [(images[0], None, 0.0)] + [(image, image + ".csv", 0.5) for image in images[1:]]
@@ -0,0 +1,178 @@
+import math
+
+import cv2
+import numpy as np
+
+import buffers
+from image_loader import as_grayscale
+from plot_area import detect_plot_area
+from image_processing import (
+    canny_thresholds,
+    grid_line_mask,
+    grid_removal_method,
+    remove_grid_lines,
+    remove_text_and_symbols,
+    preprocess_image,
+)
+
+# Estimativa de bytes temporários por pixel de um bloco ao longo das etapas
+# (saídas do CLAHE, blur, Canny, fechamento, rótulos int32 dos componentes e máscaras)
+TILE_BYTES_PER_PIXEL = 24
+# Idem para as faixas da remoção morfológica da grade (binária, fechamento,
+# abertura e dilatação)
+STRIP_BYTES_PER_PIXEL = 4
+DEFAULT_OVERLAP = 64
+MIN_TILE_SIDE = 256
+# Lado máximo do nível mais grosso da pirâmide usado para localizar o gráfico
+PYRAMID_MAX_SIDE = 1024
+
+
+def tile_side_for_budget(memory_budget, overlap=DEFAULT_OVERLAP):
+    """
+    Lado (em pixels, incluindo a sobreposição) dos blocos para que os
+    temporários de um bloco caibam em `memory_budget` bytes.
+    """
+    side = int(math.sqrt(memory_budget / TILE_BYTES_PER_PIXEL))
+    return max(MIN_TILE_SIDE + 2 * overlap, side)
+
+
+def iter_tiles(shape, tile_side, overlap=DEFAULT_OVERLAP):
+    """
+    Gera (região com sobreposição, região útil) como tuplas de slices.
+    As regiões úteis cobrem a imagem sem se sobrepor.
+    """
+    height, width = shape
+    core = tile_side - 2 * overlap
+    for y0 in range(0, height, core):
+        for x0 in range(0, width, core):
+            y1, x1 = min(y0 + core, height), min(x0 + core, width)
+            padded = (slice(max(0, y0 - overlap), min(height, y1 + overlap)),
+                      slice(max(0, x0 - overlap), min(width, x1 + overlap)))
+            useful = (slice(y0, y1), slice(x0, x1))
+            yield padded, useful
+
+
+def locate_plot_region(gray, margin=0.02):
+    """
+    Localiza a região com conteúdo (tinta) em um nível reduzido da pirâmide e
+    devolve (y0, y1, x0, x1) em coordenadas da resolução original.
+    """
+    height, width = gray.shape
+    factor = max(1, math.ceil(max(height, width) / PYRAMID_MAX_SIDE))
+    small = cv2.resize(gray, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+
+    _, ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    ink = cv2.morphologyEx(ink, cv2.MORPH_OPEN, np.ones((2, 2), np.uint8))
+    points = cv2.findNonZero(ink)
+    if points is None:
+        return 0, height, 0, width
+
+    x, y, w, h = cv2.boundingRect(points)
+    pad_y, pad_x = int(margin * height), int(margin * width)
+    return (max(0, y * factor - pad_y), min(height, (y + h) * factor + pad_y),
+            max(0, x * factor - pad_x), min(width, (x + w) * factor + pad_x))
+
+
+def _global_thresholds(gray, graph_type):
+    # Os limiares do Canny dependem da mediana da imagem inteira: calcula em um
+    # nível reduzido para que todos os blocos usem os mesmos valores
+    height, width = gray.shape
+    factor = max(1, math.ceil(max(height, width) / PYRAMID_MAX_SIDE))
+    small = cv2.resize(gray, (max(1, width // factor), max(1, height // factor)), interpolation=cv2.INTER_AREA)
+    enhanced = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8)).apply(small)
+    return canny_thresholds(cv2.medianBlur(enhanced, 5), graph_type)
+
+
+def remove_background_tiled(image, graph_type="generic", memory_budget=256 * 1024 * 1024,
+                            overlap=DEFAULT_OVERLAP, use_pyramid=True, crop=False):
+    """
+    Executa pré-processamento, remoção de símbolos e remoção da grade bloco a
+    bloco e costura as máscaras em uma imagem do tamanho original.
+
+    Cada bloco é processado com `overlap` pixels de contexto de cada lado e só
+    a região útil é copiada para o resultado, então filtros e componentes perto
+    da borda do bloco enxergam os vizinhos. Os limiares do Canny, a grade do
+    CLAHE e os limites de área/comprimento são calculados para a imagem inteira.
+    A remoção morfológica da grade procura traços de um quarto da imagem, mais
+    longos que a sobreposição: ela roda depois dos blocos, em faixas com a
+    largura (ou altura) inteira da região (ver _remove_grid_lines_in_strips).
+    Com `crop`, apenas o interior dos eixos é processado (ver plot_area.py);
+    sem eixos reconhecíveis, ou sem `crop`, e com `use_pyramid`, a região com
+    conteúdo é localizada antes em baixa resolução e apenas ela é processada
+    em resolução total.
+
+    O pico de memória é a imagem em cinza e o resultado (1 byte/pixel cada;
+    com a remoção morfológica, também a máscara da grade) mais os
+    temporários de um bloco ou faixa, limitados por `memory_budget`.
+    """
+    gray = as_grayscale(image)
+    full_shape = gray.shape
+    result = np.zeros_like(gray)
+
+    box = detect_plot_area(gray) if crop else None
+    if box is None:
+        box = locate_plot_region(gray) if use_pyramid else (0, full_shape[0], 0, full_shape[1])
+    y0, y1, x0, x1 = box
+    region = gray[y0:y1, x0:x1]
+    thresholds = _global_thresholds(region, graph_type)
+
+    tile_side = tile_side_for_budget(memory_budget, overlap)
+    # Mantém o tamanho das células do CLAHE igual ao da imagem inteira (grade 8x8)
+    cell = max(1, max(full_shape) // 8)
+    clahe_grid = (max(1, tile_side // cell),) * 2
+
+    # Os blocos têm quase todos o mesmo tamanho: as saídas de cada etapa usam
+    # os buffers da thread (limitados ao orçamento) e só a região útil é
+    # copiada para o resultado
+    with buffers.thread_pool().limit(memory_budget) as pool:
+        strips = grid_removal_method(graph_type) == "morphology"
+        if _process_tiles(region, graph_type, thresholds, clahe_grid, tile_side, overlap, full_shape,
+                          result, (y0, x0), pool, grid=not strips) is None:
+            return None
+        if strips:
+            _remove_grid_lines_in_strips(result[y0:y1, x0:x1], full_shape, memory_budget, pool)
+        return result
+
+
+def _remove_grid_lines_in_strips(image, full_shape, memory_budget, pool):
+    # Cada direção das aberturas só depende da própria linha (ou coluna): em
+    # faixas com a largura (ou altura) inteira e uma linha a mais de cada lado
+    # para a dilatação, a máscara é igual à da imagem inteira. `image` é
+    # alterada no lugar.
+    mask = np.zeros_like(image)
+    for axis, direction in ((0, "horizontal"), (1, "vertical")):
+        length, across = image.shape[axis], image.shape[1 - axis]
+        step = max(1, memory_budget // (STRIP_BYTES_PER_PIXEL * across))
+        for start in range(0, length, step):
+            stop = min(length, start + step)
+            low, high = max(0, start - 1), min(length, stop + 1)
+            strip = image[low:high] if axis == 0 else image[:, low:high]
+            lines = grid_line_mask(strip, direction, full_shape)
+            lines = cv2.dilate(lines, np.ones((3, 3), np.uint8), dst=pool.get("strip_mask", lines.shape))
+            if axis == 0:
+                mask[start:stop] |= lines[start - low:stop - low]
+            else:
+                mask[:, start:stop] |= lines[:, start - low:stop - low]
+    cv2.bitwise_and(image, cv2.bitwise_not(mask, dst=mask), dst=image)
+
+
+def _process_tiles(region, graph_type, thresholds, clahe_grid, tile_side, overlap, full_shape, result, origin,
+                   pool, grid=True):
+    y0, x0 = origin
+    for padded, useful in iter_tiles(region.shape, tile_side, overlap):
+        source = region[padded]
+        tile = preprocess_image(source, graph_type, thresholds=thresholds, clahe_grid=clahe_grid,
+                                dst=pool.get("tile_edges", source.shape))
+        if tile is None:
+            return None
+        tile = remove_text_and_symbols(tile, graph_type, full_shape=full_shape,
+                                       dst=pool.get("tile_symbols", source.shape))
+        if grid:
+            tile = remove_grid_lines(tile, graph_type, full_shape=full_shape,
+                                     dst=pool.get("tile_grid", source.shape))
+
+        # Copia só a região útil do bloco para a posição dele na imagem inteira
+        inner = (slice(useful[0].start - padded[0].start, useful[0].stop - padded[0].start),
+                 slice(useful[1].start - padded[1].start, useful[1].stop - padded[1].start))
+        result[y0 + useful[0].start:y0 + useful[0].stop, x0 + useful[1].start:x0 + useful[1].stop] = tile[inner]
+    return result
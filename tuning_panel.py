@@ -0,0 +1,126 @@
+"""
+Painel de ajuste dos parâmetros do pipeline na tela de anotação.
+
+Cada controle deslizante altera um parâmetro do `Pipeline` (ver
+pipeline.TUNABLE_PARAMETERS). As mudanças são agrupadas por um pequeno
+intervalo (`delay_ms`) e recalculadas em segundo plano; mudanças feitas
+durante um recálculo são aplicadas assim que ele termina.
+"""
+import time
+
+from background import BackgroundTask
+from pipeline import TUNABLE_PARAMETERS
+
+# Espera (ms) após a última mudança antes de recalcular
+DEBOUNCE_MS = 150
+
+
+class TuningPanel:
+    """
+    Janela com um controle por parâmetro. `on_result(imagem sem grade, curvas)`
+    é chamado na thread do Tk sempre que um recálculo termina.
+    """
+
+    def __init__(self, master, pipeline, on_result, title="Ajuste de Parâmetros", delay_ms=DEBOUNCE_MS):
+        import customtkinter as ctk
+
+        self.pipeline = pipeline
+        self.on_result = on_result
+        self.delay_ms = delay_ms
+        self.task = None
+        self.pending = {}
+        self._after_id = None
+        self._apply = False
+        self._started = None
+
+        self.window = ctk.CTkToplevel(master)
+        self.window.title(title)
+        self.window.geometry("480x560")
+        self.window.transient(master)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+
+        frame = ctk.CTkFrame(self.window)
+        frame.pack(pady=10, padx=10, fill="both", expand=True)
+        self.sliders = {}
+        self.value_labels = {}
+        for row, (name, label, low, high, steps, kind) in enumerate(TUNABLE_PARAMETERS):
+            ctk.CTkLabel(frame, text=label, font=("Manrope", 13)).grid(row=row, column=0, sticky="w", padx=10, pady=6)
+            slider = ctk.CTkSlider(frame, from_=low, to=high, number_of_steps=steps, width=200,
+                                   command=lambda value, name=name, kind=kind: self.on_change(name, kind, value))
+            slider.grid(row=row, column=1, padx=5, pady=6)
+            value_label = ctk.CTkLabel(frame, text="", width=50, font=("Manrope", 13))
+            value_label.grid(row=row, column=2, padx=5, pady=6)
+            self.sliders[name] = slider
+            self.value_labels[name] = value_label
+
+        self.status = ctk.CTkLabel(self.window, text="", font=("Manrope", 13))
+        self.status.pack(pady=10)
+
+        # Calcula todas as etapas uma vez (sem alterar as anotações) para que as
+        # mudanças seguintes recalculem só as etapas afetadas
+        self.start(apply=False)
+
+    def refresh_values(self):
+        for name, *_ in TUNABLE_PARAMETERS:
+            value = self.pipeline.value(name)
+            if value is None or name in self.pending:
+                continue
+            self.sliders[name].set(value)
+            self.value_labels[name].configure(text=f"{value:g}")
+
+    def on_change(self, name, kind, value):
+        value = int(round(value)) if kind is int else round(float(value), 3)
+        if name == "blur_size" and value % 2 == 0:
+            value += 1  # O medianBlur exige tamanho ímpar
+        self.pending[name] = value
+        self.value_labels[name].configure(text=f"{value:g}")
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+        self._after_id = self.window.after(self.delay_ms, self.recompute)
+
+    def recompute(self):
+        self._after_id = None
+        if self.task is not None or not self.pending:
+            return  # Mudanças feitas durante o recálculo são aplicadas quando ele termina
+        params, self.pending = self.pending, {}
+        self.pipeline.set_params(**params)
+        self.start(apply=True)
+
+    def start(self, apply):
+        stages = self.pipeline.pending()
+        if not stages:
+            return
+        self.status.configure(text=f"Recalculando: {', '.join(stages)}")
+        self._apply = apply
+        self._started = time.perf_counter()
+        self.task = BackgroundTask(self.pipeline.run).start()
+        self.task.poll(self.window, self.on_done, on_error=self.on_error, on_cancelled=self.on_cancelled)
+
+    def on_done(self, result):
+        self.task = None
+        elapsed = time.perf_counter() - self._started
+        self.status.configure(text=f"Etapas recalculadas em {elapsed * 1000:.0f} ms")
+        if self._apply:
+            self.on_result(*result)
+        else:
+            self.refresh_values()
+        self.recompute()
+
+    def on_error(self, error):
+        self.task = None
+        self.status.configure(text=f"Erro: {error}")
+        print(f"Erro ao recalcular o pipeline: {error}")
+        self.recompute()
+
+    def on_cancelled(self):
+        self.task = None
+
+    def close(self):
+        if self.task is not None:
+            self.task.cancel()
+        if self._after_id is not None:
+            self.window.after_cancel(self._after_id)
+            self._after_id = None
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None